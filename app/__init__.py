@@ -8,23 +8,72 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # JSON logs with request ids, written off the request path
+    from app.utils.structured_logging import init_logging
+    init_logging(app)
+    
     # Enable CORS for frontend integration
     CORS(app, origins=[
         "http://localhost:4200",  # Angular dev server
         "https://your-frontend-domain.com"  # Production frontend
     ])
     
+    # Request and dependency metrics, served at /metrics
+    if app.config.get('METRICS_ENABLED'):
+        from app.utils.metrics import init_metrics
+        init_metrics(app)
+    
+    # gzip or brotli for large JSON responses, per Accept-Encoding
+    if app.config.get('COMPRESSION_ENABLED'):
+        from app.utils.compression import init_compression
+        init_compression(app)
+    
+    # Per-request Firestore operation counts
+    from app.utils.firestore_ops import init_operation_accounting
+    init_operation_accounting(app, headers=app.debug or app.config.get('FIRESTORE_OP_HEADERS'))
+    
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.chat import chat_bp
     from app.routes.models import models_bp
     from app.routes.ab_testing import ab_testing_bp
     from app.routes.greenlist import greenlist_bp
+    from app.routes.agreements import agreements_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     app.register_blueprint(models_bp, url_prefix='/api/models')
     app.register_blueprint(ab_testing_bp, url_prefix='/api/ab-testing')
     app.register_blueprint(greenlist_bp, url_prefix='/api/greenlist')
+    app.register_blueprint(agreements_bp, url_prefix='/api/agreements')
+    
+    # In-memory caches and their listeners. When gunicorn preloads the app
+    # in its master, each worker starts its own after fork instead
+    if not app.config.get('DEFER_BACKGROUND_SERVICES'):
+        start_background_services(app)
     
     return app
+
+def start_background_services(app: Flask):
+    """Load the in-memory caches and start the listeners that keep them current.
+
+    Runs once per worker process: from create_app, or from gunicorn's
+    post_worker_init hook when the app was preloaded before fork.
+    """
+    # Load the greenlist into memory and keep it current
+    if app.config.get('GREENLIST_CACHE_ENABLED'):
+        from app.models.greenlist import get_greenlist_cache
+        get_greenlist_cache().start()
+    
+    # Load subscriptions into memory for plan entitlements
+    if app.config.get('ENTITLEMENTS_ENABLED'):
+        from app.models.payment import get_subscription_cache
+        get_subscription_cache().start()
+    
+    # Load current agreement versions and keep them current
+    from app.models.user_agreement import get_agreement_versions
+    get_agreement_versions().start()
+    
+    # Load A/B experiments into memory and keep them current
+    from app.services.experiment_registry import get_experiment_registry
+    get_experiment_registry().start()
@@ -3,6 +3,19 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def _default_provider_admission() -> tuple:
+    """Provider-bound requests a worker runs and queues unless configured.
+
+    In gthread mode a queued request holds a thread too, so three
+    quarters of the threads run provider calls, an eighth may wait, and
+    the rest stay free for other routes. Gevent greenlets are cheap, so
+    there the limit only stops pile-ups.
+    """
+    if os.environ.get('SERVING_MODE', 'gevent').lower() == 'gthread':
+        threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+        return max(1, threads * 3 // 4), threads // 8
+    return 64, 64
+
 class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -14,6 +27,10 @@ class Config:
     # Firestore Configuration
     FIRESTORE_DATABASE = os.environ.get('FIRESTORE_DATABASE', '(default)')
     
+    # Storage Configuration
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'firestore')  # 'firestore', 'memory' or 'sqlite'
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'local.db')
+    
     # Model API Keys
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     GOOGLE_AI_API_KEY = os.environ.get('GOOGLE_AI_API_KEY')
@@ -21,11 +38,95 @@ class Config:
     # A/B Testing Configuration
     AB_TEST_ENABLED = os.environ.get('AB_TEST_ENABLED', 'false').lower() == 'true'
     AB_TEST_SPLIT_RATIO = float(os.environ.get('AB_TEST_SPLIT_RATIO', '0.5'))
+    # 'fixed' or 'bandit'. Keep 'fixed': chat turns go to the LLM backend over
+    # Pub/Sub, which reports no provider outcomes for the bandit to learn from
+    AB_TEST_ALLOCATION = os.environ.get('AB_TEST_ALLOCATION', 'fixed')
+    AB_BANDIT_REFRESH_INTERVAL = int(os.environ.get('AB_BANDIT_REFRESH_INTERVAL', '60'))
+    AB_BANDIT_MIN_WEIGHT = float(os.environ.get('AB_BANDIT_MIN_WEIGHT', '0.05'))
+    AB_REGISTRY_REFRESH_INTERVAL = int(os.environ.get('AB_REGISTRY_REFRESH_INTERVAL', '10'))
+    AB_EVENT_BUFFER_SIZE = int(os.environ.get('AB_EVENT_BUFFER_SIZE', '10000'))
+    AB_EVENT_BATCH_SIZE = int(os.environ.get('AB_EVENT_BATCH_SIZE', '200'))
+    AB_EVENT_FLUSH_INTERVAL = float(os.environ.get('AB_EVENT_FLUSH_INTERVAL', '2.0'))
+    AB_ROLLUP_SHARDS = int(os.environ.get('AB_ROLLUP_SHARDS', '10'))
+    
+    # Plan Configuration
+    DEFAULT_PLAN = os.environ.get('DEFAULT_PLAN', 'free')
+    ENTITLEMENTS_ENABLED = os.environ.get('ENTITLEMENTS_ENABLED', 'false').lower() == 'true'
+    SUBSCRIPTION_REFRESH_INTERVAL = int(os.environ.get('SUBSCRIPTION_REFRESH_INTERVAL', '300'))
+    
+    # Admission Control: per-worker concurrency limits for expensive route
+    # classes, with a bounded wait queue and 503s beyond it
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_PROVIDER_LIMIT = int(os.environ.get('ADMISSION_PROVIDER_LIMIT', _default_provider_admission()[0]))
+    ADMISSION_PROVIDER_MAX_LIMIT = int(os.environ.get('ADMISSION_PROVIDER_MAX_LIMIT', ADMISSION_PROVIDER_LIMIT))
+    ADMISSION_PROVIDER_QUEUE = int(os.environ.get('ADMISSION_PROVIDER_QUEUE', _default_provider_admission()[1]))
+    ADMISSION_TARGET_LATENCY = float(os.environ.get('ADMISSION_TARGET_LATENCY', '15'))
+    ADMISSION_BATCH_LIMIT = int(os.environ.get('ADMISSION_BATCH_LIMIT', '2'))
+    ADMISSION_BATCH_QUEUE = int(os.environ.get('ADMISSION_BATCH_QUEUE', '4'))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '5'))
+    
+    # Logging Configuration: JSON lines on stdout, written by a background thread.
+    # LOG_LEVELS and LOG_SAMPLE_RATES are comma-separated logger=value lists
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+    
+    # Metrics Configuration
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # Response Compression Configuration
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+    
+    # Firestore operation counts in X-Firestore-* response headers (always on in debug)
+    FIRESTORE_OP_HEADERS = os.environ.get('FIRESTORE_OP_HEADERS', 'false').lower() == 'true'
+    
+    # Agreement Configuration
+    AGREEMENTS_REQUIRED = os.environ.get('AGREEMENTS_REQUIRED', 'false').lower() == 'true'
+    AGREEMENT_CACHE_TTL = int(os.environ.get('AGREEMENT_CACHE_TTL', '60'))
+    AGREEMENT_CACHE_SIZE = int(os.environ.get('AGREEMENT_CACHE_SIZE', '10000'))
+    AGREEMENT_REFRESH_INTERVAL = int(os.environ.get('AGREEMENT_REFRESH_INTERVAL', '300'))
+    
+    # Quota Configuration
+    QUOTA_ENABLED = os.environ.get('QUOTA_ENABLED', 'false').lower() == 'true'
+    QUOTA_COUNTER_SHARDS = int(os.environ.get('QUOTA_COUNTER_SHARDS', '4'))
+    QUOTA_SYNC_INTERVAL = float(os.environ.get('QUOTA_SYNC_INTERVAL', '5'))
+    QUOTA_SYNC_MARGIN = int(os.environ.get('QUOTA_SYNC_MARGIN', '3'))
+    
+    # Usage Metering Configuration
+    USAGE_METERING_ENABLED = os.environ.get('USAGE_METERING_ENABLED', 'true').lower() == 'true'
+    USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', '10'))
+    
+    # Telemetry Export Configuration
+    TELEMETRY_EXPORT_DIR = os.environ.get('TELEMETRY_EXPORT_DIR', 'exports')
+    TELEMETRY_EXPORT_FORMAT = os.environ.get('TELEMETRY_EXPORT_FORMAT', 'parquet')  # 'parquet' or 'arrow'
+    TELEMETRY_EXPORT_CHUNK_ROWS = int(os.environ.get('TELEMETRY_EXPORT_CHUNK_ROWS', '50000'))
+    TELEMETRY_EXPORT_SETTLE_SECONDS = int(os.environ.get('TELEMETRY_EXPORT_SETTLE_SECONDS', '300'))
+    
+    # Greenlist Configuration
+    GREENLIST_CACHE_ENABLED = os.environ.get('GREENLIST_CACHE_ENABLED', 'true').lower() == 'true'
+    GREENLIST_REFRESH_INTERVAL = int(os.environ.get('GREENLIST_REFRESH_INTERVAL', '300'))
+    GREENLIST_CACHE_MODE = os.environ.get('GREENLIST_CACHE_MODE', 'exact')  # 'exact' or 'bloom'
+    GREENLIST_BLOOM_ERROR_RATE = float(os.environ.get('GREENLIST_BLOOM_ERROR_RATE', '0.01'))
+    GREENLIST_CHECK_RATE = float(os.environ.get('GREENLIST_CHECK_RATE', '1.0'))
+    GREENLIST_CHECK_BURST = int(os.environ.get('GREENLIST_CHECK_BURST', '10'))
+    GREENLIST_IMPORT_CONCURRENCY = int(os.environ.get('GREENLIST_IMPORT_CONCURRENCY', '4'))
+    GREENLIST_PAGE_SIZE = int(os.environ.get('GREENLIST_PAGE_SIZE', '100'))
+    GREENLIST_MAX_PAGE_SIZE = int(os.environ.get('GREENLIST_MAX_PAGE_SIZE', '1000'))
+    
+    # Set by gunicorn.conf.py when the app is preloaded in the master, so
+    # caches and listeners start in each worker after fork
+    DEFER_BACKGROUND_SERVICES = os.environ.get('DEFER_BACKGROUND_SERVICES', 'false').lower() == 'true'
     
     # Application Configuration
     DEBUG = os.environ.get('FLASK_DEBUG', 'false').lower() == 'true'
     PORT = int(os.environ.get('PORT', 8080))
     
+    # Number of trusted proxies that append to X-Forwarded-For (Cloud Run adds one)
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '1'))
+    
     # CORS Configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:4200').split(',')
 
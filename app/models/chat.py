@@ -1,8 +1,12 @@
+import logging
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from google.cloud import firestore
+from typing import List, Dict, Any, Iterator, Optional
+from app.storage.document_store import DESCENDING, get_document_store
+from app.storage.paging import iter_time_range
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
 class MessageRole(Enum):
     USER = "user"
     ASSISTANT = "assistant"
@@ -45,7 +49,8 @@ class ChatSession:
     
     def __init__(self, session_id: str, user_id: str, title: str = None,
                  created_at: datetime = None, updated_at: datetime = None,
-                 messages: List[ChatMessage] = None, metadata: Dict[str, Any] = None):
+                 messages: List[ChatMessage] = None, metadata: Dict[str, Any] = None,
+                 version: int = 0):
         self.session_id = session_id
         self.user_id = user_id
         self.title = title
@@ -53,11 +58,14 @@ class ChatSession:
         self.updated_at = updated_at or datetime.utcnow()
         self.messages = messages or []
         self.metadata = metadata or {}
+        # Incremented on every change; clients revalidate against it
+        self.version = version
     
     def add_message(self, message: ChatMessage):
         """Add a message to the session"""
         self.messages.append(message)
         self.updated_at = datetime.utcnow()
+        self.version += 1
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert session to dictionary for Firestore"""
@@ -68,7 +76,21 @@ class ChatSession:
             'created_at': self.created_at,
             'updated_at': self.updated_at,
             'messages': [msg.to_dict() for msg in self.messages],
-            'metadata': self.metadata
+            'metadata': self.metadata,
+            'version': self.version
+        }
+    
+    def to_summary(self) -> Dict[str, Any]:
+        """Session fields without the messages, for responses that carry only new ones"""
+        return {
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'message_count': len(self.messages),
+            'metadata': self.metadata,
+            'version': self.version
         }
     
     @classmethod
@@ -82,71 +104,76 @@ class ChatSession:
             created_at=data.get('created_at'),
             updated_at=data.get('updated_at'),
             messages=messages,
-            metadata=data.get('metadata', {})
+            metadata=data.get('metadata', {}),
+            version=data.get('version', 0)
         )
 
 class ChatService:
     """Service class for chat operations"""
     
     def __init__(self):
-        self.db = firestore.Client()
+        self.store = get_document_store()
         self.sessions_collection = 'chat_sessions'
         self.messages_collection = 'chat_messages'
     
     def create_session(self, session: ChatSession) -> bool:
         """Create a new chat session"""
         try:
-            doc_ref = self.db.collection(self.sessions_collection).document(session.session_id)
-            doc_ref.set(session.to_dict())
+            self.store.set(self.sessions_collection, session.session_id, session.to_dict())
             return True
         except Exception as e:
-            print(f"Error creating chat session: {e}")
+            logger.error("Error creating chat session: %s", e)
             return False
     
     def get_session(self, session_id: str) -> Optional[ChatSession]:
         """Get chat session by ID"""
         try:
-            doc_ref = self.db.collection(self.sessions_collection).document(session_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                return ChatSession.from_dict(doc.to_dict())
+            data = self.store.get(self.sessions_collection, session_id)
+            if data is not None:
+                return ChatSession.from_dict(data)
             return None
         except Exception as e:
-            print(f"Error getting chat session: {e}")
+            logger.error("Error getting chat session: %s", e)
             return None
     
     def get_user_sessions(self, user_id: str, limit: int = 50) -> List[ChatSession]:
         """Get all sessions for a user"""
         try:
-            query = (self.db.collection(self.sessions_collection)
-                    .where('user_id', '==', user_id)
-                    .order_by('updated_at', direction=firestore.Query.DESCENDING)
-                    .limit(limit))
+            docs = self.store.query(self.sessions_collection,
+                                    filters=[('user_id', '==', user_id)],
+                                    order_by=[('updated_at', DESCENDING)],
+                                    limit=limit)
             
             sessions = []
-            for doc in query.stream():
-                sessions.append(ChatSession.from_dict(doc.to_dict()))
+            for _, data in docs:
+                sessions.append(ChatSession.from_dict(data))
             return sessions
         except Exception as e:
-            print(f"Error getting user sessions: {e}")
+            logger.error("Error getting user sessions: %s", e)
             return []
     
+    def iter_updated_sessions(self, since: datetime = None, until: datetime = None,
+                              page_size: int = 100) -> Iterator[ChatSession]:
+        """Stream sessions with ``since < updated_at <= until``, oldest first"""
+        docs = iter_time_range(self.store, self.sessions_collection, 'updated_at',
+                               since, until, page_size)
+        for _, data in docs:
+            yield ChatSession.from_dict(data)
+    
     def update_session(self, session_id: str, updates: Dict[str, Any]) -> bool:
         """Update chat session"""
         try:
-            doc_ref = self.db.collection(self.sessions_collection).document(session_id)
-            doc_ref.update(updates)
+            self.store.update(self.sessions_collection, session_id, updates)
             return True
         except Exception as e:
-            print(f"Error updating chat session: {e}")
+            logger.error("Error updating chat session: %s", e)
             return False
     
     def delete_session(self, session_id: str) -> bool:
         """Delete chat session"""
         try:
-            doc_ref = self.db.collection(self.sessions_collection).document(session_id)
-            doc_ref.delete()
+            self.store.delete(self.sessions_collection, session_id)
             return True
         except Exception as e:
-            print(f"Error deleting chat session: {e}")
+            logger.error("Error deleting chat session: %s", e)
             return False
@@ -1,6 +1,17 @@
+import logging
+import csv
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
-from typing import Optional, Dict, Any, List
-from google.cloud import firestore
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
+from app.config import Config
+from app.storage.document_store import BATCH_WRITE_LIMIT, get_document_store
+from app.utils.bloom_filter import BloomFilter
+from app.utils.collection_watcher import CollectionWatcher
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
 
 class GreenlistEntry:
     """Greenlist entry model for Firestore operations"""
@@ -35,28 +46,218 @@ class GreenlistEntry:
             is_active=data.get('is_active', True)
         )
 
+def _email_domain(email: str) -> Optional[str]:
+    """Return the domain part of an email address, if any"""
+    _, sep, domain = email.rpartition('@')
+    return domain if sep and domain else None
+
+def _domain_suffixes(domain: str) -> List[str]:
+    """Return a domain and each of its parent domains, most specific first"""
+    labels = domain.split('.')
+    # Stop before the bare top-level domain
+    return ['.'.join(labels[i:]) for i in range(max(len(labels) - 1, 1))]
+
+class GreenlistCache:
+    """In-memory view of the active greenlist, shared by a worker process.
+
+    Entries whose email starts with ``@`` (e.g. ``@laurelin-inc.com``) are
+    domain rules: they allow every address at that domain or one of its
+    subdomains. Domain rules live in a suffix index keyed by domain.
+
+    Individual addresses are held in one of two ways, chosen by
+    ``GREENLIST_CACHE_MODE``: ``exact`` keeps a set, so every lookup is
+    answered locally; ``bloom`` keeps only a Bloom filter, so misses are
+    answered locally and possible hits are confirmed with a point read.
+    The filter is rebuilt from the store when entries are deactivated or
+    it outgrows its sizing.
+    """
+
+    # Seconds to wait after a change before rebuilding the Bloom filter,
+    # so a burst of removals triggers a single rebuild
+    REBUILD_DELAY = 5
+
+    def __init__(self, collection: str = 'greenlist', refresh_interval: int = None,
+                 mode: str = None):
+        self.collection = collection
+        self.refresh_interval = refresh_interval or Config.GREENLIST_REFRESH_INTERVAL
+        self.mode = mode or Config.GREENLIST_CACHE_MODE
+        self._emails = set()
+        self._domains = set()
+        self._bloom = BloomFilter(1) if self.mode == 'bloom' else None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._rebuild_timer = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the cache holds a loaded snapshot of the greenlist"""
+        return self._watcher is not None and self._watcher.ready
+
+    def start(self):
+        """Load the greenlist and keep it current via the store's change listener"""
+        if self._watcher is None:
+            self._watcher = CollectionWatcher(
+                get_document_store(),
+                self.collection,
+                on_reset=self._reset,
+                on_change=self._apply_change,
+                refresh_interval=self.refresh_interval
+            )
+        self._watcher.start()
+
+    def stop(self):
+        """Stop receiving greenlist updates"""
+        if self._rebuild_timer is not None:
+            self._rebuild_timer.cancel()
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def lookup(self, email: str) -> Optional[bool]:
+        """Check an email against the cached addresses and domain rules.
+
+        Returns ``True`` or ``False`` when the cache can answer on its own,
+        or ``None`` when the Bloom filter reports a possible match that
+        must be confirmed against the store.
+        """
+        normalized_email = email.strip().lower()
+        if self._domains:
+            domain = _email_domain(normalized_email)
+            if domain:
+                domains = self._domains
+                if any(suffix in domains for suffix in _domain_suffixes(domain)):
+                    return True
+
+        if self._bloom is not None:
+            return None if normalized_email in self._bloom else False
+        return normalized_email in self._emails
+
+    def set_entry(self, email: str, is_active: bool):
+        """Apply a single greenlist change to the cache"""
+        normalized_email = email.strip().lower()
+        if normalized_email.startswith('@'):
+            with self._lock:
+                if is_active:
+                    self._domains.add(normalized_email[1:])
+                else:
+                    self._domains.discard(normalized_email[1:])
+            return
+
+        if self._bloom is None:
+            with self._lock:
+                if is_active:
+                    self._emails.add(normalized_email)
+                else:
+                    self._emails.discard(normalized_email)
+            return
+
+        # A Bloom filter cannot forget entries, so removals rebuild it
+        if not is_active:
+            self._schedule_rebuild()
+            return
+        with self._lock:
+            if normalized_email not in self._bloom:
+                self._bloom.add(normalized_email)
+            saturated = self._bloom.saturated
+        if saturated:
+            self._schedule_rebuild()
+
+    def _schedule_rebuild(self):
+        """Reload the greenlist shortly, coalescing bursts of changes"""
+        if self._watcher is None:
+            return
+        with self._lock:
+            if self._rebuild_timer is not None and self._rebuild_timer.is_alive():
+                return
+            self._rebuild_timer = threading.Timer(self.REBUILD_DELAY, self._watcher.reload)
+            self._rebuild_timer.daemon = True
+            self._rebuild_timer.start()
+
+    def _reset(self, docs: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Replace the cache contents with a full greenlist snapshot"""
+        emails = set()
+        domains = set()
+        for doc_id, data in docs:
+            if not data.get('is_active', True):
+                continue
+            email = data.get('email', doc_id).lower()
+            if email.startswith('@'):
+                domains.add(email[1:])
+            else:
+                emails.add(email)
+
+        bloom = None
+        if self._bloom is not None:
+            # Leave headroom for entries added before the next rebuild
+            bloom = BloomFilter.from_items(emails, capacity=max(len(emails) * 2, 1024),
+                                           error_rate=Config.GREENLIST_BLOOM_ERROR_RATE)
+            emails = set()
+
+        with self._lock:
+            self._emails = emails
+            self._domains = domains
+            if bloom is not None:
+                self._bloom = bloom
+
+    def _apply_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        """Apply a snapshot listener change to the cache"""
+        if change_type == 'REMOVED':
+            self.set_entry(doc_id, False)
+        else:
+            self.set_entry(data.get('email', doc_id), data.get('is_active', True))
+
+_greenlist_cache = None
+
+def get_greenlist_cache() -> GreenlistCache:
+    """Return the greenlist cache shared by this worker process"""
+    global _greenlist_cache
+    if _greenlist_cache is None:
+        _greenlist_cache = GreenlistCache()
+    return _greenlist_cache
+
 class GreenlistService:
     """Service class for greenlist operations"""
 
     def __init__(self):
-        self.db = firestore.Client()
+        self.store = get_document_store()
         self.collection = 'greenlist'
+        self.cache = get_greenlist_cache()
 
     def is_email_allowed(self, email: str) -> bool:
         """Check if an email is on the greenlist and active"""
+        if not isinstance(email, str):
+            return False
+        if self.cache.ready:
+            allowed = self.cache.lookup(email)
+            record_cache('greenlist', allowed is not None)
+            if allowed is not None:
+                return allowed
+
         try:
-            normalized_email = email.lower()
-            doc_ref = self.db.collection(self.collection).document(normalized_email)
-            doc = doc_ref.get()
+            normalized_email = email.strip().lower()
+            if self._is_entry_active(normalized_email):
+                return True
+            if self.cache.ready:
+                # The cache has already checked every domain rule
+                return False
 
-            if doc.exists:
-                data = doc.to_dict()
-                return data.get('is_active', True)
+            # Fall back to domain rules, most specific domain first
+            domain = _email_domain(normalized_email)
+            if domain:
+                for suffix in _domain_suffixes(domain):
+                    if self._is_entry_active(f"@{suffix}"):
+                        return True
             return False
         except Exception as e:
-            print(f"Error checking greenlist: {e}")
+            logger.error("Error checking greenlist: %s", e)
             return False
 
+    def _is_entry_active(self, doc_id: str) -> bool:
+        """Read a single greenlist document and report whether it is active"""
+        data = self.store.get(self.collection, doc_id)
+        if data is not None:
+            return data.get('is_active', True)
+        return False
+
     def add_email(self, email: str, added_by: str = None, notes: str = None) -> bool:
         """Add an email to the greenlist"""
         try:
@@ -67,78 +268,283 @@ class GreenlistService:
                 is_active=True
             )
             normalized_email = email.lower()
-            doc_ref = self.db.collection(self.collection).document(normalized_email)
-            doc_ref.set(entry.to_dict())
-            print(f"Added {email} to greenlist")
+            self.store.set(self.collection, normalized_email, entry.to_dict())
+            self.cache.set_entry(normalized_email, True)
+            logger.info("Added %s to greenlist", email)
             return True
         except Exception as e:
-            print(f"Error adding to greenlist: {e}")
+            logger.error("Error adding to greenlist: %s", e)
             return False
 
     def remove_email(self, email: str) -> bool:
         """Remove an email from the greenlist (soft delete)"""
         try:
             normalized_email = email.lower()
-            doc_ref = self.db.collection(self.collection).document(normalized_email)
-            doc_ref.update({'is_active': False})
-            print(f"Removed {email} from greenlist")
+            self.store.update(self.collection, normalized_email, {'is_active': False})
+            self.cache.set_entry(normalized_email, False)
+            logger.info("Removed %s from greenlist", email)
             return True
         except Exception as e:
-            print(f"Error removing from greenlist: {e}")
+            logger.error("Error removing from greenlist: %s", e)
             return False
 
     def delete_email(self, email: str) -> bool:
         """Permanently delete an email from the greenlist"""
         try:
             normalized_email = email.lower()
-            doc_ref = self.db.collection(self.collection).document(normalized_email)
-            doc_ref.delete()
-            print(f"Permanently deleted {email} from greenlist")
+            self.store.delete(self.collection, normalized_email)
+            self.cache.set_entry(normalized_email, False)
+            logger.info("Permanently deleted %s from greenlist", email)
             return True
         except Exception as e:
-            print(f"Error deleting from greenlist: {e}")
+            logger.error("Error deleting from greenlist: %s", e)
             return False
 
     def get_entry(self, email: str) -> Optional[GreenlistEntry]:
         """Get greenlist entry by email"""
         try:
             normalized_email = email.lower()
-            doc_ref = self.db.collection(self.collection).document(normalized_email)
-            doc = doc_ref.get()
-            if doc.exists:
-                return GreenlistEntry.from_dict(doc.to_dict())
+            data = self.store.get(self.collection, normalized_email)
+            if data is not None:
+                return GreenlistEntry.from_dict(data)
             return None
         except Exception as e:
-            print(f"Error getting greenlist entry: {e}")
+            logger.error("Error getting greenlist entry: %s", e)
             return None
 
     def list_all(self, active_only: bool = True) -> List[GreenlistEntry]:
         """List all greenlist entries"""
         try:
-            query = self.db.collection(self.collection)
-            if active_only:
-                query = query.where('is_active', '==', True)
-
-            docs = query.stream()
-            entries = []
-            for doc in docs:
-                entries.append(GreenlistEntry.from_dict(doc.to_dict()))
-            return entries
+            return list(self.iter_entries(active_only=active_only))
         except Exception as e:
-            print(f"Error listing greenlist: {e}")
+            logger.error("Error listing greenlist: %s", e)
             return []
 
+    def list_page(self, page_size: int = None, cursor: str = None,
+                  active_only: bool = True, added_by: str = None,
+                  email_prefix: str = None) -> Tuple[List[GreenlistEntry], Optional[str]]:
+        """List one page of greenlist entries ordered by email.
+
+        Returns the entries and the cursor for the next page, or ``None``
+        when this is the last page. Filtering by ``added_by`` together with
+        ``active_only`` requires a composite index on those fields and
+        ``email``.
+        """
+        page_size = page_size or Config.GREENLIST_PAGE_SIZE
+        filters = []
+        if active_only:
+            filters.append(('is_active', '==', True))
+        if added_by:
+            filters.append(('added_by', '==', added_by))
+        if email_prefix:
+            email_prefix = email_prefix.lower()
+            filters += [('email', '>=', email_prefix), ('email', '<', email_prefix + '\uf8ff')]
+
+        # Fetch one extra entry to learn whether another page exists
+        docs = list(self.store.query(
+            self.collection,
+            filters=filters,
+            order_by=['email'],
+            start_after={'email': cursor.lower()} if cursor else None,
+            limit=page_size + 1
+        ))
+        entries = [GreenlistEntry.from_dict(data) for _, data in docs[:page_size]]
+        next_cursor = entries[-1].email if len(docs) > page_size else None
+        return entries, next_cursor
+
+    def iter_entries(self, active_only: bool = True, added_by: str = None,
+                     email_prefix: str = None, page_size: int = None) -> Iterator[GreenlistEntry]:
+        """Iterate over greenlist entries one page at a time"""
+        cursor = None
+        while True:
+            entries, cursor = self.list_page(
+                page_size=page_size,
+                cursor=cursor,
+                active_only=active_only,
+                added_by=added_by,
+                email_prefix=email_prefix
+            )
+            yield from entries
+            if not cursor:
+                return
+
     def bulk_add_emails(self, emails: List[str], added_by: str = None) -> Dict[str, Any]:
         """Bulk add multiple emails to greenlist"""
+        report = self.import_rows(
+            ((row, email, None) for row, email in enumerate(emails, start=1)),
+            added_by=added_by
+        )
+
         results = {
             'success': [],
             'failed': []
         }
-
-        for email in emails:
-            if self.add_email(email, added_by=added_by):
-                results['success'].append(email)
+        for row in report['rows']:
+            # A repeat of an address earlier in the request was added with it
+            if row['status'] in ('added', 'duplicate'):
+                results['success'].append(row['email'])
             else:
-                results['failed'].append(email)
-
+                results['failed'].append(row['email'])
         return results
+
+    def import_rows(self, rows: Iterable[Tuple[int, str, Optional[str]]],
+                    added_by: str = None, start_row: int = 1,
+                    concurrency: int = None) -> Dict[str, Any]:
+        """Import ``(row, email, notes)`` rows using concurrent batched writes.
+
+        Rows before ``start_row`` are skipped so an interrupted import can be
+        resumed from the ``resume_from`` row of a previous report. Writes are
+        idempotent, so rows re-sent after a partial failure are harmless.
+        """
+        concurrency = concurrency or Config.GREENLIST_IMPORT_CONCURRENCY
+        report_rows = []
+        failed_batch_starts = []
+        last_row = start_row - 1
+        pending = set()
+        batch = []
+        batch_emails = set()
+
+        def collect(done):
+            for future in done:
+                first_row, entries, error = future.result()
+                for row_result in entries:
+                    if error:
+                        row_result.update({'status': 'failed', 'error': error})
+                    else:
+                        row_result['status'] = 'added'
+                if error:
+                    failed_batch_starts.append(first_row)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for row, email, notes in rows:
+                if row < start_row:
+                    continue
+                last_row = row
+                if email is not None and not isinstance(email, str):
+                    # JSON and NDJSON uploads can carry numbers, lists or objects
+                    report_rows.append({'row': row, 'email': email, 'status': 'invalid',
+                                        'error': 'Email must be a string'})
+                    continue
+                normalized_email = (email or '').strip().lower()
+                row_result = {'row': row, 'email': normalized_email}
+                report_rows.append(row_result)
+
+                if not _is_valid_entry(normalized_email):
+                    row_result.update({'status': 'invalid', 'error': 'Invalid email address'})
+                    continue
+                if normalized_email in batch_emails:
+                    row_result['status'] = 'duplicate'
+                    continue
+
+                batch.append((row_result, notes))
+                batch_emails.add(normalized_email)
+                if len(batch) == BATCH_WRITE_LIMIT:
+                    pending.add(executor.submit(self._commit_batch, batch, added_by))
+                    batch = []
+                    batch_emails = set()
+                    # Bound the number of batches held in memory at once
+                    if len(pending) >= concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+            if batch:
+                pending.add(executor.submit(self._commit_batch, batch, added_by))
+            done, _ = wait(pending)
+            collect(done)
+
+        summary = {}
+        for row_result in report_rows:
+            summary[row_result['status']] = summary.get(row_result['status'], 0) + 1
+
+        return {
+            'rows': report_rows,
+            'summary': summary,
+            'last_row': last_row,
+            'resume_from': min(failed_batch_starts) if failed_batch_starts else None
+        }
+
+    def _commit_batch(self, batch: List[Tuple[Dict[str, Any], Optional[str]]],
+                      added_by: str = None) -> Tuple[int, List[Dict[str, Any]], Optional[str]]:
+        """Write one batch of greenlist entries in a single commit"""
+        entries = [row_result for row_result, _ in batch]
+        try:
+            docs = []
+            for row_result, notes in batch:
+                entry = GreenlistEntry(
+                    email=row_result['email'],
+                    added_by=added_by,
+                    notes=notes,
+                    is_active=True
+                )
+                docs.append((entry.email, entry.to_dict()))
+            self.store.set_many(self.collection, docs)
+
+            for row_result in entries:
+                self.cache.set_entry(row_result['email'], True)
+            return entries[0]['row'], entries, None
+        except Exception as e:
+            logger.error("Error committing greenlist batch starting at row %s: %s", entries[0]['row'], e)
+            return entries[0]['row'], entries, str(e)
+
+def _is_valid_entry(email: str) -> bool:
+    """Check that an email address or '@domain' rule is well formed"""
+    if not email or any(ch.isspace() for ch in email) or '/' in email:
+        return False
+    local, sep, domain = email.rpartition('@')
+    if not sep or '.' not in domain or domain.startswith('.') or domain.endswith('.'):
+        return False
+    return '@' not in local
+
+def parse_csv_rows(lines: Iterable[str]) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Yield ``(row, email, notes)`` from CSV lines.
+
+    A header row naming an ``email`` column (and optionally ``notes``) is
+    honoured; otherwise the first column is the email and the second the
+    notes. Row numbers count data rows from 1.
+    """
+    reader = csv.reader(lines)
+    email_index, notes_index = 0, 1
+    row = 0
+    seen_record = False
+    for record in reader:
+        if not record:
+            continue
+        # The header, if any, is the first non-empty line
+        if not seen_record:
+            seen_record = True
+            header = [cell.strip().lower() for cell in record]
+            if 'email' in header:
+                email_index = header.index('email')
+                notes_index = header.index('notes') if 'notes' in header else None
+                continue
+        row += 1
+        email = record[email_index] if email_index < len(record) else ''
+        notes = None
+        if notes_index is not None and notes_index < len(record):
+            notes = record[notes_index].strip() or None
+        yield row, email, notes
+
+def parse_ndjson_rows(lines: Iterable[str]) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Yield ``(row, email, notes)`` from NDJSON lines.
+
+    Each line is either an object with ``email`` and optional ``notes``
+    keys or a bare JSON string. Malformed lines yield an empty email so
+    they are reported as invalid rows.
+    """
+    row = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, '', None
+            continue
+        if isinstance(record, dict):
+            yield row, record.get('email') or '', record.get('notes')
+        elif isinstance(record, str):
+            yield row, record, None
+        else:
+            yield row, '', None
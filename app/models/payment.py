@@ -1,9 +1,16 @@
 # Payment Model - Placeholder for Future Implementation
 # TODO: Implement payment processing integration (Stripe, PayPal, etc.)
 
-from datetime import datetime
-from typing import Optional, Dict, Any
-from google.cloud import firestore
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterable, Tuple
+from app.config import Config
+from app.storage.document_store import get_document_store
+from app.utils.collection_watcher import CollectionWatcher
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
 
 class PaymentPlan:
     """Payment plan model - Placeholder"""
@@ -16,6 +23,12 @@ class PaymentPlan:
         self.features = features
         self.billing_period = billing_period  # 'monthly', 'yearly', 'one-time'
 
+    @property
+    def messages_per_day(self) -> Optional[int]:
+        """Daily message limit, or None when unlimited"""
+        limit = self.features.get('messages_per_day')
+        return limit if isinstance(limit, int) else None
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             'plan_id': self.plan_id,
@@ -37,6 +50,18 @@ class UserSubscription:
         self.started_at = started_at or datetime.utcnow()
         self.expires_at = expires_at
 
+    def is_active(self, now: datetime = None) -> bool:
+        """Whether the subscription currently grants its plan"""
+        if self.status not in ('active', 'trial'):
+            return False
+        if self.expires_at is None:
+            return True
+        now = now or datetime.now(timezone.utc)
+        expires_at = self.expires_at
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at > now
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             'user_id': self.user_id,
@@ -46,12 +71,100 @@ class UserSubscription:
             'expires_at': self.expires_at
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserSubscription':
+        return cls(
+            user_id=data['user_id'],
+            plan_id=data['plan_id'],
+            status=data.get('status', 'active'),
+            started_at=data.get('started_at'),
+            expires_at=data.get('expires_at')
+        )
+
+class SubscriptionCache:
+    """In-memory copy of the ``subscriptions`` collection, shared per worker.
+
+    Documents are keyed by user id. The cache is loaded at startup and kept
+    current by the store's change listener, so plan lookups never read the
+    store once it is ready.
+    """
+
+    def __init__(self, collection: str = 'subscriptions', refresh_interval: int = None):
+        self.collection = collection
+        self.refresh_interval = refresh_interval or Config.SUBSCRIPTION_REFRESH_INTERVAL
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the cache holds a loaded snapshot of the subscriptions"""
+        return self._watcher is not None and self._watcher.ready
+
+    def start(self):
+        """Load subscriptions and keep them current via the store's change listener"""
+        if self._watcher is None:
+            self._watcher = CollectionWatcher(
+                get_document_store(),
+                self.collection,
+                on_reset=self._reset,
+                on_change=self._apply_change,
+                refresh_interval=self.refresh_interval
+            )
+        self._watcher.start()
+
+    def stop(self):
+        """Stop receiving subscription updates"""
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def get(self, user_id: str) -> Optional[UserSubscription]:
+        """The user's cached subscription, if any"""
+        return self._subscriptions.get(user_id)
+
+    def put(self, user_id: str, subscription: Optional[UserSubscription]):
+        """Apply a local write immediately, ahead of the listener"""
+        with self._lock:
+            if subscription is None:
+                self._subscriptions.pop(user_id, None)
+            else:
+                self._subscriptions[user_id] = subscription
+
+    def _reset(self, docs: Iterable[Tuple[str, Dict[str, Any]]]):
+        subscriptions = {}
+        for doc_id, data in docs:
+            try:
+                subscriptions[doc_id] = UserSubscription.from_dict(data)
+            except KeyError as e:
+                logger.warning("Skipping malformed subscription %s: missing %s", doc_id, e)
+        with self._lock:
+            self._subscriptions = subscriptions
+
+    def _apply_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        if change_type == 'REMOVED' or data is None:
+            self.put(doc_id, None)
+            return
+        try:
+            self.put(doc_id, UserSubscription.from_dict(data))
+        except KeyError as e:
+            logger.warning("Skipping malformed subscription %s: missing %s", doc_id, e)
+
+_subscription_cache = None
+
+def get_subscription_cache() -> SubscriptionCache:
+    """Return the subscription cache shared by this worker process"""
+    global _subscription_cache
+    if _subscription_cache is None:
+        _subscription_cache = SubscriptionCache()
+    return _subscription_cache
+
 class PaymentService:
     """Payment service - Placeholder for future implementation"""
 
     def __init__(self):
-        self.db = firestore.Client()
         self.collection = 'subscriptions'
+        self.cache = get_subscription_cache()
+        self.store = get_document_store()
 
     # TODO: Implement these methods when payment integration is ready
     def create_subscription(self, user_id: str, plan_id: str) -> bool:
@@ -68,7 +181,28 @@ class PaymentService:
 
     def get_user_subscription(self, user_id: str) -> Optional[UserSubscription]:
         """Get user's current subscription"""
-        raise NotImplementedError("Payment processing not yet implemented")
+        record_cache('subscriptions', self.cache.ready)
+        if self.cache.ready:
+            return self.cache.get(user_id)
+
+        try:
+            data = self.store.get(self.collection, user_id)
+            if data is not None:
+                return UserSubscription.from_dict(data)
+            return None
+        except Exception as e:
+            logger.error("Error getting subscription: %s", e)
+            return None
+
+    def save_subscription(self, subscription: UserSubscription) -> bool:
+        """Store a user's subscription and refresh the cached copy"""
+        try:
+            self.store.set(self.collection, subscription.user_id, subscription.to_dict())
+            self.cache.put(subscription.user_id, subscription)
+            return True
+        except Exception as e:
+            logger.error("Error saving subscription: %s", e)
+            return False
 
 # Predefined payment plans (example)
 PAYMENT_PLANS = {
@@ -1,6 +1,9 @@
+import logging
 from datetime import datetime
 from typing import Optional, Dict, Any
-from google.cloud import firestore
+from app.storage.document_store import get_document_store
+
+logger = logging.getLogger(__name__)
 
 class User:
     """User model for Firestore operations"""
@@ -42,47 +45,43 @@ class UserService:
     """Service class for user operations"""
     
     def __init__(self):
-        self.db = firestore.Client()
+        self.store = get_document_store()
         self.collection = 'users'
     
     def create_user(self, user: User) -> bool:
-        """Create a new user in Firestore"""
+        """Create a new user"""
         try:
-            doc_ref = self.db.collection(self.collection).document(user.user_id)
-            doc_ref.set(user.to_dict())
+            self.store.set(self.collection, user.user_id, user.to_dict())
             return True
         except Exception as e:
-            print(f"Error creating user: {e}")
+            logger.error("Error creating user: %s", e)
             return False
     
     def get_user(self, user_id: str) -> Optional[User]:
-        """Get user by ID from Firestore"""
+        """Get user by ID"""
         try:
-            doc_ref = self.db.collection(self.collection).document(user_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                return User.from_dict(doc.to_dict())
+            data = self.store.get(self.collection, user_id)
+            if data is not None:
+                return User.from_dict(data)
             return None
         except Exception as e:
-            print(f"Error getting user: {e}")
+            logger.error("Error getting user: %s", e)
             return None
     
     def update_user(self, user_id: str, updates: Dict[str, Any]) -> bool:
-        """Update user in Firestore"""
+        """Update user"""
         try:
-            doc_ref = self.db.collection(self.collection).document(user_id)
-            doc_ref.update(updates)
+            self.store.update(self.collection, user_id, updates)
             return True
         except Exception as e:
-            print(f"Error updating user: {e}")
+            logger.error("Error updating user: %s", e)
             return False
     
     def delete_user(self, user_id: str) -> bool:
-        """Delete user from Firestore"""
+        """Delete user"""
         try:
-            doc_ref = self.db.collection(self.collection).document(user_id)
-            doc_ref.delete()
+            self.store.delete(self.collection, user_id)
             return True
         except Exception as e:
-            print(f"Error deleting user: {e}")
+            logger.error("Error deleting user: %s", e)
             return False
@@ -1,12 +1,22 @@
-# User Agreement Model - Placeholder for Future Implementation
-# TODO: Implement terms of service, privacy policy, and user agreement tracking
+# User Agreement Model
+# Terms of service, privacy policy, and user agreement tracking
 
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, Dict, Any
-from google.cloud import firestore
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+from app.config import Config
+from app.storage.document_store import get_document_store
+from app.utils.collection_watcher import CollectionWatcher
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
 
 class UserAgreement:
-    """User agreement acceptance model - Placeholder"""
+    """A user's acceptance of one agreement version"""
 
     def __init__(self, user_id: str, agreement_type: str,
                  version: str, accepted_at: datetime = None,
@@ -26,39 +36,251 @@ class UserAgreement:
             'ip_address': self.ip_address
         }
 
+def versions_stamp(versions: Dict[str, str]) -> str:
+    """Short, order-independent digest of a set of agreement versions"""
+    canonical = ';'.join(f"{name}={version}" for name, version in sorted(versions.items()))
+    return f"{zlib.crc32(canonical.encode('utf-8')):08x}"
+
+class AgreementVersions:
+    """Current agreement versions, shared per worker.
+
+    Versions default to ``AGREEMENT_TEMPLATES`` and are overridden by
+    documents in ``agreement_versions`` (id = agreement type, field
+    ``version``), kept current by the store's change listener. ``stamp`` changes
+    whenever any version does.
+    """
+
+    def __init__(self, collection: str = 'agreement_versions', refresh_interval: int = None):
+        self.collection = collection
+        self.refresh_interval = refresh_interval or Config.AGREEMENT_REFRESH_INTERVAL
+        self.current = self._defaults()
+        self.stamp = versions_stamp(self.current)
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    @staticmethod
+    def _defaults() -> Dict[str, str]:
+        return {name: template['version'] for name, template in AGREEMENT_TEMPLATES.items()}
+
+    @property
+    def ready(self) -> bool:
+        """Whether the versions were loaded from the document store"""
+        return self._watcher is not None and self._watcher.ready
+
+    def start(self):
+        """Load versions and keep them current via the store's change listener"""
+        if self._watcher is None:
+            self._watcher = CollectionWatcher(
+                get_document_store(),
+                self.collection,
+                on_reset=self._reset,
+                on_change=self._apply_change,
+                refresh_interval=self.refresh_interval
+            )
+        self._watcher.start()
+
+    def stop(self):
+        """Stop receiving version updates"""
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def put(self, agreement_type: str, version: Optional[str]):
+        """Apply a local write immediately, ahead of the listener"""
+        self._apply_change('REMOVED' if version is None else 'MODIFIED',
+                           agreement_type, {'version': version})
+
+    def _publish(self, current: Dict[str, str]):
+        self.current = current
+        self.stamp = versions_stamp(current)
+
+    def _reset(self, docs: Iterable[Tuple[str, Dict[str, Any]]]):
+        current = self._defaults()
+        for doc_id, data in docs:
+            if data.get('version'):
+                current[doc_id] = str(data['version'])
+        with self._lock:
+            self._publish(current)
+
+    def _apply_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        with self._lock:
+            current = dict(self.current)
+            if change_type == 'REMOVED' or not (data or {}).get('version'):
+                current.pop(doc_id, None)
+                default = self._defaults().get(doc_id)
+                if default:
+                    current[doc_id] = default
+            else:
+                current[doc_id] = str(data['version'])
+            self._publish(current)
+
+_agreement_versions = None
+
+def get_agreement_versions() -> AgreementVersions:
+    """Return the agreement versions shared by this worker process"""
+    global _agreement_versions
+    if _agreement_versions is None:
+        _agreement_versions = AgreementVersions()
+    return _agreement_versions
+
 class AgreementService:
-    """Service for managing user agreements - Placeholder"""
+    """Tracks which agreement versions each user has accepted.
+
+    A user's acceptances are one document, ``user_agreements/{user_id}``,
+    holding a ``versions`` map of agreement type to accepted version.
+    Request-time checks never read it when the user's JWT carries an
+    ``agr`` claim equal to the current versions stamp. Otherwise the
+    record comes from a per-worker LRU cache. Entries stay valid until the
+    versions stamp changes, except that records still missing a current
+    version are re-read after ``AGREEMENT_CACHE_TTL`` seconds, in case the
+    user accepted on another worker.
+    """
+
+    # Accepted-version records cached per worker process
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
 
     def __init__(self):
-        self.db = firestore.Client()
         self.collection = 'user_agreements'
-        # Current versions of agreements
-        self.current_versions = {
-            'terms_of_service': '1.0',
-            'privacy_policy': '1.0',
-            'acceptable_use': '1.0'
-        }
+        self.versions = get_agreement_versions()
+        self.cache_size = Config.AGREEMENT_CACHE_SIZE
+        self.cache_ttl = Config.AGREEMENT_CACHE_TTL
+        self.store = get_document_store()
+
+    @property
+    def current_versions(self) -> Dict[str, str]:
+        """Current versions of agreements"""
+        return self.versions.current
 
     def record_acceptance(self, user_id: str, agreement_type: str,
                          version: str, ip_address: Optional[str] = None) -> bool:
         """Record user's acceptance of an agreement"""
-        # TODO: Implement when user agreement tracking is ready
-        raise NotImplementedError("User agreement tracking not yet implemented")
+        if self.current_versions.get(agreement_type) != version:
+            return False
+        return self.record_acceptances(user_id, [agreement_type], ip_address)
+
+    def record_acceptances(self, user_id: str, agreement_types: List[str],
+                           ip_address: Optional[str] = None) -> bool:
+        """Record acceptance of the current version of several agreements in one write"""
+        current = self.current_versions
+        acceptances = [
+            UserAgreement(user_id, agreement_type, current[agreement_type], ip_address=ip_address)
+            for agreement_type in agreement_types if agreement_type in current
+        ]
+        if not acceptances:
+            return False
+        try:
+            self.store.set(self.collection, user_id, {
+                'user_id': user_id,
+                'versions': {acceptance.agreement_type: acceptance.version
+                             for acceptance in acceptances},
+                'acceptances': {acceptance.agreement_type: {
+                    'version': acceptance.version,
+                    'accepted_at': acceptance.accepted_at,
+                    'ip_address': acceptance.ip_address
+                } for acceptance in acceptances},
+                'updated_at': datetime.utcnow()
+            }, merge=True)
+        except Exception as e:
+            logger.error("Error recording agreement acceptance: %s", e)
+            return False
+
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            versions = dict(entry[0]) if entry else None
+        if versions is None:
+            self._invalidate(user_id)
+        else:
+            versions.update({acceptance.agreement_type: acceptance.version
+                             for acceptance in acceptances})
+            self._remember(user_id, versions)
+        return True
 
     def check_acceptance(self, user_id: str, agreement_type: str) -> bool:
         """Check if user has accepted the current version of an agreement"""
-        # TODO: Implement when user agreement tracking is ready
-        raise NotImplementedError("User agreement tracking not yet implemented")
+        return not self.requires_new_acceptance(user_id).get(agreement_type, False)
 
     def get_user_agreements(self, user_id: str) -> Dict[str, Any]:
         """Get all agreements accepted by user"""
-        # TODO: Implement when user agreement tracking is ready
-        raise NotImplementedError("User agreement tracking not yet implemented")
+        try:
+            data = self.store.get(self.collection, user_id) or {}
+            self._remember(user_id, data.get('versions', {}))
+            return data.get('acceptances', {})
+        except Exception as e:
+            logger.error("Error getting user agreements: %s", e)
+            return {}
 
-    def requires_new_acceptance(self, user_id: str) -> Dict[str, bool]:
+    def requires_new_acceptance(self, user_id: str,
+                                claims: Dict[str, Any] = None) -> Dict[str, bool]:
         """Check which agreements require new acceptance due to version updates"""
-        # TODO: Implement when user agreement tracking is ready
-        raise NotImplementedError("User agreement tracking not yet implemented")
+        current = self.current_versions
+        if (claims or {}).get('agr') == self.versions.stamp:
+            record_cache('agreement_claims', True)
+            return {agreement_type: False for agreement_type in current}
+
+        accepted = self._accepted_versions(user_id)
+        return {
+            agreement_type: accepted.get(agreement_type) != version
+            for agreement_type, version in current.items()
+        }
+
+    def needs_acceptance(self, user_id: str, claims: Dict[str, Any] = None) -> List[str]:
+        """Agreement types the user still has to accept"""
+        return [agreement_type for agreement_type, required
+                in self.requires_new_acceptance(user_id, claims).items() if required]
+
+    def acceptance_claim(self, user_id: str) -> Optional[str]:
+        """Value for the ``agr`` JWT claim, if the user accepted every current version"""
+        if self.needs_acceptance(user_id):
+            return None
+        return self.versions.stamp
+
+    def _accepted_versions(self, user_id: str) -> Dict[str, str]:
+        """The user's accepted versions, from the cache when still valid"""
+        stamp = self.versions.stamp
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                versions, entry_stamp, fetched_at = entry
+                satisfied = all(versions.get(name) == version
+                                for name, version in self.current_versions.items())
+                if entry_stamp == stamp and (satisfied or
+                                             time.monotonic() - fetched_at < self.cache_ttl):
+                    self._cache.move_to_end(user_id)
+                    record_cache('agreements', True)
+                    return versions
+
+        record_cache('agreements', False)
+        try:
+            versions = (self.store.get(self.collection, user_id) or {}).get('versions', {})
+        except Exception as e:
+            logger.error("Error reading agreement acceptance: %s", e)
+            return entry[0] if entry is not None else {}
+        self._remember(user_id, versions)
+        return versions
+
+    def _remember(self, user_id: str, versions: Dict[str, str]):
+        with self._cache_lock:
+            self._cache[user_id] = (versions, self.versions.stamp, time.monotonic())
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _invalidate(self, user_id: str):
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def publish_version(self, agreement_type: str, version: str) -> bool:
+        """Bump an agreement's current version for every worker"""
+        try:
+            self.store.set(self.versions.collection, agreement_type, {
+                'version': version,
+                'updated_at': datetime.utcnow()
+            })
+            self.versions.put(agreement_type, version)
+            return True
+        except Exception as e:
+            logger.error("Error publishing agreement version: %s", e)
+            return False
 
 # Agreement text templates (placeholder)
 AGREEMENT_TEMPLATES = {
@@ -1,10 +1,14 @@
 from flask import Blueprint, request, jsonify
-from app.services.auth_service import AuthService
+from app.services.auth_service import AuthService, get_request_claims
 from app.services.ab_testing_service import ABTestingService
+from app.services.ab_analysis_service import ABAnalysisService
+from app.services.ab_rollup_service import SERVER_EVENT_TYPES, SERVER_METRICS
+from app.utils.admission import admission_controlled
 
 ab_testing_bp = Blueprint('ab_testing', __name__)
 auth_service = AuthService()
 ab_testing_service = ABTestingService()
+ab_analysis_service = ABAnalysisService(ab_testing_service)
 
 def get_current_user():
     """Helper function to get current authenticated user"""
@@ -26,19 +30,35 @@ def get_experiments():
         
         experiments = [
             {
-                'name': 'model_comparison',
-                'description': 'Compare OpenAI GPT vs Google Gemini performance',
-                'status': 'active',
-                'variants': {
-                    'openai': 0.5,
-                    'google': 0.5
-                }
+                'name': experiment.get('name'),
+                'description': experiment.get('description'),
+                'status': experiment.get('status'),
+                'variants': experiment.get('variants', {})
             }
+            for experiment in ab_testing_service.list_experiments()
         ]
         
         return jsonify({
             'success': True,
-            'experiments': experiments
+            'experiments': experiments,
+            'version': ab_testing_service.registry.version
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ab_testing_bp.route('/assignments', methods=['GET'])
+def get_user_assignments():
+    """Get user's variants in every active experiment"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        return jsonify({
+            'success': True,
+            'assignments': ab_testing_service.get_user_assignments(user.user_id),
+            'user_id': user.user_id
         }), 200
         
     except Exception as e:
@@ -52,7 +72,9 @@ def assign_to_experiment(experiment_name):
         if not user:
             return jsonify({'error': 'Authentication required'}), 401
         
-        variant = ab_testing_service.assign_user_to_variant(user.user_id, experiment_name)
+        variant = ab_testing_service.assign_user_to_variant(
+            user.user_id, experiment_name, get_request_claims().get('abv')
+        )
         
         return jsonify({
             'success': True,
@@ -79,15 +101,31 @@ def track_event(experiment_name):
         if not event_type:
             return jsonify({'error': 'event_type is required'}), 400
         
+        # Provider outcomes are recorded by the server, never by clients
+        if event_type in SERVER_EVENT_TYPES:
+            return jsonify({'error': f'{event_type} events are recorded by the server'}), 400
+        
+        if not isinstance(event_data, dict):
+            return jsonify({'error': 'event_data must be an object'}), 400
+        event_data = {key: value for key, value in event_data.items() if key not in SERVER_METRICS}
+        
+        rating = event_data.get('rating')
+        if rating is not None and (not isinstance(rating, (int, float)) or isinstance(rating, bool)
+                                   or not 0 <= rating <= 1):
+            return jsonify({'error': 'rating must be a number between 0 and 1'}), 400
+        
         success = ab_testing_service.track_event(
             user.user_id,
             experiment_name,
             event_type,
-            event_data
+            event_data,
+            assignment_vector=get_request_claims().get('abv'),
+            source='client'
         )
         
         if not success:
-            return jsonify({'error': 'Failed to track event'}), 500
+            # The event buffer is full; ask the client to back off
+            return jsonify({'error': 'Event buffer is full, try again later'}), 503
         
         return jsonify({
             'success': True,
@@ -115,6 +153,30 @@ def get_experiment_results(experiment_name):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@ab_testing_bp.route('/experiments/<experiment_name>/analysis', methods=['GET'])
+@admission_controlled('batch')
+def get_experiment_analysis(experiment_name):
+    """Get per-variant statistics and stopping decisions for an experiment"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        analysis = ab_analysis_service.analyze(
+            experiment_name,
+            conversion_event=request.args.get('conversion_event', 'message_sent'),
+            control=request.args.get('control'),
+            confidence=request.args.get('confidence', 0.95, type=float)
+        )
+        
+        return jsonify({
+            'success': True,
+            'analysis': analysis
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @ab_testing_bp.route('/experiments/<experiment_name>/assignment', methods=['GET'])
 def get_user_assignment(experiment_name):
     """Get user's assignment for a specific experiment"""
@@ -123,7 +185,9 @@ def get_user_assignment(experiment_name):
         if not user:
             return jsonify({'error': 'Authentication required'}), 401
         
-        variant = ab_testing_service.assign_user_to_variant(user.user_id, experiment_name)
+        variant = ab_testing_service.assign_user_to_variant(
+            user.user_id, experiment_name, get_request_claims().get('abv')
+        )
         
         return jsonify({
             'success': True,
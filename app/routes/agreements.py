@@ -0,0 +1,99 @@
+from flask import Blueprint, request, jsonify
+from app.services.auth_service import AuthService, get_request_claims
+from app.models.user_agreement import AGREEMENT_TEMPLATES
+from app.utils.client_ip import get_client_ip
+
+agreements_bp = Blueprint('agreements', __name__)
+auth_service = AuthService()
+agreement_service = auth_service.agreement_service
+
+def get_current_user():
+    """Get current user from request"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return None
+    return auth_service.get_current_user(auth_header)
+
+@agreements_bp.route('', methods=['GET'])
+def get_agreement_status():
+    """Current agreement versions and which ones the user still has to accept"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+
+        return jsonify({
+            'success': True,
+            'current_versions': agreement_service.current_versions,
+            'requires_acceptance': agreement_service.needs_acceptance(
+                user.user_id, get_request_claims())
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@agreements_bp.route('/<agreement_type>', methods=['GET'])
+def get_agreement(agreement_type):
+    """Get the text of an agreement at its current version"""
+    template = AGREEMENT_TEMPLATES.get(agreement_type)
+    if not template:
+        return jsonify({'error': 'Agreement not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'agreement_type': agreement_type,
+        'title': template['title'],
+        'version': agreement_service.current_versions.get(agreement_type, template['version']),
+        'content': template['content']
+    }), 200
+
+@agreements_bp.route('/accept', methods=['POST'])
+def accept_agreements():
+    """Accept the current version of one or more agreements.
+
+    Returns a refreshed token whose claims record the acceptance, so
+    later requests are checked without reading the user's record.
+    """
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+
+        data = request.get_json() or {}
+        agreement_types = data.get('agreement_types') or []
+        if not isinstance(agreement_types, list) or not agreement_types:
+            return jsonify({'error': 'agreement_types is required'}), 400
+
+        current_versions = agreement_service.current_versions
+        unknown = [name for name in agreement_types if name not in current_versions]
+        if unknown:
+            return jsonify({'error': f"Unknown agreement types: {', '.join(unknown)}"}), 400
+
+        # Reject acceptances of a version that was superseded in the meantime
+        versions = data.get('versions') or {}
+        stale = [name for name in agreement_types
+                 if name in versions and versions[name] != current_versions[name]]
+        if stale:
+            return jsonify({
+                'error': 'Agreement version is out of date',
+                'current_versions': current_versions
+            }), 409
+
+        if not agreement_service.record_acceptances(user.user_id, agreement_types,
+                                                    get_client_ip()):
+            return jsonify({'error': 'Failed to record acceptance'}), 500
+
+        claims = {name: value for name, value in get_request_claims().items()
+                  if name not in ('user_id', 'exp', 'iat', 'agr')}
+        accepted = agreement_service.acceptance_claim(user.user_id)
+        if accepted:
+            claims['agr'] = accepted
+
+        return jsonify({
+            'success': True,
+            'requires_acceptance': agreement_service.needs_acceptance(user.user_id),
+            'token': auth_service.create_jwt_token(user.user_id, claims)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
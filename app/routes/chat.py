@@ -1,9 +1,17 @@
 from flask import Blueprint, request, jsonify
-from app.services.auth_service import AuthService
-from app.services.model_service import ModelService
+from app.services.auth_service import AuthService, get_request_claims
+from app.services.model_service import ModelService, SUPPORTED_PROVIDERS
 from app.services.ab_testing_service import ABTestingService
+from app.services.entitlement_service import EntitlementService
+from app.services.quota_service import get_quota_service
 from app.models.chat import ChatSession, ChatMessage, MessageRole, ChatService
+from app.storage.document_store import Increment
+from app.utils.conditional import (
+    format_etag, is_not_modified, make_etag, not_modified_response, tag_response
+)
+from app.utils.admission import admission_controlled
 from app.config import Config
+import time
 import uuid
 from datetime import datetime
 
@@ -12,6 +20,8 @@ auth_service = AuthService()
 model_service = ModelService()
 ab_testing_service = ABTestingService()
 chat_service = ChatService()
+entitlement_service = EntitlementService()
+quota_service = get_quota_service()
 
 def get_current_user():
     """Helper function to get current authenticated user"""
@@ -20,6 +30,18 @@ def get_current_user():
         return None
     return auth_service.get_current_user(auth_header)
 
+def served_by_llm_backend(response: dict) -> bool:
+    """Whether a turn was handed to the LLM backend rather than a provider.
+
+    Such a turn's outcome, latency and reply are not known to this
+    service, so they are kept out of experiment metrics.
+    """
+    return response.get('metadata', {}).get('provider') == 'llm-backend'
+
+def session_etag(session: ChatSession) -> str:
+    """ETag of a session's representation, from its version and last update"""
+    return make_etag(session.session_id, session.version, session.updated_at)
+
 @chat_bp.route('/sessions', methods=['GET'])
 def get_sessions():
     """Get all chat sessions for current user"""
@@ -29,10 +51,18 @@ def get_sessions():
             return jsonify({'error': 'Authentication required'}), 401
         
         sessions = chat_service.get_user_sessions(user.user_id)
-        return jsonify({
+        
+        # The list changes only when a session is added, removed or updated
+        etag = make_etag(user.user_id, [(session.session_id, session.version, session.updated_at)
+                                        for session in sessions])
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        response = jsonify({
             'success': True,
             'sessions': [session.to_dict() for session in sessions]
-        }), 200
+        })
+        return tag_response(response, etag), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -81,17 +111,26 @@ def get_session(session_id):
         if session.user_id != user.user_id:
             return jsonify({'error': 'Access denied'}), 403
         
-        return jsonify({
+        etag = session_etag(session)
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+        
+        response = jsonify({
             'success': True,
             'session': session.to_dict()
-        }), 200
+        })
+        return tag_response(response, etag), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @chat_bp.route('/sessions/<session_id>/messages', methods=['POST'])
+@admission_controlled('provider')
 def send_message(session_id):
     """Send a message and get AI response"""
+    # Set once a message is taken from the user's quota, so a turn that
+    # fails afterwards can give it back
+    reserved_for = None
     try:
         user = get_current_user()
         if not user:
@@ -104,12 +143,44 @@ def send_message(session_id):
         
         if session.user_id != user.user_id:
             return jsonify({'error': 'Access denied'}), 403
+        loaded_version = session.version
         
         data = request.get_json()
         user_message = data.get('message')
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
+        # With delta, only this turn's messages are returned, so the
+        # response does not grow with the conversation
+        delta = bool(data.get('delta', False))
+        
+        # Agreement acceptance is checked against the JWT or a per-worker cache
+        if Config.AGREEMENTS_REQUIRED:
+            pending = auth_service.agreement_service.needs_acceptance(
+                user.user_id, get_request_claims())
+            if pending:
+                return jsonify({
+                    'error': 'Agreement acceptance required',
+                    'requires_acceptance': pending
+                }), 403
+        
+        # Plan entitlements are resolved from memory and the JWT
+        entitlements = entitlement_service.for_user(user.user_id, get_request_claims())
+        
+        # Enforce the daily message quota against in-memory counters
+        if Config.QUOTA_ENABLED:
+            allowed, quota = quota_service.check(user.user_id, entitlements.messages_per_day)
+            if not allowed:
+                response = jsonify({
+                    'error': 'Daily message quota exceeded',
+                    'limit': quota['limit'],
+                    'used': quota['used']
+                })
+                response.headers['Retry-After'] = str(quota['retry_after'])
+                return response, 429
+            if quota['limit'] is not None:
+                reserved_for = user.user_id
+        
         # Add user message to session
         user_msg = ChatMessage(
             role=MessageRole.USER,
@@ -119,41 +190,42 @@ def send_message(session_id):
         
         # Determine which model to use (A/B testing)
         model_provider = "openai"  # Default
-        use_ab_testing = Config.AB_TEST_ENABLED
-        
-        if use_ab_testing:
-            # Use A/B testing via LLM backend
-            messages = []
-            for msg in session.messages:
-                messages.append({
-                    'role': msg.role.value,
-                    'content': msg.content
-                })
-            
-            # Get AI response via LLM backend with A/B testing
-            response = model_service.generate_response_ab_test(
-                messages, session_id, user.user_id
+        variant = None
+        
+        if Config.AB_TEST_ENABLED:
+            # Assignment reads the JWT's assignment vector or the in-memory tables
+            variant = ab_testing_service.assign_user_to_variant(
+                user.user_id, "model_comparison", get_request_claims().get('abv')
             )
-        else:
-            # Use direct model selection
-            if Config.AB_TEST_ENABLED:
-                variant = ab_testing_service.assign_user_to_variant(
-                    user.user_id, "model_comparison"
-                )
+            if variant in SUPPORTED_PROVIDERS:
                 model_provider = variant
-            
-            # Prepare messages for model
-            messages = []
-            for msg in session.messages:
-                messages.append({
-                    'role': msg.role.value,
-                    'content': msg.content
-                })
-            
-            # Get AI response
-            response = model_service.generate_response(
-                messages, model_provider, session_id, user.user_id
-            )
+        
+        # Route to a provider the user's plan includes
+        if Config.ENTITLEMENTS_ENABLED:
+            routed_provider = entitlements.route(model_provider)
+            if routed_provider is None:
+                if reserved_for:
+                    quota_service.refund(reserved_for)
+                return jsonify({'error': 'Your plan does not include any available model'}), 403
+            if routed_provider != model_provider:
+                # The user cannot take part in the provider comparison
+                model_provider = routed_provider
+                variant = None
+        
+        # Prepare messages for model
+        messages = []
+        for msg in session.messages:
+            messages.append({
+                'role': msg.role.value,
+                'content': msg.content
+            })
+        
+        # Get AI response
+        started_at = time.monotonic()
+        response = model_service.generate_response(
+            messages, model_provider, session_id, user.user_id
+        )
+        latency_ms = (time.monotonic() - started_at) * 1000
         
         if response['success']:
             # Add assistant message to session
@@ -166,37 +238,75 @@ def send_message(session_id):
             session.add_message(assistant_msg)
             
             # Track A/B testing event
-            if Config.AB_TEST_ENABLED:
+            if variant is not None:
+                event_data = {
+                    'model_provider': model_provider,
+                    'session_id': session_id
+                }
+                # A turn handed to the LLM backend has no reply yet, so its
+                # length and provider latency are unknown here
+                if not served_by_llm_backend(response):
+                    event_data['response_length'] = len(response['content'])
+                    event_data['latency_ms'] = latency_ms
                 ab_testing_service.track_event(
                     user.user_id,
                     "model_comparison",
                     "message_sent",
-                    {
-                        'model_provider': model_provider,
-                        'session_id': session_id,
-                        'response_length': len(response['content'])
-                    }
+                    event_data,
+                    variant=variant,
+                    source='server'
                 )
             
-            # Update session in database
+            # Update session in database. The version is incremented in
+            # the store so concurrent turns never write the same version
             chat_service.update_session(session_id, {
                 'messages': [msg.to_dict() for msg in session.messages],
-                'updated_at': session.updated_at
+                'updated_at': session.updated_at,
+                'version': Increment(session.version - loaded_version)
             })
             
-            return jsonify({
+            result = {
                 'success': True,
                 'response': response['content'],
-                'model_used': model_provider,
-                'session': session.to_dict()
-            }), 200
+                'model_used': model_provider
+            }
+            if delta:
+                result['messages'] = [user_msg.to_dict(), assistant_msg.to_dict()]
+                result['session'] = session.to_summary()
+            else:
+                result['session'] = session.to_dict()
+            # The tag the session has now, for the client's next If-None-Match
+            result['session']['etag'] = format_etag(session_etag(session))
+            return jsonify(result), 200
         else:
+            # Failed turns do not use up the quota
+            if reserved_for:
+                quota_service.refund(reserved_for)
+                reserved_for = None
+            
+            # Provider failures count against the variant in bandit
+            # allocation; a failed publish says nothing about the provider
+            if variant is not None and not served_by_llm_backend(response):
+                ab_testing_service.track_event(
+                    user.user_id,
+                    "model_comparison",
+                    "message_error",
+                    {
+                        'model_provider': model_provider,
+                        'session_id': session_id
+                    },
+                    variant=variant,
+                    source='server'
+                )
+            
             return jsonify({
                 'error': 'Failed to generate response',
                 'details': response.get('error')
             }), 500
         
     except Exception as e:
+        if reserved_for:
+            quota_service.refund(reserved_for)
         return jsonify({'error': str(e)}), 500
 
 @chat_bp.route('/sessions/<session_id>', methods=['DELETE'])
@@ -1,13 +1,45 @@
-from flask import Blueprint, request, jsonify
+import io
+import json
+import math
+from datetime import datetime
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+from app.config import Config
 from app.services.auth_service import AuthService
-from app.models.greenlist import GreenlistService
+from app.models.greenlist import GreenlistService, parse_csv_rows, parse_ndjson_rows
+from app.utils.rate_limiter import TokenBucketRateLimiter
+from app.utils.admission import admission_controlled
+from app.utils.client_ip import get_client_ip
 
 greenlist_bp = Blueprint('greenlist', __name__)
 auth_service = AuthService()
 greenlist_service = GreenlistService()
+check_rate_limiter = TokenBucketRateLimiter(
+    rate=Config.GREENLIST_CHECK_RATE,
+    burst=Config.GREENLIST_CHECK_BURST
+)
+
+# Upload content types accepted by /bulk-add, mapped to their row parsers
+BULK_UPLOAD_PARSERS = {
+    'text/csv': parse_csv_rows,
+    'application/x-ndjson': parse_ndjson_rows,
+    'application/ndjson': parse_ndjson_rows
+}
+
+def _json_default(value):
+    """Serialize Firestore timestamps in NDJSON exports"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def get_client_key() -> str:
+    """Identify the calling client for rate limiting"""
+    return get_client_ip() or 'unknown'
 
 def require_admin():
-    """Decorator to require admin access (checks if user is authenticated)"""
+    """Decorator to require admin access (checks if user is authenticated)
+
+    The admin is kept in ``g.admin_user`` for audit fields.
+    """
     auth_header = request.headers.get('Authorization')
     if not auth_header:
         return jsonify({'error': 'Authorization header is required'}), 401
@@ -15,6 +47,7 @@ def require_admin():
     user = auth_service.get_current_user(auth_header)
     if not user:
         return jsonify({'error': 'Invalid token'}), 401
+    g.admin_user = user
 
     # TODO: Add proper admin role check when role system is implemented
     # For now, just check if user is authenticated
@@ -24,6 +57,12 @@ def require_admin():
 def check_email():
     """Check if an email is on the greenlist"""
     try:
+        allowed, retry_after = check_rate_limiter.consume(get_client_key())
+        if not allowed:
+            response = jsonify({'error': 'Too many requests'})
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response, 429
+
         data = request.get_json()
         email = data.get('email')
 
@@ -43,7 +82,12 @@ def check_email():
 
 @greenlist_bp.route('/list', methods=['GET'])
 def list_greenlist():
-    """List all greenlist entries (requires admin)"""
+    """List greenlist entries (requires admin)
+
+    Returns one page at a time; pass the returned ``next_cursor`` as
+    ``?cursor=`` to fetch the next page. ``?format=ndjson`` streams every
+    matching entry as newline-delimited JSON instead.
+    """
     try:
         # Check admin access
         error_response = require_admin()
@@ -51,12 +95,35 @@ def list_greenlist():
             return error_response
 
         active_only = request.args.get('active_only', 'true').lower() == 'true'
-        entries = greenlist_service.list_all(active_only=active_only)
+        added_by = request.args.get('added_by')
+        email_prefix = request.args.get('prefix')
+        page_size = request.args.get('page_size', Config.GREENLIST_PAGE_SIZE, type=int)
+        page_size = max(1, min(page_size, Config.GREENLIST_MAX_PAGE_SIZE))
+
+        if request.args.get('format') == 'ndjson':
+            entries = greenlist_service.iter_entries(
+                active_only=active_only,
+                added_by=added_by,
+                email_prefix=email_prefix,
+                page_size=page_size
+            )
+            lines = (json.dumps(entry.to_dict(), default=_json_default) + '\n'
+                     for entry in entries)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+        entries, next_cursor = greenlist_service.list_page(
+            page_size=page_size,
+            cursor=request.args.get('cursor'),
+            active_only=active_only,
+            added_by=added_by,
+            email_prefix=email_prefix
+        )
 
         return jsonify({
             'success': True,
             'count': len(entries),
-            'entries': [entry.to_dict() for entry in entries]
+            'entries': [entry.to_dict() for entry in entries],
+            'next_cursor': next_cursor
         }), 200
 
     except Exception as e:
@@ -78,9 +145,8 @@ def add_to_greenlist():
         if not email:
             return jsonify({'error': 'Email is required'}), 400
 
-        # Get current user for audit trail
-        auth_header = request.headers.get('Authorization')
-        current_user = auth_service.get_current_user(auth_header)
+        # Audit trail uses the admin resolved by require_admin
+        current_user = g.get('admin_user')
 
         success = greenlist_service.add_email(
             email=email,
@@ -103,27 +169,52 @@ def add_to_greenlist():
         return jsonify({'error': str(e)}), 500
 
 @greenlist_bp.route('/bulk-add', methods=['POST'])
+@admission_controlled('batch')
 def bulk_add_to_greenlist():
-    """Bulk add emails to greenlist (requires admin)"""
+    """Bulk add emails to greenlist (requires admin)
+
+    Accepts a JSON body with an ``emails`` array, or a streamed CSV
+    (``text/csv``) or NDJSON (``application/x-ndjson``) upload. Streamed
+    uploads report per-row results and can be resumed with ``?start_row=``.
+    """
     try:
         # Check admin access
         error_response = require_admin()
         if error_response:
             return error_response
 
+        # Audit trail uses the admin resolved by require_admin
+        current_user = g.get('admin_user')
+        added_by = current_user.email if current_user else None
+
+        parse_rows = BULK_UPLOAD_PARSERS.get(request.mimetype)
+        if parse_rows:
+            start_row = request.args.get('start_row', 1, type=int)
+            stream = io.TextIOWrapper(io.BufferedReader(request.stream),
+                                      encoding='utf-8', newline='')
+            report = greenlist_service.import_rows(
+                parse_rows(stream),
+                added_by=added_by,
+                start_row=start_row
+            )
+
+            return jsonify({
+                'success': report['resume_from'] is None,
+                'summary': report['summary'],
+                'last_row': report['last_row'],
+                'resume_from': report['resume_from'],
+                'rows': report['rows']
+            }), 200
+
         data = request.get_json()
         emails = data.get('emails', [])
 
         if not emails or not isinstance(emails, list):
             return jsonify({'error': 'Emails array is required'}), 400
 
-        # Get current user for audit trail
-        auth_header = request.headers.get('Authorization')
-        current_user = auth_service.get_current_user(auth_header)
-
         results = greenlist_service.bulk_add_emails(
             emails=emails,
-            added_by=current_user.email if current_user else None
+            added_by=added_by
         )
 
         return jsonify({
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
-from app.services.auth_service import AuthService
-from app.services.model_service import ModelService
+from app.services.auth_service import AuthService, get_request_claims
+from app.services.entitlement_service import EntitlementService
+from app.services.model_service import ModelService, AVAILABLE_MODELS
+from app.services.usage_service import UsageService
+from app.utils.admission import admission_controlled
+from app.config import Config
 
 models_bp = Blueprint('models', __name__)
 auth_service = AuthService()
 model_service = ModelService()
+entitlement_service = EntitlementService()
+usage_service = UsageService()
 
 def get_current_user():
     """Helper function to get current authenticated user"""
@@ -14,6 +20,7 @@ def get_current_user():
     return auth_service.get_current_user(auth_header)
 
 @models_bp.route('/test', methods=['POST'])
+@admission_controlled('provider')
 def test_model():
     """Test a specific model with a message"""
     try:
@@ -28,13 +35,18 @@ def test_model():
         if not message:
             return jsonify({'error': 'Message is required'}), 400
         
+        if Config.ENTITLEMENTS_ENABLED:
+            entitlements = entitlement_service.for_user(user.user_id, get_request_claims())
+            if not entitlements.allows_provider(model_provider):
+                return jsonify({'error': 'Model not included in your plan'}), 403
+        
         # Prepare messages
         messages = [
             {'role': 'user', 'content': message}
         ]
         
         # Generate response
-        response = model_service.generate_response(messages, model_provider)
+        response = model_service.generate_response(messages, model_provider, user_id=user.user_id)
         
         return jsonify({
             'success': response['success'],
@@ -55,18 +67,11 @@ def get_available_models():
         if not user:
             return jsonify({'error': 'Authentication required'}), 401
         
-        models = {
-            'openai': {
-                'name': 'OpenAI GPT',
-                'models': ['gpt-3.5-turbo', 'gpt-4'],
-                'description': 'OpenAI\'s GPT models'
-            },
-            'google': {
-                'name': 'Google Gemini',
-                'models': ['gemini-pro'],
-                'description': 'Google\'s Gemini models'
-            }
-        }
+        models = AVAILABLE_MODELS
+        if Config.ENTITLEMENTS_ENABLED:
+            models = entitlement_service.for_user(
+                user.user_id, get_request_claims()
+            ).available_models()
         
         return jsonify({
             'success': True,
@@ -76,6 +81,27 @@ def get_available_models():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@models_bp.route('/usage', methods=['GET'])
+def get_usage():
+    """Get current user's token usage"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        
+        days = min(max(request.args.get('days', 30, type=int), 1), 366)
+        usage = usage_service.get_user_usage(user.user_id, days=days)
+        if usage is None:
+            return jsonify({'error': 'Failed to load usage'}), 500
+        
+        return jsonify({
+            'success': True,
+            'usage': usage
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @models_bp.route('/health', methods=['GET'])
 def check_model_health():
     """Check health of all model providers"""
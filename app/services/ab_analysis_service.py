@@ -0,0 +1,294 @@
+import logging
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from app.services.ab_testing_service import ABTestingService
+
+logger = logging.getLogger(__name__)
+
+# Two-sided z critical values for the supported confidence levels
+Z_CRITICAL = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+
+# Percentiles reported for latency and response length distributions
+PERCENTILES = (50, 90, 95, 99)
+
+# Event fields fetched from Firestore; everything else is left on the server
+EVENT_FIELDS = ['user_id', 'variant', 'event_type', 'timestamp',
+                'event_data.latency_ms', 'event_data.response_length']
+
+class ExperimentEvents:
+    """Columnar view of an experiment's events.
+
+    String columns are dictionary-encoded into integer codes so that every
+    per-variant statistic can be computed with array operations.
+    """
+
+    def __init__(self, variant_codes: np.ndarray, user_codes: np.ndarray,
+                 event_type_codes: np.ndarray, latency_ms: np.ndarray,
+                 response_length: np.ndarray, timestamps: np.ndarray,
+                 variants: List[str], event_types: List[str]):
+        self.variant_codes = variant_codes
+        self.user_codes = user_codes
+        self.event_type_codes = event_type_codes
+        self.latency_ms = latency_ms
+        self.response_length = response_length
+        self.timestamps = timestamps
+        self.variants = variants
+        self.event_types = event_types
+
+    def __len__(self) -> int:
+        return len(self.variant_codes)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]],
+                     chunk_size: int = 50000) -> 'ExperimentEvents':
+        """Build columns from event dicts, converting a chunk at a time"""
+        encoders = {'variant': {}, 'user_id': {}, 'event_type': {}}
+        chunks = []
+        rows = []
+
+        def encode(column, value):
+            codes = encoders[column]
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+            return code
+
+        def flush():
+            if rows:
+                chunks.append(np.array(rows, dtype=np.float64).reshape(-1, 6))
+                rows.clear()
+
+        for record in records:
+            event_data = record.get('event_data') or {}
+            timestamp = record.get('timestamp')
+            rows.append((
+                encode('variant', record.get('variant') or 'unknown'),
+                encode('user_id', record.get('user_id')),
+                encode('event_type', record.get('event_type')),
+                _as_float(event_data.get('latency_ms')),
+                _as_float(event_data.get('response_length')),
+                timestamp.timestamp() if isinstance(timestamp, datetime) else math.nan
+            ))
+            if len(rows) >= chunk_size:
+                flush()
+        flush()
+
+        table = np.concatenate(chunks) if chunks else np.empty((0, 6))
+        return cls(
+            variant_codes=table[:, 0].astype(np.int32),
+            user_codes=table[:, 1].astype(np.int64),
+            event_type_codes=table[:, 2].astype(np.int32),
+            latency_ms=table[:, 3],
+            response_length=table[:, 4],
+            timestamps=table[:, 5],
+            variants=list(encoders['variant']),
+            event_types=list(encoders['event_type'])
+        )
+
+def _as_float(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+def wilson_interval(successes: np.ndarray, trials: np.ndarray, z: float) -> np.ndarray:
+    """Wilson score intervals for binomial proportions, one row per variant"""
+    trials = np.maximum(trials, 1)
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (p + z ** 2 / (2 * trials)) / denominator
+    margin = z * np.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return np.stack([center - margin, center + margin], axis=1)
+
+def msprt_statistic(delta: float, variance: float, tau_squared: float) -> float:
+    """Mixture sequential probability ratio for a normal effect estimate.
+
+    With a N(0, tau^2) mixing prior over the true effect, the likelihood
+    ratio can be monitored continuously: stopping the first time it exceeds
+    1/alpha keeps the false positive rate below alpha regardless of how
+    often results are checked.
+    """
+    if variance <= 0:
+        return 1.0
+    exponent = tau_squared * delta ** 2 / (2 * variance * (variance + tau_squared))
+    return math.sqrt(variance / (variance + tau_squared)) * math.exp(min(exponent, 700))
+
+def _distribution(values: np.ndarray, variant_codes: np.ndarray, num_variants: int,
+                  z: float) -> List[Optional[Dict[str, Any]]]:
+    """Per-variant summary statistics for a numeric column, ignoring NaNs"""
+    present = ~np.isnan(values)
+    values = values[present]
+    codes = variant_codes[present]
+
+    counts = np.bincount(codes, minlength=num_variants)
+    sums = np.bincount(codes, weights=values, minlength=num_variants)
+    squares = np.bincount(codes, weights=values * values, minlength=num_variants)
+
+    # One sort groups values by variant and orders them within each group
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+
+    summaries = []
+    for code in range(num_variants):
+        n = int(counts[code])
+        if n == 0:
+            summaries.append(None)
+            continue
+        group = sorted_values[bounds[code]:bounds[code + 1]]
+        mean = sums[code] / n
+        variance = max(squares[code] / n - mean ** 2, 0.0) * n / max(n - 1, 1)
+        margin = z * math.sqrt(variance / n)
+        summaries.append({
+            'count': n,
+            'mean': float(mean),
+            'std': math.sqrt(variance),
+            'mean_ci': [float(mean - margin), float(mean + margin)],
+            'min': float(group[0]),
+            'max': float(group[-1]),
+            'percentiles': {
+                f"p{pct}": float(group[min(int(math.ceil(pct / 100 * n)) - 1, n - 1)])
+                for pct in PERCENTILES
+            }
+        })
+    return summaries
+
+def analyze_events(events: ExperimentEvents, conversion_event: str = 'message_sent',
+                   control: str = None, confidence: float = 0.95,
+                   tau_squared: float = 0.0025) -> Dict[str, Any]:
+    """Compute per-variant statistics and sequential test decisions.
+
+    Latency and response length come only from events that carry them.
+    Chat turns answered through the LLM backend over Pub/Sub do not, so
+    those distributions cover directly served turns only.
+    """
+    z = Z_CRITICAL.get(confidence, Z_CRITICAL[0.95])
+    alpha = 1 - confidence
+    num_variants = len(events.variants)
+    results = {
+        'total_events': len(events),
+        'conversion_event': conversion_event,
+        'confidence': confidence,
+        'variants': {},
+        'comparisons': {}
+    }
+    if num_variants == 0:
+        return results
+
+    variant_codes = events.variant_codes
+    num_users = int(events.user_codes.max()) + 1 if len(events) else 1
+
+    # Exposed users: distinct (variant, user) pairs
+    pair_keys = variant_codes.astype(np.int64) * num_users + events.user_codes
+    exposed = np.bincount(np.unique(pair_keys) // num_users, minlength=num_variants)
+
+    # Converted users: distinct pairs with at least one conversion event
+    if conversion_event in events.event_types:
+        is_conversion = events.event_type_codes == events.event_types.index(conversion_event)
+        converted_pairs = np.unique(pair_keys[is_conversion])
+    else:
+        converted_pairs = np.empty(0, dtype=np.int64)
+    converted = np.bincount(converted_pairs // num_users, minlength=num_variants)
+
+    event_counts = np.bincount(
+        variant_codes * len(events.event_types) + events.event_type_codes,
+        minlength=num_variants * len(events.event_types)
+    ).reshape(num_variants, len(events.event_types))
+
+    rates = converted / np.maximum(exposed, 1)
+    intervals = wilson_interval(converted, exposed, z)
+    latency = _distribution(events.latency_ms, variant_codes, num_variants, z)
+    response_length = _distribution(events.response_length, variant_codes, num_variants, z)
+
+    for code, variant in enumerate(events.variants):
+        results['variants'][variant] = {
+            'users': int(exposed[code]),
+            'conversions': int(converted[code]),
+            'conversion_rate': float(rates[code]),
+            'conversion_rate_ci': intervals[code].tolist(),
+            'event_counts': {
+                event_type: int(event_counts[code, type_code])
+                for type_code, event_type in enumerate(events.event_types)
+                if event_counts[code, type_code]
+            },
+            'latency_ms': latency[code],
+            'response_length': response_length[code]
+        }
+
+    if control not in events.variants:
+        control = events.variants[int(np.argmax(exposed))]
+    results['control'] = control
+    control_code = events.variants.index(control)
+
+    for code, variant in enumerate(events.variants):
+        if code == control_code:
+            continue
+        results['comparisons'][variant] = _compare(
+            rates, exposed, latency, control_code, code, z, alpha, tau_squared
+        )
+    return results
+
+def _compare(rates: np.ndarray, exposed: np.ndarray, latency: List[Optional[Dict[str, Any]]],
+             control_code: int, code: int, z: float, alpha: float,
+             tau_squared: float) -> Dict[str, Any]:
+    """Compare one variant against control on conversion rate and latency"""
+    n_control, n_variant = exposed[control_code], exposed[code]
+    p_control, p_variant = rates[control_code], rates[code]
+    delta = float(p_variant - p_control)
+    variance = 0.0
+    if n_control and n_variant:
+        variance = float(p_control * (1 - p_control) / n_control
+                         + p_variant * (1 - p_variant) / n_variant)
+    margin = z * math.sqrt(variance)
+
+    likelihood_ratio = msprt_statistic(delta, variance, tau_squared)
+    if likelihood_ratio >= 1 / alpha:
+        decision = 'stop_variant_better' if delta > 0 else 'stop_control_better'
+    else:
+        decision = 'continue'
+
+    comparison = {
+        'conversion_rate_delta': delta,
+        'conversion_rate_delta_ci': [delta - margin, delta + margin],
+        'likelihood_ratio': likelihood_ratio,
+        'always_valid_p_value': min(1.0, 1 / likelihood_ratio),
+        'decision': decision
+    }
+
+    control_latency, variant_latency = latency[control_code], latency[code]
+    if control_latency and variant_latency:
+        latency_delta = variant_latency['mean'] - control_latency['mean']
+        latency_variance = (control_latency['std'] ** 2 / control_latency['count']
+                            + variant_latency['std'] ** 2 / variant_latency['count'])
+        latency_margin = z * math.sqrt(latency_variance)
+        comparison['latency_ms_delta'] = latency_delta
+        comparison['latency_ms_delta_ci'] = [latency_delta - latency_margin,
+                                             latency_delta + latency_margin]
+    return comparison
+
+class ABAnalysisService:
+    """Statistical analysis of A/B experiments on top of ABTestingService"""
+
+    def __init__(self, ab_testing_service: ABTestingService = None):
+        self.ab_testing_service = ab_testing_service or ABTestingService()
+        self.store = self.ab_testing_service.store
+
+    def load_events(self, experiment_name: str) -> ExperimentEvents:
+        """Stream an experiment's events into columnar arrays"""
+        docs = self.store.query('ab_events', filters=[('experiment_name', '==', experiment_name)],
+                                fields=EVENT_FIELDS)
+        return ExperimentEvents.from_records(data for _, data in docs)
+
+    def analyze(self, experiment_name: str, conversion_event: str = 'message_sent',
+                control: str = None, confidence: float = 0.95) -> Dict[str, Any]:
+        """Analyze an experiment's events per variant"""
+        try:
+            events = self.load_events(experiment_name)
+            results = analyze_events(events, conversion_event=conversion_event,
+                                     control=control, confidence=confidence)
+            results['experiment_name'] = experiment_name
+            return results
+        except Exception as e:
+            logger.error("Error analyzing experiment: %s", e)
+            return {}
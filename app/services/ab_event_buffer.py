@@ -0,0 +1,155 @@
+import logging
+import atexit
+import queue
+import threading
+from typing import Any, Dict, List
+from app.config import Config
+from app.services.ab_rollup_service import ABRollupService
+from app.storage.document_store import BATCH_WRITE_LIMIT, get_document_store, new_document_id
+
+logger = logging.getLogger(__name__)
+
+class ABEventBuffer:
+    """In-process buffer that writes A/B events to Firestore in batches.
+
+    ``add`` never blocks: events go onto a bounded queue and a background
+    thread commits them as batched writes once ``batch_size`` events are
+    waiting or ``flush_interval`` seconds have passed. When the queue is
+    full new events are dropped and counted, so a slow Firestore applies
+    backpressure to analytics instead of to chat requests. The buffer is
+    drained one last time at interpreter shutdown.
+
+    After each batch is written its counts are folded into the experiment
+    rollups with one extra write per experiment.
+    """
+
+    def __init__(self, collection: str = 'ab_events', max_size: int = None,
+                 batch_size: int = None, flush_interval: float = None):
+        self.collection = collection
+        self.max_size = max_size or Config.AB_EVENT_BUFFER_SIZE
+        self.batch_size = min(batch_size or Config.AB_EVENT_BATCH_SIZE, BATCH_WRITE_LIMIT)
+        self.flush_interval = flush_interval or Config.AB_EVENT_FLUSH_INTERVAL
+        self.store = None
+        self.rollups = None
+        self.stats = {
+            'accepted': 0,
+            'dropped': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0
+        }
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, event: Dict[str, Any]) -> bool:
+        """Queue an event for writing; returns False if it was dropped"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.stats['dropped'] += 1
+            return False
+
+        with self._lock:
+            self.stats['accepted'] += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+        return True
+
+    def flush(self) -> int:
+        """Write every queued event now; returns the number written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return written
+                if self._commit(batch):
+                    written += len(batch)
+
+    def shutdown(self):
+        """Stop the background writer and drain whatever is still queued"""
+        self._stopped.set()
+        self._flush_requested.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Counters describing the buffer's throughput and losses"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def _ensure_started(self):
+        """Start the background writer on first use"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._connect()
+            self._thread = threading.Thread(target=self._run, name='ab-event-writer', daemon=True)
+            self._thread.start()
+
+    def _connect(self):
+        """Open the document store and rollup writer if needed"""
+        if self.store is None:
+            self.store = get_document_store()
+            self.rollups = ABRollupService(self.store)
+
+    def _run(self):
+        """Flush on a size or time threshold until shutdown"""
+        while not self._stopped.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing A/B events: %s", e)
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Dequeue up to one batch of events without blocking"""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: List[Dict[str, Any]]) -> bool:
+        """Write one batch of events in a single commit"""
+        try:
+            self._connect()
+            self.store.set_many(self.collection, [(new_document_id(), event) for event in batch])
+        except Exception as e:
+            logger.error("Error writing %s A/B events: %s", len(batch), e)
+            with self._lock:
+                self.stats['failed'] += len(batch)
+            return False
+
+        with self._lock:
+            self.stats['written'] += len(batch)
+            self.stats['batches'] += 1
+        self.rollups.record_events(batch)
+        return True
+
+_event_buffer = None
+_event_buffer_lock = threading.Lock()
+
+def get_event_buffer() -> ABEventBuffer:
+    """Return the A/B event buffer shared by this worker process"""
+    global _event_buffer
+    if _event_buffer is None:
+        with _event_buffer_lock:
+            if _event_buffer is None:
+                _event_buffer = ABEventBuffer()
+                atexit.register(_event_buffer.shutdown)
+    return _event_buffer
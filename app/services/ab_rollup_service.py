@@ -0,0 +1,191 @@
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable
+from app.config import Config
+from app.storage.document_store import DocumentStore, Increment, get_document_store
+
+logger = logging.getLogger(__name__)
+
+# Numeric event_data fields summed per variant alongside the event counts
+ROLLUP_METRICS = ('latency_ms', 'response_length', 'rating')
+
+# Event types and metrics only the server may report. They measure
+# provider outcomes and feed the bandit, so copies sent by clients are
+# not counted.
+SERVER_EVENT_TYPES = ('message_sent', 'message_error')
+SERVER_METRICS = ('latency_ms', 'response_length')
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        'assignments': defaultdict(int),
+        'events': defaultdict(lambda: defaultdict(int)),
+        'metrics': defaultdict(lambda: defaultdict(int))
+    }
+
+def _plain(value):
+    """Convert nested defaultdicts to plain dicts for storage"""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+class ABRollupService:
+    """Pre-aggregated A/B experiment counters.
+
+    Each experiment has ``AB_ROLLUP_SHARDS`` rollup documents in
+    ``ab_rollups``. Writers increment a random shard so concurrent updates
+    to one experiment do not contend on a single document, and readers
+    sum the shards. A shard document looks like::
+
+        {
+            'experiment_name': 'model_comparison',
+            'shard': 3,
+            'assignments': {'openai': 120, 'google': 118},
+            'events': {'openai': {'message_sent': 950}},
+            'metrics': {'openai': {'latency_ms': 812345.0, 'latency_ms_sq': 7.1e8,
+                                   'latency_ms_count': 950}}
+        }
+    """
+
+    def __init__(self, store: DocumentStore = None, num_shards: int = None):
+        self.store = store or get_document_store()
+        self.collection = 'ab_rollups'
+        self.num_shards = num_shards or Config.AB_ROLLUP_SHARDS
+
+    @staticmethod
+    def _shard_id(experiment_name: str, shard: int) -> str:
+        return f"{experiment_name}:{shard}"
+
+    def _random_shard_id(self, experiment_name: str) -> str:
+        return self._shard_id(experiment_name, random.randrange(self.num_shards))
+
+    def record_assignment(self, experiment_name: str, variant: str) -> bool:
+        """Count a newly persisted assignment"""
+        try:
+            self.store.set(self.collection, self._random_shard_id(experiment_name), {
+                'experiment_name': experiment_name,
+                'assignments': {variant: Increment(1)},
+                'updated_at': datetime.utcnow()
+            }, merge=True)
+            return True
+        except Exception as e:
+            logger.error("Error updating assignment rollup: %s", e)
+            return False
+
+    def record_events(self, events: Iterable[Dict[str, Any]]) -> bool:
+        """Fold a batch of written events into the rollups.
+
+        The batch is aggregated in memory first, so each experiment costs
+        one shard write per batch no matter how many events it contains.
+        """
+        totals = defaultdict(_empty_totals)
+        for event in events:
+            self._accumulate(totals[event['experiment_name']], event)
+        if not totals:
+            return True
+
+        try:
+            docs = []
+            for experiment_name, experiment_totals in totals.items():
+                docs.append((self._random_shard_id(experiment_name), {
+                    'experiment_name': experiment_name,
+                    'events': {
+                        variant: {event_type: Increment(count)
+                                  for event_type, count in counts.items()}
+                        for variant, counts in experiment_totals['events'].items()
+                    },
+                    'metrics': {
+                        variant: {name: Increment(value)
+                                  for name, value in metrics.items()}
+                        for variant, metrics in experiment_totals['metrics'].items()
+                    },
+                    'updated_at': datetime.utcnow()
+                }))
+            self.store.set_many(self.collection, docs, merge=True)
+            return True
+        except Exception as e:
+            logger.error("Error updating event rollups: %s", e)
+            return False
+
+    def get_totals(self, experiment_name: str) -> Dict[str, Any]:
+        """Sum an experiment's rollup shards"""
+        shard_ids = [self._shard_id(experiment_name, shard) for shard in range(self.num_shards)]
+        totals = _empty_totals()
+        for data in self.store.get_many(self.collection, shard_ids).values():
+            for variant, count in data.get('assignments', {}).items():
+                totals['assignments'][variant] += count
+            for variant, counts in data.get('events', {}).items():
+                for event_type, count in counts.items():
+                    totals['events'][variant][event_type] += count
+            for variant, metrics in data.get('metrics', {}).items():
+                for name, value in metrics.items():
+                    totals['metrics'][variant][name] += value
+        return _plain(totals)
+
+    def rebuild(self, experiment_name: str) -> Dict[str, Any]:
+        """Recompute an experiment's rollups from the raw assignments and events.
+
+        The totals are written to shard 0 and the other shards are reset.
+        Events recorded while the rebuild runs may be counted twice or not
+        at all, so run it when traffic to the experiment is quiet.
+        """
+        totals = _empty_totals()
+
+        experiment_filter = [('experiment_name', '==', experiment_name)]
+        for _, assignment in self.store.query('ab_assignments', filters=experiment_filter):
+            totals['assignments'][assignment['variant']] += 1
+
+        for _, event in self.store.query('ab_events', filters=experiment_filter):
+            self._accumulate(totals, event)
+
+        totals = _plain(totals)
+        docs = [(self._shard_id(experiment_name, 0), {
+            'experiment_name': experiment_name,
+            'shard': 0,
+            'assignments': totals['assignments'],
+            'events': totals['events'],
+            'metrics': totals['metrics'],
+            'updated_at': datetime.utcnow()
+        })]
+        for shard in range(1, self.num_shards):
+            docs.append((self._shard_id(experiment_name, shard), {
+                'experiment_name': experiment_name,
+                'shard': shard,
+                'updated_at': datetime.utcnow()
+            }))
+        self.store.set_many(self.collection, docs)
+        return totals
+
+    @staticmethod
+    def _accumulate(totals: Dict[str, Any], event: Dict[str, Any]):
+        """Add one event's count and metrics to running totals"""
+        # Events written before sources were recorded came from the server
+        from_server = event.get('source', 'server') == 'server'
+        if event['event_type'] in SERVER_EVENT_TYPES and not from_server:
+            return
+        variant = event.get('variant', 'unknown')
+        totals['events'][variant][event['event_type']] += 1
+
+        event_data = event.get('event_data') or {}
+        for name in ROLLUP_METRICS:
+            if name in SERVER_METRICS and not from_server:
+                continue
+            value = event_data.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals['metrics'][variant][name] += value
+                totals['metrics'][variant][f"{name}_sq"] += value * value
+                totals['metrics'][variant][f"{name}_count"] += 1
+
+def summarize_totals(experiment_name: str, totals: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape rollup totals as an experiment results payload"""
+    assignments = totals.get('assignments', {})
+    events = totals.get('events', {})
+    return {
+        'experiment_name': experiment_name,
+        'variant_assignments': assignments,
+        'event_counts': events,
+        'metrics': totals.get('metrics', {}),
+        'total_users': sum(assignments.values()),
+        'total_events': sum(sum(counts.values()) for counts in events.values())
+    }
@@ -1,177 +1,205 @@
-import random
-import hashlib
-from typing import Dict, Any, Optional
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime
-from google.cloud import firestore
-from app.config import Config
+from app.services.ab_event_buffer import get_event_buffer
+from app.services.ab_rollup_service import ABRollupService, summarize_totals
+from app.services.bandit_service import get_bandit_allocator
+from app.services.bucketing_service import get_bucketing_service
+from app.services.experiment_registry import default_experiments, get_experiment_registry
+from app.storage.document_store import DocumentExists, get_document_store
+from app.storage.paging import iter_time_range
+
+logger = logging.getLogger(__name__)
+
+# Assignment records are written off the request path by this pool
+_assignment_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ab-assign')
+
+# Upper bound on assignment ids remembered as already persisted
+MAX_PERSISTED_ASSIGNMENTS = 100000
+
+def assignment_doc_id(user_id: str, experiment_name: str) -> str:
+    """Deterministic document id for a user's assignment in an experiment"""
+    return f"{experiment_name}:{user_id}"
 
 class ABTestingService:
     """Service for managing A/B testing between different models"""
     
     def __init__(self):
-        self.db = firestore.Client()
+        self.store = get_document_store()
         self.experiments_collection = 'ab_experiments'
         self.assignments_collection = 'ab_assignments'
+        self.events_collection = 'ab_events'
+        self.rollups = ABRollupService(self.store)
+        self.registry = get_experiment_registry()
+        self.bandit = get_bandit_allocator(self.rollups, self.registry)
+        self.bucketing = get_bucketing_service(self.bandit)
+        self._persisted_assignments = OrderedDict()
+        self._lock = threading.Lock()
     
     def create_experiment(self, experiment_name: str, variants: Dict[str, float],
-                         description: str = None) -> bool:
-        """Create a new A/B test experiment"""
+                         description: str = None, allocation: str = 'fixed') -> bool:
+        """Create a new A/B test experiment
+        
+        ``allocation`` is ``'fixed'`` to split traffic by ``variants`` or
+        ``'bandit'`` to shift traffic toward the best-performing variant.
+        """
         try:
             experiment_data = {
                 'name': experiment_name,
                 'variants': variants,
                 'description': description,
+                'allocation': allocation,
                 'status': 'active',
                 'created_at': datetime.utcnow(),
                 'updated_at': datetime.utcnow()
             }
             
-            doc_ref = self.db.collection(self.experiments_collection).document(experiment_name)
-            doc_ref.set(experiment_data)
+            self.store.set(self.experiments_collection, experiment_name, experiment_data)
+            self.registry.put(experiment_name, experiment_data)
             return True
         except Exception as e:
-            print(f"Error creating experiment: {e}")
+            logger.error("Error creating experiment: %s", e)
             return False
     
     def get_experiment(self, experiment_name: str) -> Optional[Dict[str, Any]]:
-        """Get experiment configuration"""
-        try:
-            doc_ref = self.db.collection(self.experiments_collection).document(experiment_name)
-            doc = doc_ref.get()
-            if doc.exists:
-                return doc.to_dict()
-            return None
-        except Exception as e:
-            print(f"Error getting experiment: {e}")
-            return None
+        """Get experiment configuration from the in-memory registry"""
+        return self.registry.get(experiment_name)
+    
+    def list_experiments(self, active_only: bool = False) -> List[Dict[str, Any]]:
+        """List experiment configurations from the in-memory registry"""
+        return self.registry.list(active_only=active_only)
     
-    def assign_user_to_variant(self, user_id: str, experiment_name: str) -> str:
-        """Assign user to a variant for the experiment"""
+    def assign_user_to_variant(self, user_id: str, experiment_name: str,
+                               assignment_vector: str = None) -> str:
+        """Assign user to a variant for the experiment
+        
+        The variant is a pure function of the user and the compiled
+        experiment tables, so no stored assignment needs to be read. When
+        ``assignment_vector`` (the ``abv`` JWT claim) was built from the
+        current tables it is used instead of hashing. Users outside the
+        experiment's layer range or in its holdout get ``'control'`` and
+        are not recorded. The assignment record is written once, in the
+        background.
+        """
         try:
-            # Check if user already has an assignment
-            assignment_doc = (self.db.collection(self.assignments_collection)
-                            .where('user_id', '==', user_id)
-                            .where('experiment_name', '==', experiment_name)
-                            .limit(1)
-                            .get())
-            
-            if assignment_doc:
-                return assignment_doc[0].to_dict()['variant']
-            
-            # Get experiment configuration
-            experiment = self.get_experiment(experiment_name)
-            if not experiment or experiment['status'] != 'active':
-                return 'control'  # Default to control if experiment not active
-            
-            # Use consistent hashing for deterministic assignment
-            variant = self._get_consistent_variant(user_id, experiment_name, experiment['variants'])
-            
-            # Store assignment
-            assignment_data = {
-                'user_id': user_id,
-                'experiment_name': experiment_name,
-                'variant': variant,
-                'assigned_at': datetime.utcnow()
-            }
-            
-            doc_ref = self.db.collection(self.assignments_collection).add(assignment_data)
+            variant = self.bucketing.assign(user_id, experiment_name, assignment_vector)
+            if variant is None:
+                return 'control'  # Default to control if not enrolled or experiment not active
+            self._persist_assignment(user_id, experiment_name, variant)
             return variant
             
         except Exception as e:
-            print(f"Error assigning user to variant: {e}")
+            logger.error("Error assigning user to variant: %s", e)
             return 'control'
     
-    def _get_consistent_variant(self, user_id: str, experiment_name: str, 
-                               variants: Dict[str, float]) -> str:
-        """Get consistent variant assignment using hash"""
-        # Create a hash from user_id and experiment_name
-        hash_input = f"{user_id}:{experiment_name}"
-        hash_value = int(hashlib.md5(hash_input.encode()).hexdigest(), 16)
-        
-        # Use hash to get a value between 0 and 1
-        normalized_hash = (hash_value % 10000) / 10000.0
-        
-        # Assign variant based on cumulative probability
-        cumulative = 0.0
-        for variant, probability in variants.items():
-            cumulative += probability
-            if normalized_hash <= cumulative:
-                return variant
+    def get_user_assignments(self, user_id: str) -> Dict[str, str]:
+        """Variants for every active experiment the user is enrolled in"""
+        try:
+            return self.bucketing.assign_all(user_id)
+        except Exception as e:
+            logger.error("Error evaluating user assignments: %s", e)
+            return {}
+    
+    def _persist_assignment(self, user_id: str, experiment_name: str, variant: str):
+        """Record an assignment once, off the request path"""
+        doc_id = assignment_doc_id(user_id, experiment_name)
+        with self._lock:
+            if doc_id in self._persisted_assignments:
+                self._persisted_assignments.move_to_end(doc_id)
+                return
+            self._persisted_assignments[doc_id] = True
+            if len(self._persisted_assignments) > MAX_PERSISTED_ASSIGNMENTS:
+                self._persisted_assignments.popitem(last=False)
         
-        # Fallback to first variant
-        return list(variants.keys())[0]
+        assignment_data = {
+            'user_id': user_id,
+            'experiment_name': experiment_name,
+            'variant': variant,
+            'assigned_at': datetime.utcnow()
+        }
+        _assignment_executor.submit(self._write_assignment, doc_id, assignment_data)
+    
+    def _write_assignment(self, doc_id: str, assignment_data: Dict[str, Any]) -> bool:
+        """Create the assignment document unless another worker already did"""
+        try:
+            self.store.create(self.assignments_collection, doc_id, assignment_data)
+            # Only the worker that created the record counts it
+            self.rollups.record_assignment(assignment_data['experiment_name'],
+                                           assignment_data['variant'])
+            return True
+        except DocumentExists:
+            return False
+        except Exception as e:
+            logger.error("Error storing assignment %s: %s", doc_id, e)
+            # Forget the id so the next request retries the write
+            with self._lock:
+                self._persisted_assignments.pop(doc_id, None)
+            return False
     
     def track_event(self, user_id: str, experiment_name: str, event_type: str,
-                   event_data: Dict[str, Any] = None) -> bool:
-        """Track an event for A/B testing analysis"""
+                   event_data: Dict[str, Any] = None, variant: str = None,
+                   assignment_vector: str = None, source: str = 'client') -> bool:
+        """Track an event for A/B testing analysis
+        
+        Events are buffered and written in batches in the background, so
+        this never waits on Firestore. Returns False if the buffer is full
+        and the event was dropped. The user's variant is recorded with the
+        event, computed from the assignment hash when not given. ``source``
+        is ``'server'`` for provider outcomes the app observed itself and
+        ``'client'`` for events reported through the API.
+        """
         try:
             event_data = event_data or {}
             event_record = {
                 'user_id': user_id,
                 'experiment_name': experiment_name,
+                'variant': variant or self.assign_user_to_variant(user_id, experiment_name,
+                                                                  assignment_vector),
                 'event_type': event_type,
                 'event_data': event_data,
+                'source': source,
                 'timestamp': datetime.utcnow()
             }
             
-            self.db.collection('ab_events').add(event_record)
-            return True
+            return get_event_buffer().add(event_record)
         except Exception as e:
-            print(f"Error tracking event: {e}")
+            logger.error("Error tracking event: %s", e)
             return False
     
     def get_experiment_results(self, experiment_name: str) -> Dict[str, Any]:
-        """Get aggregated results for an experiment"""
+        """Get aggregated results for an experiment from its rollups"""
         try:
-            # Get all assignments for this experiment
-            assignments = (self.db.collection(self.assignments_collection)
-                          .where('experiment_name', '==', experiment_name)
-                          .get())
-            
-            # Get all events for this experiment
-            events = (self.db.collection('ab_events')
-                     .where('experiment_name', '==', experiment_name)
-                     .get())
-            
-            # Aggregate results
-            variant_counts = {}
-            event_counts = {}
-            
-            for assignment in assignments:
-                variant = assignment.to_dict()['variant']
-                variant_counts[variant] = variant_counts.get(variant, 0) + 1
-            
-            for event in events:
-                event_data = event.to_dict()
-                variant = event_data.get('variant', 'unknown')
-                event_type = event_data['event_type']
-                
-                if variant not in event_counts:
-                    event_counts[variant] = {}
-                event_counts[variant][event_type] = event_counts[variant].get(event_type, 0) + 1
-            
-            return {
-                'experiment_name': experiment_name,
-                'variant_assignments': variant_counts,
-                'event_counts': event_counts,
-                'total_users': sum(variant_counts.values()),
-                'total_events': sum(sum(events.values()) for events in event_counts.values())
-            }
+            totals = self.rollups.get_totals(experiment_name)
+            return summarize_totals(experiment_name, totals)
         except Exception as e:
-            print(f"Error getting experiment results: {e}")
+            logger.error("Error getting experiment results: %s", e)
             return {}
     
+    def rebuild_experiment_results(self, experiment_name: str) -> Dict[str, Any]:
+        """Recompute an experiment's rollups from its raw assignments and events"""
+        totals = self.rollups.rebuild(experiment_name)
+        return summarize_totals(experiment_name, totals)
+    
+    def iter_events(self, since: datetime = None, until: datetime = None,
+                    page_size: int = 1000) -> Iterator:
+        """Stream ``(doc_id, data)`` for raw events with ``since < timestamp <= until``"""
+        return iter_time_range(self.store, self.events_collection, 'timestamp',
+                               since, until, page_size)
+    
+    def iter_assignments(self, since: datetime = None, until: datetime = None,
+                         page_size: int = 1000) -> Iterator:
+        """Stream ``(doc_id, data)`` for assignments with ``since < assigned_at <= until``"""
+        return iter_time_range(self.store, self.assignments_collection, 'assigned_at',
+                               since, until, page_size)
+    
     def initialize_default_experiments(self):
         """Initialize default A/B testing experiments"""
-        if not Config.AB_TEST_ENABLED:
-            return
-        
-        # Model comparison experiment
-        self.create_experiment(
-            experiment_name="model_comparison",
-            variants={
-                "openai": 0.5,
-                "google": 0.5
-            },
-            description="Compare OpenAI GPT vs Google Gemini performance"
-        )
+        for experiment_name, experiment in default_experiments().items():
+            self.create_experiment(
+                experiment_name=experiment_name,
+                variants=experiment['variants'],
+                description=experiment['description']
+            )
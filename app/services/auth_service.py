@@ -1,11 +1,25 @@
+import logging
 import os
 import jwt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+from flask import g, has_request_context
 from google.auth.transport import requests
 from google.oauth2 import id_token
 from app.models.user import User, UserService
 from app.models.greenlist import GreenlistService
+from app.models.user_agreement import AgreementService
+from app.config import Config
+from app.services.bucketing_service import get_bucketing_service
+from app.services.entitlement_service import EntitlementService
+
+logger = logging.getLogger(__name__)
+
+def get_request_claims() -> Dict[str, Any]:
+    """JWT claims of the user authenticated in the current request"""
+    if not has_request_context():
+        return {}
+    return g.get('jwt_claims') or {}
 
 class AuthService:
     """Authentication service for handling user auth"""
@@ -13,6 +27,8 @@ class AuthService:
     def __init__(self):
         self.user_service = UserService()
         self.greenlist_service = GreenlistService()
+        self.entitlement_service = EntitlementService()
+        self.agreement_service = AgreementService()
         self.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key')
         self.google_client_id = os.environ.get('GOOGLE_CLIENT_ID')
         self.greenlist_enabled = os.environ.get('GREENLIST_ENABLED', 'true').lower() == 'true'
@@ -38,12 +54,13 @@ class AuthService:
                 'picture': idinfo.get('picture')
             }
         except ValueError as e:
-            print(f"Token verification failed: {e}")
+            logger.warning("Token verification failed: %s", e)
             return None
     
-    def create_jwt_token(self, user_id: str) -> str:
+    def create_jwt_token(self, user_id: str, extra_claims: Dict[str, Any] = None) -> str:
         """Create JWT token for authenticated user"""
         payload = {
+            **(extra_claims or {}),
             'user_id': user_id,
             'exp': datetime.utcnow() + timedelta(hours=24),
             'iat': datetime.utcnow()
@@ -52,14 +69,18 @@ class AuthService:
     
     def verify_jwt_token(self, token: str) -> Optional[str]:
         """Verify JWT token and return user_id"""
+        payload = self.decode_jwt_token(token)
+        return payload['user_id'] if payload else None
+    
+    def decode_jwt_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Verify JWT token and return all of its claims"""
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
-            return payload['user_id']
+            return jwt.decode(token, self.secret_key, algorithms=['HS256'])
         except jwt.ExpiredSignatureError:
-            print("Token has expired")
+            logger.info("Token has expired")
             return None
         except jwt.InvalidTokenError:
-            print("Invalid token")
+            logger.warning("Invalid token")
             return None
     
     def authenticate_user(self, google_token: str) -> Optional[Dict[str, Any]]:
@@ -73,7 +94,7 @@ class AuthService:
         if self.greenlist_enabled:
             email = google_user_info['email']
             if not self.greenlist_service.is_email_allowed(email):
-                print(f"Authentication denied: {email} is not on the greenlist")
+                logger.warning("Authentication denied: %s is not on the greenlist", email)
                 return {
                     'error': 'not_authorized',
                     'message': 'Your email is not authorized to access this application. Please contact support for access.'
@@ -95,8 +116,18 @@ class AuthService:
                 'last_login': datetime.utcnow()
             })
 
-        # Create JWT token
-        jwt_token = self.create_jwt_token(user.user_id)
+        # Create JWT token, carrying the user's experiment assignments,
+        # plan and agreement acceptance
+        claims = {}
+        if Config.AB_TEST_ENABLED:
+            claims['abv'] = get_bucketing_service().assignment_vector(user.user_id)
+        if Config.ENTITLEMENTS_ENABLED:
+            claims['plan'] = self.entitlement_service.plan_id_for_user(user.user_id)
+        if Config.AGREEMENTS_REQUIRED:
+            accepted = self.agreement_service.acceptance_claim(user.user_id)
+            if accepted:
+                claims['agr'] = accepted
+        jwt_token = self.create_jwt_token(user.user_id, claims)
 
         return {
             'user': user.to_dict(),
@@ -108,9 +139,20 @@ class AuthService:
         if not auth_header or not auth_header.startswith('Bearer '):
             return None
         
+        # The user is resolved once per request, however many checks ask
+        if has_request_context():
+            resolved = g.get('current_user')
+            if resolved is not None and resolved[0] == auth_header:
+                return resolved[1]
+        
         token = auth_header.split(' ')[1]
-        user_id = self.verify_jwt_token(token)
-        if not user_id:
+        payload = self.decode_jwt_token(token)
+        if not payload:
             return None
         
-        return self.user_service.get_user(user_id)
+        user = self.user_service.get_user(payload['user_id'])
+        # Keep the claims for the rest of the request (see get_request_claims)
+        if has_request_context():
+            g.jwt_claims = payload
+            g.current_user = (auth_header, user)
+        return user
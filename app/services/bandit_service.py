@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+import numpy as np
+from app.config import Config
+from app.storage.document_store import get_document_store
+from app.utils.collection_watcher import CollectionWatcher
+
+logger = logging.getLogger(__name__)
+
+# Default weights of each reward component in an arm's sampled reward.
+# Feedback ratings are submitted by clients, so they only count when an
+# experiment opts in through ``reward_weights``.
+DEFAULT_REWARD_WEIGHTS = {
+    'reliability': 0.5,
+    'latency': 0.5,
+    'feedback': 0.0
+}
+
+# Latency at which the latency reward falls to 1/e
+DEFAULT_LATENCY_SCALE_MS = 5000.0
+
+# Posterior draws per arm when estimating the probability each arm is best
+THOMPSON_DRAWS = 4000
+
+# Published weights are rounded to this step
+WEIGHT_STEP = 0.01
+
+# Smallest change in any arm's weight that republishes an experiment's weights
+WEIGHT_CHANGE_THRESHOLD = 0.02
+
+def totals_seed(experiment_name: str, totals: Dict[str, Any]) -> int:
+    """RNG seed derived from an experiment's rollup totals"""
+    payload = json.dumps([experiment_name, totals], sort_keys=True, default=str)
+    return int.from_bytes(hashlib.blake2b(payload.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def quantize_weights(weights: Dict[str, float]) -> Dict[str, float]:
+    """Round weights to ``WEIGHT_STEP``"""
+    return {arm: round(round(weight / WEIGHT_STEP) * WEIGHT_STEP, 6) for arm, weight in weights.items()}
+
+def weights_changed(old: Optional[Dict[str, float]], new: Dict[str, float]) -> bool:
+    """Whether any arm moved by at least ``WEIGHT_CHANGE_THRESHOLD``"""
+    if not old or set(old) != set(new):
+        return True
+    return max(abs(new[arm] - old[arm]) for arm in new) >= WEIGHT_CHANGE_THRESHOLD - 1e-9
+
+def thompson_weights(variants: Dict[str, float], totals: Dict[str, Any],
+                     min_weight: float, settings: Dict[str, Any] = None,
+                     rng: np.random.Generator = None) -> Dict[str, float]:
+    """Traffic weights proportional to each arm's probability of being best.
+
+    Each arm's reward blends three posteriors built from the experiment
+    rollups:
+
+    - reliability: Beta over provider successes, the ``message_sent``
+      events that carry a ``latency_ms``, and ``message_error`` failures
+    - latency: Normal over mean ``latency_ms``, mapped to
+      ``exp(-latency / latency_scale_ms)``
+    - feedback: Beta over ``rating`` values in [0, 1] from ``feedback``
+      events, weighted 0 unless the experiment sets ``reward_weights``
+
+    Reliability and latency only count events the server recorded
+    itself. Only turns a provider answered directly report them.
+    Turns published to the LLM backend carry neither, since their outcome
+    is not known here, so they leave reliability and latency at the
+    prior and do not move traffic. Every arm keeps at least
+    ``min_weight`` of the traffic so estimates for losing arms keep
+    improving.
+    """
+    settings = settings or {}
+    reward_weights = {**DEFAULT_REWARD_WEIGHTS, **settings.get('reward_weights', {})}
+    latency_scale = float(settings.get('latency_scale_ms', DEFAULT_LATENCY_SCALE_MS))
+    rng = rng or np.random.default_rng()
+    arms = list(variants)
+    events = totals.get('events', {})
+    metrics = totals.get('metrics', {})
+
+    samples = np.zeros((len(arms), THOMPSON_DRAWS))
+    for index, arm in enumerate(arms):
+        counts = events.get(arm, {})
+        arm_metrics = metrics.get(arm, {})
+
+        latency_count = arm_metrics.get('latency_ms_count', 0)
+        failures = counts.get('message_error', 0)
+        reliability = rng.beta(latency_count + 1, failures + 1, THOMPSON_DRAWS)
+
+        if latency_count:
+            mean = arm_metrics.get('latency_ms', 0.0) / latency_count
+            variance = max(arm_metrics.get('latency_ms_sq', 0.0) / latency_count - mean ** 2, 0.0)
+            std_error = math.sqrt(variance / latency_count) if latency_count > 1 else latency_scale
+            latency = np.maximum(rng.normal(mean, std_error, THOMPSON_DRAWS), 0.0)
+        else:
+            # No data yet: a wide prior centred on the latency scale
+            latency = np.abs(rng.normal(latency_scale, latency_scale, THOMPSON_DRAWS))
+        latency_reward = np.exp(-latency / latency_scale)
+
+        rating_count = arm_metrics.get('rating_count', 0)
+        positive = min(max(arm_metrics.get('rating', 0.0), 0.0), rating_count)
+        feedback = rng.beta(positive + 1, rating_count - positive + 1, THOMPSON_DRAWS)
+
+        samples[index] = (reward_weights['reliability'] * reliability
+                          + reward_weights['latency'] * latency_reward
+                          + reward_weights['feedback'] * feedback)
+
+    wins = np.bincount(np.argmax(samples, axis=0), minlength=len(arms))
+    probabilities = wins / THOMPSON_DRAWS
+
+    min_weight = min(max(min_weight, 0.0), 1.0 / len(arms))
+    weights = min_weight + (1 - min_weight * len(arms)) * probabilities
+    return {arm: float(weight) for arm, weight in zip(arms, weights)}
+
+class BanditAllocator:
+    """Per-worker copy of the bandit traffic weights.
+
+    Experiments whose config sets ``'allocation': 'bandit'`` are routed by
+    these weights instead of their configured ``variants`` split. Weights
+    live in the ``ab_bandit_weights`` collection, one document per
+    experiment, which every worker follows through a snapshot listener,
+    so all workers route with the same weights. A background thread
+    recomputes the weights from the rollups every
+    ``AB_BANDIT_REFRESH_INTERVAL`` seconds. The computation is seeded from
+    the rollup totals and rounded to ``WEIGHT_STEP``, and a document is
+    only rewritten when some arm moves by ``WEIGHT_CHANGE_THRESHOLD`` or
+    more. Until weights are published an experiment uses its configured
+    split. An experiment can override ``min_weight``, ``reward_weights``
+    and ``latency_scale_ms`` in a ``bandit`` map. ``version`` increases
+    whenever any weights change.
+    """
+
+    def __init__(self, rollups, registry, collection: str = 'ab_bandit_weights',
+                 refresh_interval: int = None):
+        self.rollups = rollups
+        self.registry = registry
+        self.collection = collection
+        self.refresh_interval = refresh_interval or Config.AB_BANDIT_REFRESH_INTERVAL
+        self.store = get_document_store()
+        self.version = 0
+        self._weights = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+
+    def get_weights(self, experiment_name: str, experiment: Dict[str, Any]) -> Dict[str, float]:
+        """Current traffic weights for a bandit experiment"""
+        self._ensure_started()
+        cached = self._weights.get(experiment_name)
+        if cached and set(cached) == set(experiment['variants']):
+            return cached
+        return experiment['variants']
+
+    def refresh(self, experiment_name: str, experiment: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """Recompute one experiment's weights and publish them if they moved"""
+        try:
+            settings = experiment.get('bandit') or {}
+            totals = self.rollups.get_totals(experiment_name)
+            weights = quantize_weights(thompson_weights(
+                experiment['variants'],
+                totals,
+                min_weight=settings.get('min_weight', Config.AB_BANDIT_MIN_WEIGHT),
+                settings=settings,
+                rng=np.random.default_rng(totals_seed(experiment_name, totals))
+            ))
+            if not weights_changed(self._weights.get(experiment_name), weights):
+                return self._weights[experiment_name]
+            self.store.set(self.collection, experiment_name, {
+                'weights': weights,
+                'updated_at': datetime.utcnow()
+            })
+            self._apply_change('MODIFIED', experiment_name, {'weights': weights})
+            return weights
+        except Exception as e:
+            logger.error("Error computing bandit weights for %s: %s", experiment_name, e)
+            return None
+
+    def refresh_all(self):
+        """Recompute weights for every active bandit experiment"""
+        for experiment in self.registry.list(active_only=True):
+            if experiment.get('allocation') == 'bandit' and experiment.get('name'):
+                self.refresh(experiment['name'], experiment)
+
+    def _reset(self, docs: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Replace the cached weights with a full snapshot of the collection"""
+        weights = {doc_id: data['weights'] for doc_id, data in docs if data.get('weights')}
+        with self._lock:
+            if weights != self._weights:
+                self._weights = weights
+                self.version += 1
+
+    def _apply_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        """Apply one experiment's published weights"""
+        with self._lock:
+            weights = dict(self._weights)
+            if change_type == 'REMOVED' or not (data or {}).get('weights'):
+                weights.pop(doc_id, None)
+            else:
+                weights[doc_id] = data['weights']
+            if weights != self._weights:
+                self._weights = weights
+                self.version += 1
+
+    def _ensure_started(self):
+        """Start following published weights and the background refresher on first use"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._watcher = CollectionWatcher(
+                    self.store,
+                    self.collection,
+                    on_reset=self._reset,
+                    on_change=self._apply_change,
+                    refresh_interval=self.refresh_interval
+                )
+                self._watcher.start()
+                self._thread = threading.Thread(target=self._run, name='ab-bandit', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh_all()
+            time.sleep(self.refresh_interval)
+
+_bandit_allocator = None
+_bandit_allocator_lock = threading.Lock()
+
+def get_bandit_allocator(rollups, registry) -> BanditAllocator:
+    """Return the bandit allocator shared by this worker process"""
+    global _bandit_allocator
+    if _bandit_allocator is None:
+        with _bandit_allocator_lock:
+            if _bandit_allocator is None:
+                _bandit_allocator = BanditAllocator(rollups, registry)
+    return _bandit_allocator
@@ -0,0 +1,311 @@
+import logging
+import threading
+import zlib
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+from app.services.experiment_registry import get_experiment_registry
+from app.utils.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Layers and variant splits are both divided into this many buckets
+NUM_BUCKETS = 10000
+
+# Symbols for variant indexes in an encoded assignment vector
+VECTOR_SYMBOLS = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+NOT_ENROLLED = '-'
+HELD_OUT = '.'
+
+def hash_seed(name: str) -> int:
+    """Seed for a layer's or experiment's bucket hash"""
+    return zlib.crc32(name.encode('utf-8'))
+
+def bucket(seed: int, key: bytes) -> int:
+    """Map a key to a bucket in ``[0, NUM_BUCKETS)``.
+
+    CRC-32 seeded per layer or experiment, followed by the MurmurHash3
+    32-bit finalizer so that a user's buckets in different layers are
+    independent of each other.
+    """
+    h = zlib.crc32(key, seed)
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+    return h % NUM_BUCKETS
+
+def _to_bucket(fraction: float) -> int:
+    return int(round(min(max(float(fraction), 0.0), 1.0) * NUM_BUCKETS))
+
+class CompiledExperiment:
+    """Bucket range table for one experiment's variant split"""
+
+    __slots__ = ('name', 'index', 'seed', 'variants', 'holdout', 'bounds')
+
+    def __init__(self, name: str, index: int, variants: Dict[str, float], holdout: float = 0.0):
+        self.name = name
+        self.index = index
+        self.seed = hash_seed(name)
+        self.variants = [variant for variant, weight in variants.items() if weight > 0]
+        self.holdout = _to_bucket(holdout)
+
+        # Upper bucket bound of each variant over [holdout, NUM_BUCKETS)
+        total = sum(variants[variant] for variant in self.variants)
+        span = NUM_BUCKETS - self.holdout
+        self.bounds = []
+        cumulative = 0.0
+        for variant in self.variants:
+            cumulative += variants[variant] / total
+            self.bounds.append(self.holdout + int(round(cumulative * span)))
+        if self.bounds:
+            self.bounds[-1] = NUM_BUCKETS
+
+    def variant_index(self, key: bytes) -> Optional[int]:
+        """Index of the key's variant, or None if it falls in the holdout"""
+        value = bucket(self.seed, key)
+        if value < self.holdout or not self.bounds:
+            return None
+        return bisect_right(self.bounds, value)
+
+class CompiledLayer:
+    """Bucket range table mapping a layer's buckets to its experiments"""
+
+    __slots__ = ('name', 'seed', 'starts', 'ends', 'experiments')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seed = hash_seed(name)
+        self.starts = []
+        self.ends = []
+        self.experiments = []
+
+    def add(self, experiment: CompiledExperiment, start: int, end: int) -> bool:
+        """Claim ``[start, end)`` of the layer; False if it overlaps another experiment"""
+        position = bisect_right(self.starts, start)
+        if position > 0 and self.ends[position - 1] > start:
+            return False
+        if position < len(self.starts) and self.starts[position] < end:
+            return False
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.experiments.insert(position, experiment)
+        return True
+
+    def experiment_for(self, key: bytes) -> Optional[CompiledExperiment]:
+        """The experiment the key is enrolled in within this layer, if any"""
+        value = bucket(self.seed, key)
+        position = bisect_right(self.starts, value) - 1
+        if position >= 0 and value < self.ends[position]:
+            return self.experiments[position]
+        return None
+
+class BucketingEngine:
+    """Assigns users to every active experiment in one pass.
+
+    Experiments are grouped into layers. A user hashes to one bucket per
+    layer and is enrolled in at most one experiment of that layer, so
+    experiments sharing a layer are mutually exclusive while experiments
+    in different layers are independent. Experiment configs may set:
+
+    - ``layer``: layer name, defaulting to a layer of its own
+    - ``layer_range``: ``[start, end)`` fractions of the layer's buckets the
+      experiment claims, defaulting to ``[0, 1]``. Buckets no experiment
+      claims act as a layer-wide holdout
+    - ``holdout``: fraction of enrolled users who see no variant
+
+    The range tables are compiled once per experiment snapshot, so an
+    assignment costs one hash and one bisect per layer. An experiment
+    whose config cannot be compiled is logged and skipped; the others
+    still compile.
+    """
+
+    def __init__(self, experiments: List[Dict[str, Any]],
+                 weights: Dict[str, Dict[str, float]] = None):
+        weights = weights or {}
+        self.experiments = {}
+        self.layers = {}
+        self._layer_of = {}
+
+        active = sorted(
+            (experiment for experiment in experiments
+             if experiment.get('status') == 'active' and experiment.get('name')),
+            key=lambda experiment: experiment['name']
+        )
+        for experiment in active:
+            name = experiment['name']
+            try:
+                variants = weights.get(name) or experiment.get('variants') or {}
+                compiled = CompiledExperiment(name, len(self.experiments), variants,
+                                              experiment.get('holdout', 0.0))
+                if not compiled.variants:
+                    logger.warning("Skipping experiment %s: no variant has a positive weight", name)
+                    continue
+                if len(compiled.variants) > len(VECTOR_SYMBOLS):
+                    logger.warning("Skipping experiment %s: too many variants", name)
+                    continue
+
+                layer_name = str(experiment.get('layer') or f"experiment:{name}")
+                start, end = experiment.get('layer_range') or (0.0, 1.0)
+                start, end = _to_bucket(start), _to_bucket(end)
+                if start >= end:
+                    logger.warning("Skipping experiment %s: empty layer_range", name)
+                    continue
+            except Exception as e:
+                # One malformed config must not take down every other assignment
+                logger.warning("Skipping experiment %s: invalid configuration: %s", name, e)
+                continue
+
+            layer = self.layers.get(layer_name)
+            if layer is None:
+                layer = self.layers[layer_name] = CompiledLayer(layer_name)
+            if not layer.add(compiled, start, end):
+                logger.warning("Skipping experiment %s: overlaps another experiment in layer %s", name, layer_name)
+                continue
+            self.experiments[name] = compiled
+            self._layer_of[name] = layer
+
+        # Vector positions follow experiment names, so keep them dense
+        for index, compiled in enumerate(self.experiments.values()):
+            compiled.index = index
+        self.fingerprint = self._fingerprint()
+
+    def _fingerprint(self) -> str:
+        """Short digest of the compiled tables.
+
+        Identical across workers that hold the same experiments and the
+        same published bandit weights.
+        """
+        parts = []
+        for layer_name in sorted(self.layers):
+            layer = self.layers[layer_name]
+            for start, end, compiled in zip(layer.starts, layer.ends, layer.experiments):
+                parts.append(f"{layer_name}|{start}|{end}|{compiled.name}|{compiled.holdout}|"
+                             f"{','.join(compiled.variants)}|{compiled.bounds}")
+        return f"{zlib.crc32(';'.join(parts).encode('utf-8')):08x}"
+
+    def assign(self, user_id: str, experiment_name: str) -> Optional[str]:
+        """The user's variant in one experiment, or None if not enrolled"""
+        compiled = self.experiments.get(experiment_name)
+        if compiled is None:
+            return None
+        key = user_id.encode('utf-8')
+        if self._layer_of[experiment_name].experiment_for(key) is not compiled:
+            return None
+        index = compiled.variant_index(key)
+        return None if index is None else compiled.variants[index]
+
+    def evaluate(self, user_id: str) -> Dict[str, Optional[int]]:
+        """Variant indexes for every experiment the user is enrolled in.
+
+        Held out users map to None.
+        """
+        key = user_id.encode('utf-8')
+        enrolled = {}
+        for layer in self.layers.values():
+            compiled = layer.experiment_for(key)
+            if compiled is not None:
+                enrolled[compiled.name] = compiled.variant_index(key)
+        return enrolled
+
+    def assign_all(self, user_id: str) -> Dict[str, str]:
+        """The user's variant in every experiment that shows them one"""
+        return {
+            name: self.experiments[name].variants[index]
+            for name, index in self.evaluate(user_id).items()
+            if index is not None
+        }
+
+    def encode(self, user_id: str) -> str:
+        """Compact assignment vector: ``<fingerprint>.<one symbol per experiment>``"""
+        symbols = [NOT_ENROLLED] * len(self.experiments)
+        for name, index in self.evaluate(user_id).items():
+            symbols[self.experiments[name].index] = HELD_OUT if index is None else VECTOR_SYMBOLS[index]
+        return f"{self.fingerprint}.{''.join(symbols)}"
+
+    def decode(self, vector: str, experiment_name: str) -> Optional[str]:
+        """Read one experiment's variant from a vector built by these tables.
+
+        Returns ``''`` when the vector says the user is not shown a
+        variant, and None when the vector was built from different tables
+        and the assignment has to be recomputed.
+        """
+        fingerprint, _, symbols = (vector or '').partition('.')
+        compiled = self.experiments.get(experiment_name)
+        if (fingerprint != self.fingerprint or compiled is None
+                or len(symbols) != len(self.experiments)):
+            return None
+        symbol = symbols[compiled.index]
+        if symbol in (NOT_ENROLLED, HELD_OUT):
+            return ''
+        index = VECTOR_SYMBOLS.find(symbol)
+        if not 0 <= index < len(compiled.variants):
+            return None
+        return compiled.variants[index]
+
+class BucketingService:
+    """Keeps a bucketing engine in step with the experiment registry.
+
+    The engine is recompiled whenever the registry or the bandit weights
+    change, so lookups always see the current experiment snapshot.
+    """
+
+    def __init__(self, registry, bandit=None):
+        self.registry = registry
+        self.bandit = bandit
+        self._engine = None
+        self._engine_key = None
+        self._lock = threading.Lock()
+
+    def engine(self) -> BucketingEngine:
+        """The engine compiled from the current experiment snapshot"""
+        key = (self.registry.version, self.bandit.version if self.bandit else 0)
+        engine = self._engine
+        if engine is not None and self._engine_key == key:
+            return engine
+        with self._lock:
+            if self._engine is None or self._engine_key != key:
+                experiments = self.registry.list(active_only=True)
+                weights = {}
+                if self.bandit is not None:
+                    for experiment in experiments:
+                        if experiment.get('allocation') == 'bandit' and experiment.get('name'):
+                            weights[experiment['name']] = self.bandit.get_weights(
+                                experiment['name'], experiment)
+                self._engine = BucketingEngine(experiments, weights)
+                self._engine_key = key
+            return self._engine
+
+    def assign(self, user_id: str, experiment_name: str, vector: str = None) -> Optional[str]:
+        """The user's variant, read from ``vector`` when it is still current"""
+        engine = self.engine()
+        if vector:
+            variant = engine.decode(vector, experiment_name)
+            record_cache('assignment_vector', variant is not None)
+            if variant is not None:
+                return variant or None
+        return engine.assign(user_id, experiment_name)
+
+    def assign_all(self, user_id: str) -> Dict[str, str]:
+        """The user's variant in every experiment that shows them one"""
+        return self.engine().assign_all(user_id)
+
+    def assignment_vector(self, user_id: str) -> str:
+        """Compact assignment vector for embedding in the user's JWT"""
+        return self.engine().encode(user_id)
+
+_bucketing_service = None
+_bucketing_service_lock = threading.Lock()
+
+def get_bucketing_service(bandit=None) -> BucketingService:
+    """Return the bucketing service shared by this worker process"""
+    global _bucketing_service
+    if _bucketing_service is None:
+        with _bucketing_service_lock:
+            if _bucketing_service is None:
+                _bucketing_service = BucketingService(get_experiment_registry(), bandit)
+    if bandit is not None and _bucketing_service.bandit is None:
+        with _bucketing_service_lock:
+            _bucketing_service.bandit = bandit
+            _bucketing_service._engine = None
+    return _bucketing_service
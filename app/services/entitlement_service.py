@@ -0,0 +1,95 @@
+from typing import Any, Dict, Optional
+from app.config import Config
+from app.models.payment import PAYMENT_PLANS, PaymentPlan, PaymentService
+from app.services.model_service import AVAILABLE_MODELS, DEFAULT_MODELS, SUPPORTED_PROVIDERS
+
+class Entitlements:
+    """A plan's features compiled into constant-time lookups"""
+
+    __slots__ = ('plan_id', 'models', 'providers', 'messages_per_day',
+                 'priority_access', 'features')
+
+    def __init__(self, plan: PaymentPlan):
+        features = plan.features
+        models = features.get('models', [])
+        if models == 'all':
+            self.models = None  # Every model
+        else:
+            self.models = frozenset(models)
+        self.plan_id = plan.plan_id
+        self.providers = frozenset(
+            provider for provider, info in AVAILABLE_MODELS.items()
+            if any(self.allows_model(model) for model in info['models'])
+        )
+        self.messages_per_day = plan.messages_per_day
+        self.priority_access = bool(features.get('priority_access'))
+        self.features = features
+
+    def allows_model(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def allows_provider(self, provider: str) -> bool:
+        """Whether the provider's default model is included in the plan"""
+        model = DEFAULT_MODELS.get(provider)
+        return model is not None and self.allows_model(model)
+
+    def route(self, provider: str) -> Optional[str]:
+        """The provider to use for a turn requested on ``provider``.
+
+        Falls back to the first supported provider the plan allows, or
+        None if it allows none.
+        """
+        if self.allows_provider(provider):
+            return provider
+        for fallback in SUPPORTED_PROVIDERS:
+            if self.allows_provider(fallback):
+                return fallback
+        return None
+
+    def available_models(self) -> Dict[str, Dict[str, Any]]:
+        """AVAILABLE_MODELS narrowed to the models in the plan"""
+        available = {}
+        for provider, info in AVAILABLE_MODELS.items():
+            models = [model for model in info['models'] if self.allows_model(model)]
+            if models:
+                available[provider] = {**info, 'models': models}
+        return available
+
+def compile_plans(plans: Dict[str, PaymentPlan]) -> Dict[str, Entitlements]:
+    return {plan_id: Entitlements(plan) for plan_id, plan in plans.items()}
+
+class EntitlementService:
+    """Resolves a user's plan entitlements without storage I/O.
+
+    The plan comes from the user's subscription in the in-memory
+    subscription cache. Until the cache has loaded it comes from the
+    ``plan`` claim of the user's JWT, and only without one from a point
+    read. Users without an active subscription get ``DEFAULT_PLAN``.
+    """
+
+    def __init__(self, payment_service: PaymentService = None,
+                 plans: Dict[str, PaymentPlan] = None):
+        self.payment_service = payment_service or PaymentService()
+        self.plans = compile_plans(plans or PAYMENT_PLANS)
+        self.default_plan = Config.DEFAULT_PLAN
+
+    @property
+    def default(self) -> Entitlements:
+        return self.plans[self.default_plan]
+
+    def plan_id_for_user(self, user_id: str, claims: Dict[str, Any] = None) -> str:
+        """The id of the plan the user is currently entitled to"""
+        claimed = (claims or {}).get('plan')
+        if not self.payment_service.cache.ready and claimed in self.plans:
+            return claimed
+
+        subscription = self.payment_service.get_user_subscription(user_id)
+        if subscription and subscription.is_active() and subscription.plan_id in self.plans:
+            return subscription.plan_id
+        return self.default_plan
+
+    def for_user(self, user_id: str, claims: Dict[str, Any] = None) -> Entitlements:
+        """The user's compiled entitlements"""
+        if not Config.ENTITLEMENTS_ENABLED:
+            return self.default
+        return self.plans[self.plan_id_for_user(user_id, claims)]
@@ -0,0 +1,121 @@
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from app.config import Config
+from app.storage.document_store import get_document_store
+from app.utils.collection_watcher import CollectionWatcher
+
+def default_experiments() -> Dict[str, Dict[str, Any]]:
+    """Experiments that exist whenever A/B testing is enabled"""
+    if not Config.AB_TEST_ENABLED:
+        return {}
+    split = min(max(Config.AB_TEST_SPLIT_RATIO, 0.0), 1.0)
+    return {
+        'model_comparison': {
+            'name': 'model_comparison',
+            'variants': {
+                'openai': split,
+                'google': 1.0 - split
+            },
+            'description': 'Compare OpenAI GPT vs Google Gemini performance',
+            'allocation': Config.AB_TEST_ALLOCATION,
+            'status': 'active'
+        }
+    }
+
+class ExperimentRegistry:
+    """In-memory copy of the ``ab_experiments`` collection, shared per worker.
+
+    Loaded at startup and kept current by a snapshot listener, falling
+    back to polling every ``AB_REGISTRY_REFRESH_INTERVAL`` seconds, so
+    experiment changes reach every worker within seconds while lookups
+    never read Firestore. Every change bumps ``version``; the experiment
+    map is replaced rather than mutated, so readers always see a
+    consistent snapshot.
+
+    Default experiments derived from ``Config`` are used when the
+    collection does not define an experiment of the same name.
+    """
+
+    def __init__(self, collection: str = 'ab_experiments', refresh_interval: int = None):
+        self.collection = collection
+        self.refresh_interval = refresh_interval or Config.AB_REGISTRY_REFRESH_INTERVAL
+        self.version = 0
+        self.updated_at = None
+        self._experiments = default_experiments()
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the registry holds a loaded snapshot of the collection"""
+        return self._watcher is not None and self._watcher.ready
+
+    def start(self):
+        """Load experiments and keep them current via a snapshot listener"""
+        if self._watcher is None:
+            self._watcher = CollectionWatcher(
+                get_document_store(),
+                self.collection,
+                on_reset=self._reset,
+                on_change=self._apply_change,
+                refresh_interval=self.refresh_interval
+            )
+        self._watcher.start()
+
+    def stop(self):
+        """Stop receiving experiment updates"""
+        if self._watcher is not None:
+            self._watcher.stop()
+
+    def get(self, experiment_name: str) -> Optional[Dict[str, Any]]:
+        """Get an experiment's configuration"""
+        return self._experiments.get(experiment_name)
+
+    def list(self, active_only: bool = False) -> List[Dict[str, Any]]:
+        """List experiment configurations"""
+        experiments = self._experiments.values()
+        if active_only:
+            return [experiment for experiment in experiments if experiment.get('status') == 'active']
+        return list(experiments)
+
+    def put(self, experiment_name: str, experiment: Optional[Dict[str, Any]]):
+        """Apply a local write immediately, ahead of the listener"""
+        self._apply_change('REMOVED' if experiment is None else 'MODIFIED',
+                           experiment_name, experiment)
+
+    def _publish(self, experiments: Dict[str, Dict[str, Any]]):
+        """Swap in a new experiment map and bump the version"""
+        self._experiments = experiments
+        self.version += 1
+        self.updated_at = datetime.utcnow()
+
+    def _reset(self, docs: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Replace the registry with a full snapshot of the collection"""
+        experiments = default_experiments()
+        for doc_id, data in docs:
+            experiments[doc_id] = data
+        with self._lock:
+            self._publish(experiments)
+
+    def _apply_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        """Apply a single experiment change"""
+        with self._lock:
+            experiments = dict(self._experiments)
+            if change_type == 'REMOVED':
+                experiments.pop(doc_id, None)
+                default = default_experiments().get(doc_id)
+                if default:
+                    experiments[doc_id] = default
+            else:
+                experiments[doc_id] = data
+            self._publish(experiments)
+
+_experiment_registry = None
+
+def get_experiment_registry() -> ExperimentRegistry:
+    """Return the experiment registry shared by this worker process"""
+    global _experiment_registry
+    if _experiment_registry is None:
+        _experiment_registry = ExperimentRegistry()
+    return _experiment_registry
@@ -1,17 +1,26 @@
+import logging
 import json
 import base64
 from datetime import datetime
 from typing import Dict, Any, Optional
 from google.cloud import pubsub_v1
 from app.config import Config
+from app.utils.clients import get_publisher_client
+from app.utils.metrics import time_dependency
+
+logger = logging.getLogger(__name__)
 
 class LLMIntegrationService:
     """Service for integrating with the LLM backend via Pub/Sub"""
     
     def __init__(self):
-        self.publisher = pubsub_v1.PublisherClient()
         self.topic_name = f"projects/{Config.GOOGLE_CLOUD_PROJECT}/topics/llm-processing"
     
+    @property
+    def publisher(self) -> pubsub_v1.PublisherClient:
+        """This process's Pub/Sub publisher, created on first use"""
+        return get_publisher_client()
+    
     def publish_llm_request(self, session_id: str, user_id: str, messages: list, 
                            model_provider: str = None, model_name: str = None,
                            temperature: float = 0.7, max_tokens: int = 1000) -> bool:
@@ -36,22 +45,22 @@ class LLMIntegrationService:
             # Convert to JSON and encode
             message_data = json.dumps(llm_request).encode('utf-8')
             
-            # Publish to Pub/Sub
-            future = self.publisher.publish(
-                self.topic_name,
-                message_data,
-                session_id=session_id,
-                user_id=user_id
-            )
-            
-            # Wait for the publish to complete
-            message_id = future.result()
-            print(f"Published LLM request {message_id} for session {session_id}")
+            # Publish to Pub/Sub and wait for the publish to complete
+            with time_dependency('pubsub', 'publish'):
+                future = self.publisher.publish(
+                    self.topic_name,
+                    message_data,
+                    session_id=session_id,
+                    user_id=user_id
+                )
+                message_id = future.result()
+            logger.info("Published LLM request %s for session %s", message_id, session_id,
+                        extra={'message_id': message_id, 'session_id': session_id})
             
             return True
             
         except Exception as e:
-            print(f"Error publishing LLM request: {e}")
+            logger.error("Error publishing LLM request: %s", e)
             return False
     
     def publish_ab_test_request(self, session_id: str, user_id: str, messages: list,
@@ -71,5 +80,5 @@ class LLMIntegrationService:
                 }
             )
         except Exception as e:
-            print(f"Error publishing A/B test request: {e}")
+            logger.error("Error publishing A/B test request: %s", e)
             return False
@@ -4,6 +4,31 @@ import google.generativeai as genai
 from typing import Dict, Any, List, Optional
 from app.config import Config
 from app.services.llm_integration_service import LLMIntegrationService
+from app.services.usage_service import get_usage_meter, normalize_usage
+from app.utils.metrics import time_dependency
+
+# Providers generate_response can route to directly
+SUPPORTED_PROVIDERS = ('openai', 'google')
+
+# Models offered by each provider
+AVAILABLE_MODELS = {
+    'openai': {
+        'name': 'OpenAI GPT',
+        'models': ['gpt-3.5-turbo', 'gpt-4'],
+        'description': 'OpenAI\'s GPT models'
+    },
+    'google': {
+        'name': 'Google Gemini',
+        'models': ['gemini-pro'],
+        'description': 'Google\'s Gemini models'
+    }
+}
+
+# Model generate_response uses for each provider
+DEFAULT_MODELS = {
+    'openai': 'gpt-3.5-turbo',
+    'google': 'gemini-pro'
+}
 
 class ModelService:
     """Service for communicating with different AI models"""
@@ -18,23 +43,27 @@ class ModelService:
         
         # Initialize LLM integration service
         self.llm_integration = LLMIntegrationService()
+        
+        # Token usage is aggregated in memory and flushed in the background
+        self.usage_meter = get_usage_meter()
     
     def generate_response_openai(self, messages: List[Dict[str, str]], 
                                model: str = "gpt-3.5-turbo") -> Dict[str, Any]:
         """Generate response using OpenAI GPT models"""
         try:
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=messages,
-                max_tokens=1000,
-                temperature=0.7
-            )
+            with time_dependency('openai', 'chat_completion'):
+                response = openai.ChatCompletion.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=1000,
+                    temperature=0.7
+                )
             
             return {
                 'success': True,
                 'content': response.choices[0].message.content,
                 'model': model,
-                'usage': response.usage,
+                'usage': normalize_usage(response.usage),
                 'metadata': {
                     'provider': 'openai',
                     'model': model
@@ -57,12 +86,14 @@ class ModelService:
             # Convert messages to prompt format for Gemini
             prompt = self._convert_messages_to_prompt(messages)
             
-            response = self.google_model.generate_content(prompt)
+            with time_dependency('gemini', 'generate_content'):
+                response = self.google_model.generate_content(prompt)
             
             return {
                 'success': True,
                 'content': response.text,
                 'model': 'gemini-pro',
+                'usage': normalize_usage(getattr(response, 'usage_metadata', None)),
                 'metadata': {
                     'provider': 'google',
                     'model': 'gemini-pro'
@@ -109,9 +140,9 @@ class ModelService:
         
         # Fallback to direct API calls
         if model_provider.lower() == "openai":
-            return self.generate_response_openai(messages)
+            response = self.generate_response_openai(messages)
         elif model_provider.lower() == "google":
-            return self.generate_response_google(messages)
+            response = self.generate_response_google(messages)
         else:
             return {
                 'success': False,
@@ -120,6 +151,11 @@ class ModelService:
                     'provider': model_provider
                 }
             }
+        
+        if response['success'] and Config.USAGE_METERING_ENABLED:
+            self.usage_meter.record(user_id, model_provider.lower(), response.get('model'),
+                                    response.get('usage'))
+        return response
     
     def generate_response_via_llm_backend(self, messages: List[Dict[str, str]], 
                                          model_provider: str, session_id: str, 
@@ -0,0 +1,204 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from app.config import Config
+from app.storage.document_store import Increment, get_document_store
+
+logger = logging.getLogger(__name__)
+
+def utc_day(now: datetime = None) -> str:
+    """Quota day a moment falls in; days roll over at UTC midnight"""
+    return (now or datetime.utcnow()).strftime('%Y-%m-%d')
+
+def seconds_until_reset(now: datetime = None) -> int:
+    """Seconds until the next UTC midnight"""
+    now = now or datetime.utcnow()
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(int((midnight - now).total_seconds()) + 1, 1)
+
+class _UserQuota:
+    """One user's quota state in this worker"""
+
+    __slots__ = ('day', 'remote', 'inflight', 'pending', 'synced_at', 'used_at', 'lock')
+
+    def __init__(self, day: str):
+        self.day = day
+        self.remote = 0      # Shard total as of the last reconcile
+        self.inflight = 0    # Local usage being written by a reconcile
+        self.pending = 0     # Local usage not yet written
+        self.synced_at = 0.0
+        self.used_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def used(self) -> int:
+        return self.remote + self.inflight + self.pending
+
+class QuotaService:
+    """Daily message quotas checked against in-memory per-user buckets.
+
+    Each worker keeps, per user, the day's usage total read from sharded
+    counters in ``usage_counters`` plus its own usage not written yet. A
+    check is a local comparison against that estimate. A background thread
+    writes local usage to a random counter shard as a single increment and
+    re-reads the shard total every ``QUOTA_SYNC_INTERVAL`` seconds.
+
+    Other workers' unsynced usage is invisible, so a user can overshoot
+    their limit by what the other workers admit within one sync interval.
+    Once a user is within ``QUOTA_SYNC_MARGIN`` messages of the limit,
+    every check reconciles synchronously first, which keeps the overshoot
+    to checks that race each other.
+    """
+
+    def __init__(self, collection: str = 'usage_counters', num_shards: int = None,
+                 sync_interval: float = None, sync_margin: int = None):
+        self.collection = collection
+        self.num_shards = num_shards or Config.QUOTA_COUNTER_SHARDS
+        self.sync_interval = sync_interval or Config.QUOTA_SYNC_INTERVAL
+        self.sync_margin = Config.QUOTA_SYNC_MARGIN if sync_margin is None else sync_margin
+        self.idle_timeout = max(self.sync_interval * 10, 600)
+        self.store = get_document_store()
+        self._users = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def check(self, user_id: str, limit: Optional[int]) -> Tuple[bool, Dict[str, Any]]:
+        """Consume one message from the user's daily quota.
+
+        Returns ``(allowed, details)``; ``details`` carries ``limit``,
+        ``used`` and, when denied, ``retry_after`` in seconds. A ``limit``
+        of None means unlimited.
+        """
+        if limit is None:
+            return True, {'limit': None, 'used': None}
+
+        self._ensure_started()
+        quota = self._get_quota(user_id)
+        if quota.synced_at == 0.0 or limit - quota.used <= self.sync_margin:
+            self._reconcile(user_id, quota)
+
+        with quota.lock:
+            quota.used_at = time.monotonic()
+            if quota.used >= limit:
+                return False, {'limit': limit, 'used': quota.used,
+                               'retry_after': seconds_until_reset()}
+            quota.pending += 1
+            return True, {'limit': limit, 'used': quota.used}
+
+    def refund(self, user_id: str):
+        """Give back a message whose turn failed"""
+        quota = self._users.get(user_id)
+        if quota is None:
+            return
+        with quota.lock:
+            # May go negative once the message was written; the next
+            # reconcile then writes a decrement
+            quota.pending -= 1
+
+    def get_usage(self, user_id: str) -> int:
+        """Messages the user has sent today, as far as this worker knows"""
+        quota = self._get_quota(user_id)
+        if quota.synced_at == 0.0:
+            self._reconcile(user_id, quota)
+        return quota.used
+
+    def sync(self):
+        """Reconcile every user with unwritten or stale usage"""
+        now = time.monotonic()
+        with self._lock:
+            users = list(self._users.items())
+        for user_id, quota in users:
+            if quota.day != utc_day() or (now - quota.used_at > self.idle_timeout
+                                          and not quota.pending):
+                if quota.pending:
+                    self._reconcile(user_id, quota)
+                with self._lock:
+                    if self._users.get(user_id) is quota:
+                        del self._users[user_id]
+                continue
+            if quota.pending or now - quota.synced_at >= self.sync_interval:
+                self._reconcile(user_id, quota)
+
+    def _get_quota(self, user_id: str) -> _UserQuota:
+        """The user's state for today, replacing yesterday's"""
+        day = utc_day()
+        quota = self._users.get(user_id)
+        if quota is not None and quota.day == day:
+            return quota
+        with self._lock:
+            previous = self._users.get(user_id)
+            if previous is not None and previous.day == day:
+                return previous
+            quota = self._users[user_id] = _UserQuota(day)
+        if previous is not None and previous.pending:
+            # Write yesterday's tail before it is forgotten
+            self._reconcile(user_id, previous)
+        return quota
+
+    @staticmethod
+    def _shard_id(user_id: str, day: str, shard: int) -> str:
+        return f"{user_id}:{day}:{shard}"
+
+    def _reconcile(self, user_id: str, quota: _UserQuota) -> bool:
+        """Write local usage to a counter shard, then re-read the shard total"""
+        with quota.lock:
+            delta = quota.pending
+            quota.pending = 0
+            quota.inflight += delta
+        try:
+            if delta:
+                shard_id = self._shard_id(user_id, quota.day, random.randrange(self.num_shards))
+                self.store.set(self.collection, shard_id, {
+                    'user_id': user_id,
+                    'day': quota.day,
+                    'count': Increment(delta),
+                    'updated_at': datetime.utcnow()
+                }, merge=True)
+
+            shard_ids = [self._shard_id(user_id, quota.day, shard) for shard in range(self.num_shards)]
+            total = sum(data.get('count', 0)
+                        for data in self.store.get_many(self.collection, shard_ids).values())
+        except Exception as e:
+            logger.error("Error reconciling quota for %s: %s", user_id, e)
+            with quota.lock:
+                quota.inflight -= delta
+                quota.pending += delta
+            return False
+
+        with quota.lock:
+            quota.inflight -= delta
+            quota.remote = total
+            quota.synced_at = time.monotonic()
+        return True
+
+    def _ensure_started(self):
+        """Start the background reconciler on first use"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='quota-sync', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error("Error syncing quotas: %s", e)
+
+_quota_service = None
+_quota_service_lock = threading.Lock()
+
+def get_quota_service() -> QuotaService:
+    """Return the quota service shared by this worker process"""
+    global _quota_service
+    if _quota_service is None:
+        with _quota_service_lock:
+            if _quota_service is None:
+                _quota_service = QuotaService()
+    return _quota_service
@@ -0,0 +1,304 @@
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import Config
+from app.models.chat import ChatService
+from app.services.ab_testing_service import ABTestingService
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # Only the export job needs pyarrow
+    pa = None
+
+EXPORT_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+CHECKPOINT_FILE = '_checkpoint.json'
+
+# event_data fields promoted to their own columns; the rest stay in event_data
+EVENT_DATA_COLUMNS = (('latency_ms', 'float64'), ('response_length', 'float64'),
+                      ('rating', 'float64'), ('model_provider', 'string'),
+                      ('session_id', 'string'))
+
+def _utc(value) -> Optional[datetime]:
+    """Firestore returns aware datetimes; records written with utcnow() are naive UTC"""
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+def _json(value) -> Optional[str]:
+    if not value:
+        return None
+    return json.dumps(value, default=str, sort_keys=True)
+
+def _schemas() -> Dict[str, Any]:
+    timestamp = pa.timestamp('us', tz='UTC')
+    return {
+        'events': pa.schema(
+            [('event_id', pa.string()), ('experiment_name', pa.string()),
+             ('user_id', pa.string()), ('variant', pa.string()),
+             ('event_type', pa.string()), ('timestamp', timestamp)]
+            + [(name, pa.float64() if kind == 'float64' else pa.string())
+               for name, kind in EVENT_DATA_COLUMNS]
+            + [('event_data', pa.string())]
+        ),
+        'assignments': pa.schema([
+            ('assignment_id', pa.string()), ('experiment_name', pa.string()),
+            ('user_id', pa.string()), ('variant', pa.string()),
+            ('assigned_at', timestamp)
+        ]),
+        'chat_turns': pa.schema([
+            ('session_id', pa.string()), ('user_id', pa.string()),
+            ('turn_index', pa.int32()), ('role', pa.string()),
+            ('timestamp', timestamp), ('model_used', pa.string()),
+            ('provider', pa.string()), ('model', pa.string()),
+            ('content_length', pa.int64()), ('metadata', pa.string())
+        ])
+    }
+
+def event_row(doc_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten one ``ab_events`` document into an export row"""
+    event_data = dict(event.get('event_data') or {})
+    row = {
+        'event_id': doc_id,
+        'experiment_name': event.get('experiment_name'),
+        'user_id': event.get('user_id'),
+        'variant': event.get('variant'),
+        'event_type': event.get('event_type'),
+        'timestamp': _utc(event.get('timestamp'))
+    }
+    for name, kind in EVENT_DATA_COLUMNS:
+        value = event_data.pop(name, None)
+        row[name] = _number(value) if kind == 'float64' else (None if value is None else str(value))
+    row['event_data'] = _json(event_data)
+    return row
+
+def assignment_row(doc_id: str, assignment: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten one ``ab_assignments`` document into an export row"""
+    return {
+        'assignment_id': doc_id,
+        'experiment_name': assignment.get('experiment_name'),
+        'user_id': assignment.get('user_id'),
+        'variant': assignment.get('variant'),
+        'assigned_at': _utc(assignment.get('assigned_at'))
+    }
+
+def turn_row(session, turn_index: int, message) -> Dict[str, Any]:
+    """Per-turn metadata for one chat message; message content is not exported"""
+    metadata = dict(message.metadata or {})
+    return {
+        'session_id': session.session_id,
+        'user_id': session.user_id,
+        'turn_index': turn_index,
+        'role': message.role.value,
+        'timestamp': _utc(message.timestamp),
+        'model_used': message.model_used,
+        'provider': metadata.pop('provider', None),
+        'model': metadata.pop('model', None),
+        'content_length': len(message.content or ''),
+        'metadata': _json(metadata)
+    }
+
+class PartitionedWriter:
+    """Writes rows into day-partitioned columnar files with bounded memory.
+
+    Rows are buffered per ``date=YYYY-MM-DD`` partition. A partition is
+    written out as its own part file once it holds ``chunk_rows`` rows, and
+    the largest partition is written whenever all buffers together exceed
+    that, so no more than ``chunk_rows`` rows are held at a time.
+    """
+
+    def __init__(self, root: str, dataset: str, schema, file_format: str,
+                 chunk_rows: int, run_id: str):
+        self.directory = os.path.join(root, dataset)
+        self.schema = schema
+        self.file_format = file_format
+        self.chunk_rows = chunk_rows
+        self.run_id = run_id
+        self.files = []
+        self.rows_written = 0
+        self._buffers = {}
+        self._buffered = 0
+
+    def add(self, row: Dict[str, Any], timestamp: datetime):
+        day = timestamp.strftime('%Y-%m-%d')
+        self._buffers.setdefault(day, []).append(row)
+        self._buffered += 1
+        if len(self._buffers[day]) >= self.chunk_rows:
+            self._flush(day)
+        elif self._buffered >= self.chunk_rows:
+            self._flush(max(self._buffers, key=lambda key: len(self._buffers[key])))
+
+    def close(self) -> List[str]:
+        """Write every buffered row; returns the files written"""
+        for day in list(self._buffers):
+            self._flush(day)
+        return self.files
+
+    def abort(self):
+        """Delete the files written so far, e.g. after a failed run"""
+        for path in self.files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.files = []
+        self._buffers = {}
+        self._buffered = 0
+
+    def _flush(self, day: str):
+        rows = self._buffers.pop(day, [])
+        self._buffered -= len(rows)
+        if not rows:
+            return
+        directory = os.path.join(self.directory, f"date={day}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{self.run_id}-{len(self.files):05d}"
+                                       f"{EXPORT_FORMATS[self.file_format]}")
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+
+        # Readers never see a partially written file
+        temp_path = path + '.tmp'
+        if self.file_format == 'parquet':
+            pq.write_table(table, temp_path, compression='zstd')
+        else:
+            with pa.OSFile(temp_path, 'wb') as sink:
+                with pa_ipc.new_file(sink, self.schema) as writer:
+                    writer.write_table(table)
+        os.replace(temp_path, path)
+        self.files.append(path)
+        self.rows_written += len(rows)
+
+class TelemetryExportService:
+    """Incremental export of A/B and chat telemetry to columnar files.
+
+    Each dataset exports the records stamped after its last checkpoint and
+    at least ``settle_seconds`` ago. The delay gives buffered events and
+    in-flight chat turns time to be written, so a later run never finds
+    records older than its checkpoint. Files are laid out as
+    ``<output_dir>/<dataset>/date=YYYY-MM-DD/part-<run>-<n>.parquet``, and
+    the checkpoints live in ``<output_dir>/_checkpoint.json``. A dataset's
+    checkpoint only moves once all of its files are written. A failed run
+    removes its files, so re-running never duplicates rows.
+    """
+
+    DATASETS = ('events', 'assignments', 'chat_turns')
+
+    def __init__(self, ab_testing_service: ABTestingService = None,
+                 chat_service: ChatService = None, output_dir: str = None,
+                 file_format: str = None, chunk_rows: int = None, settle_seconds: int = None):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for telemetry export: pip install pyarrow")
+        self.ab_testing_service = ab_testing_service or ABTestingService()
+        self.chat_service = chat_service or ChatService()
+        self.output_dir = output_dir or Config.TELEMETRY_EXPORT_DIR
+        self.file_format = file_format or Config.TELEMETRY_EXPORT_FORMAT
+        if self.file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {self.file_format}")
+        self.chunk_rows = max(chunk_rows or Config.TELEMETRY_EXPORT_CHUNK_ROWS, 1)
+        self.settle_seconds = (Config.TELEMETRY_EXPORT_SETTLE_SECONDS
+                               if settle_seconds is None else settle_seconds)
+        self.checkpoint_path = os.path.join(self.output_dir, CHECKPOINT_FILE)
+        self.schemas = _schemas()
+
+    def load_checkpoints(self) -> Dict[str, Dict[str, Any]]:
+        """Read the per-dataset checkpoints of previous runs"""
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_checkpoints(self, checkpoints: Dict[str, Dict[str, Any]]):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(checkpoints, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def export(self, datasets: Iterable[str] = None, until: datetime = None) -> Dict[str, Any]:
+        """Export new records for each dataset; returns a per-dataset report"""
+        until = _utc(until) or datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+        run_id = f"{until.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        checkpoints = self.load_checkpoints()
+        report = {}
+
+        for dataset in datasets or self.DATASETS:
+            if dataset not in self.DATASETS:
+                raise ValueError(f"Unknown dataset: {dataset}")
+            watermark = checkpoints.get(dataset, {}).get('watermark')
+            since = datetime.fromisoformat(watermark) if watermark else None
+            if since is not None and since >= until:
+                report[dataset] = {'rows': 0, 'files': [], 'since': watermark,
+                                   'until': watermark}
+                continue
+
+            writer = PartitionedWriter(self.output_dir, dataset, self.schemas[dataset],
+                                       self.file_format, self.chunk_rows, run_id)
+            try:
+                for row, timestamp in self._rows(dataset, since, until):
+                    writer.add(row, timestamp)
+                files = writer.close()
+            except Exception:
+                writer.abort()
+                raise
+
+            previous = checkpoints.get(dataset, {})
+            checkpoints[dataset] = {
+                'watermark': until.isoformat(),
+                'rows': previous.get('rows', 0) + writer.rows_written,
+                'files': previous.get('files', 0) + len(files),
+                'exported_at': datetime.now(timezone.utc).isoformat()
+            }
+            self._save_checkpoints(checkpoints)
+            report[dataset] = {
+                'rows': writer.rows_written,
+                'files': files,
+                'since': watermark,
+                'until': until.isoformat()
+            }
+        return report
+
+    def _rows(self, dataset: str, since: Optional[datetime],
+              until: datetime) -> Iterable[Tuple[Dict[str, Any], datetime]]:
+        """Yield ``(row, partition timestamp)`` pairs for one dataset"""
+        if dataset == 'events':
+            return self._doc_rows(self.ab_testing_service.iter_events(since, until),
+                                  event_row, 'timestamp')
+        if dataset == 'assignments':
+            return self._doc_rows(self.ab_testing_service.iter_assignments(since, until),
+                                  assignment_row, 'assigned_at')
+        return self._turn_rows(since, until)
+
+    @staticmethod
+    def _doc_rows(docs: Iterable, to_row: Callable, field: str):
+        for doc_id, data in docs:
+            row = to_row(doc_id, data)
+            if row[field] is not None:
+                yield row, row[field]
+
+    def _turn_rows(self, since: Optional[datetime], until: datetime):
+        """Turns stamped in the window, from sessions updated since the checkpoint.
+
+        A session is saved after its newest turn is stamped, so every turn
+        in the window belongs to a session whose ``updated_at`` is after
+        ``since``.
+        """
+        for session in self.chat_service.iter_updated_sessions(since):
+            for turn_index, message in enumerate(session.messages):
+                timestamp = _utc(message.timestamp)
+                if timestamp is None or timestamp > until:
+                    continue
+                if since is not None and timestamp <= since:
+                    continue
+                yield turn_row(session, turn_index, message), timestamp
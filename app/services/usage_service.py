@@ -0,0 +1,220 @@
+import logging
+import atexit
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from app.config import Config
+from app.storage.document_store import BATCH_WRITE_LIMIT, DESCENDING, Increment, get_document_store
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens', 'turns')
+
+def _token_count(usage: Any, *names: str) -> int:
+    """Read a token count from a usage object or dict, trying each name"""
+    if usage is None:
+        return 0
+    for name in names:
+        value = getattr(usage, name, None)
+        if value is None and isinstance(usage, dict):
+            value = usage.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return int(value)
+    return 0
+
+def normalize_usage(usage: Any) -> Dict[str, int]:
+    """Token counts from OpenAI ``usage`` or Gemini ``usage_metadata``"""
+    prompt_tokens = _token_count(usage, 'prompt_tokens', 'prompt_token_count')
+    completion_tokens = _token_count(usage, 'completion_tokens', 'candidates_token_count')
+    total_tokens = (_token_count(usage, 'total_tokens', 'total_token_count')
+                    or prompt_tokens + completion_tokens)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': total_tokens
+    }
+
+def _empty_usage() -> Dict[str, int]:
+    return dict.fromkeys(USAGE_FIELDS, 0)
+
+class UsageMeter:
+    """Per-worker token usage aggregation with periodic batched flushes.
+
+    ``record`` only adds to in-memory counters keyed by user, provider,
+    model and day. A background thread writes the accumulated deltas every
+    ``USAGE_FLUSH_INTERVAL`` seconds as ``Increment`` updates, batched per
+    collection, through the document store to:
+
+    - ``usage_totals/{user_id}``: the user's lifetime totals
+    - ``usage_totals/{user_id}/models/{provider}:{model}``
+    - ``usage_totals/{user_id}/days/{YYYY-MM-DD}``
+
+    Deltas from a failed flush are merged back and retried. Whatever is
+    left is flushed at interpreter shutdown.
+    """
+
+    def __init__(self, collection: str = 'usage_totals', flush_interval: float = None):
+        self.collection = collection
+        self.flush_interval = flush_interval or Config.USAGE_FLUSH_INTERVAL
+        self.store = get_document_store()
+        self._pending = self._new_pending()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _new_pending():
+        return defaultdict(_empty_usage)
+
+    def record(self, user_id: str, provider: str, model: str, usage: Any):
+        """Add one turn's token usage to the in-memory totals"""
+        if not user_id:
+            return
+        self._ensure_started()
+        counts = normalize_usage(usage)
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        with self._lock:
+            totals = self._pending[(user_id, provider or 'unknown', model or 'unknown', day)]
+            for name, value in counts.items():
+                totals[name] += value
+            totals['turns'] += 1
+
+    def pending_for_user(self, user_id: str) -> Dict[str, int]:
+        """Usage recorded by this worker that is not written yet"""
+        totals = _empty_usage()
+        with self._lock:
+            for (pending_user, _, _, _), counts in self._pending.items():
+                if pending_user == user_id:
+                    for name in USAGE_FIELDS:
+                        totals[name] += counts[name]
+        return totals
+
+    def flush(self) -> bool:
+        """Write all accumulated deltas now"""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = self._new_pending()
+            if not pending:
+                return True
+
+            try:
+                self._write(pending)
+                return True
+            except Exception as e:
+                logger.error("Error flushing token usage: %s", e)
+                self._restore(pending)
+                return False
+
+    def shutdown(self):
+        """Stop the background writer and flush what is left"""
+        self._stopped.set()
+        self.flush()
+
+    def _restore(self, pending):
+        """Merge unwritten deltas back so the next flush retries them"""
+        with self._lock:
+            for key, counts in pending.items():
+                totals = self._pending[key]
+                for name in USAGE_FIELDS:
+                    totals[name] += counts[name]
+
+    def _write(self, pending):
+        """Write user, model and day deltas as Increment batches"""
+        users = defaultdict(_empty_usage)
+        models = defaultdict(_empty_usage)
+        days = defaultdict(_empty_usage)
+        for (user_id, provider, model, day), counts in pending.items():
+            for name in USAGE_FIELDS:
+                users[user_id][name] += counts[name]
+                models[(user_id, provider, model)][name] += counts[name]
+                days[(user_id, day)][name] += counts[name]
+
+        now = datetime.utcnow()
+        writes = defaultdict(list)
+        for user_id, counts in users.items():
+            writes[self.collection].append((user_id, {'user_id': user_id}, counts))
+        for (user_id, provider, model), counts in models.items():
+            writes[f"{self.collection}/{user_id}/models"].append(
+                (f"{provider}:{model}", {'provider': provider, 'model': model}, counts))
+        for (user_id, day), counts in days.items():
+            writes[f"{self.collection}/{user_id}/days"].append((day, {'day': day}, counts))
+
+        for collection, docs in writes.items():
+            for start in range(0, len(docs), BATCH_WRITE_LIMIT):
+                self.store.set_many(collection, [
+                    (doc_id, {
+                        **fields,
+                        **{name: Increment(value) for name, value in counts.items()},
+                        'updated_at': now
+                    })
+                    for doc_id, fields, counts in docs[start:start + BATCH_WRITE_LIMIT]
+                ], merge=True)
+
+    def _ensure_started(self):
+        """Start the background writer on first use"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='usage-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+class UsageService:
+    """Reads pre-aggregated token usage written by the UsageMeter"""
+
+    def __init__(self, meter: UsageMeter = None):
+        self.collection = 'usage_totals'
+        self.meter = meter or get_usage_meter()
+        self.store = get_document_store()
+
+    def get_user_usage(self, user_id: str, days: int = 30) -> Optional[Dict[str, Any]]:
+        """A user's usage totals, per-model breakdown and most recent days"""
+        try:
+            data = self.store.get(self.collection, user_id) or {}
+
+            # Include turns this worker has not written yet
+            pending = self.meter.pending_for_user(user_id)
+            totals = {name: data.get(name, 0) + pending[name] for name in USAGE_FIELDS}
+
+            models = [
+                {name: model.get(name) for name in ('provider', 'model') + USAGE_FIELDS}
+                for _, model in self.store.stream(f"{self.collection}/{user_id}/models")
+            ]
+
+            recent_days = self.store.query(f"{self.collection}/{user_id}/days",
+                                           order_by=[('day', DESCENDING)],
+                                           limit=days)
+            daily = [
+                {name: day.get(name) for name in ('day',) + USAGE_FIELDS}
+                for _, day in recent_days
+            ]
+
+            return {
+                'user_id': user_id,
+                'totals': totals,
+                'models': models,
+                'days': daily
+            }
+        except Exception as e:
+            logger.error("Error getting token usage: %s", e)
+            return None
+
+_usage_meter = None
+_usage_meter_lock = threading.Lock()
+
+def get_usage_meter() -> UsageMeter:
+    """Return the usage meter shared by this worker process"""
+    global _usage_meter
+    if _usage_meter is None:
+        with _usage_meter_lock:
+            if _usage_meter is None:
+                _usage_meter = UsageMeter()
+                atexit.register(_usage_meter.shutdown)
+    return _usage_meter
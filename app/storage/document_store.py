@@ -0,0 +1,176 @@
+import secrets
+import string
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from app.config import Config
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+# Field name that refers to the document id in ``order_by`` and cursors
+DOCUMENT_ID = '__name__'
+
+# Firestore rejects batched writes with more than 500 operations
+BATCH_WRITE_LIMIT = 500
+
+# A filter is ``(field, op, value)`` with op one of ==, !=, <, <=, >, >= or in
+Filter = Tuple[str, str, Any]
+
+# An ordering is a field name (ascending) or ``(field, direction)``
+Order = Any
+
+class DocumentNotFound(Exception):
+    """Raised when updating a document that does not exist"""
+
+class DocumentExists(Exception):
+    """Raised when creating a document that already exists"""
+
+class Increment:
+    """Add ``amount`` to a numeric field in ``set(..., merge=True)`` or ``update``.
+
+    A missing field is treated as zero, as with ``firestore.Increment``.
+    """
+
+    def __init__(self, amount):
+        self.amount = amount
+
+    def __repr__(self):
+        return f"Increment({self.amount!r})"
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+def new_document_id() -> str:
+    """Random 20-character document id, in the style Firestore generates"""
+    return ''.join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+class Subscription:
+    """Handle for a change listener opened with ``DocumentStore.watch``"""
+
+    def __init__(self, close: Callable[[], None] = None):
+        self._close = close
+        self._active = True
+
+    @property
+    def is_active(self) -> bool:
+        return self._active
+
+    def unsubscribe(self):
+        if self._active and self._close is not None:
+            self._close()
+        self._active = False
+
+class DocumentStore:
+    """Collections of JSON-like documents addressed by ``(collection, doc_id)``.
+
+    This is the storage surface the model services use: point reads and
+    writes, batched writes, and single-collection queries with equality
+    and range filters, ordering, cursors and limits. Every backend gives
+    the same results for the same calls, including Firestore's rules that
+    ordering by a field drops documents without it, that ties are broken
+    by document id, and that datetimes come back timezone-aware in UTC.
+    """
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return a document's data, or None if it does not exist"""
+        raise NotImplementedError
+
+    def get_many(self, collection: str, doc_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the data of every existing document among ``doc_ids``"""
+        raise NotImplementedError
+
+    def create(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        """Write a new document, raising DocumentExists if it is already there"""
+        raise NotImplementedError
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        """Write a document, replacing it or, with ``merge``, merging nested maps into it"""
+        raise NotImplementedError
+
+    def update(self, collection: str, doc_id: str, updates: Dict[str, Any]):
+        """Change fields of an existing document; dotted keys address nested fields"""
+        raise NotImplementedError
+
+    def delete(self, collection: str, doc_id: str):
+        """Delete a document if it exists"""
+        raise NotImplementedError
+
+    def set_many(self, collection: str, docs: Iterable[Tuple[str, Dict[str, Any]]],
+                 merge: bool = False):
+        """Write up to ``BATCH_WRITE_LIMIT`` documents in one atomic batch"""
+        raise NotImplementedError
+
+    def query(self, collection: str, filters: Sequence[Filter] = (),
+              order_by: Sequence[Order] = (), limit: int = None,
+              start_after: Dict[str, Any] = None,
+              fields: Sequence[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(doc_id, data)`` for the documents matching ``filters``.
+
+        ``start_after`` maps the leading ``order_by`` fields (and
+        ``DOCUMENT_ID``) to the values of the last document already seen.
+        ``fields`` limits the returned data to those fields.
+        """
+        raise NotImplementedError
+
+    def stream(self, collection: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield every document in a collection"""
+        return self.query(collection)
+
+    def watch(self, collection: str,
+              callback: Callable[[str, str, Optional[Dict[str, Any]]], None]) -> Subscription:
+        """Call ``callback(change_type, doc_id, data)`` as documents change.
+
+        ``change_type`` is ``ADDED``, ``MODIFIED`` or ``REMOVED`` (with
+        ``data`` None). Backends without a change feed raise
+        NotImplementedError, and callers fall back to polling.
+        """
+        raise NotImplementedError
+
+def normalize_orders(order_by: Sequence[Order]) -> List[Tuple[str, str]]:
+    """Return ``order_by`` as ``(field, direction)`` pairs"""
+    orders = []
+    for order in order_by:
+        if isinstance(order, str):
+            orders.append((order, ASCENDING))
+        else:
+            field, direction = order
+            orders.append((field, direction.upper()))
+    return orders
+
+def cursor_values(orders: List[Tuple[str, str]], start_after: Dict[str, Any]) -> List[Any]:
+    """Values of the leading order fields named by a ``start_after`` cursor"""
+    if not orders:
+        raise ValueError("start_after requires order_by")
+    if len(start_after) > len(orders):
+        raise ValueError("start_after names more fields than order_by")
+    values = []
+    for field, _ in orders[:len(start_after)]:
+        if field not in start_after:
+            raise ValueError(f"start_after is missing order_by field {field!r}")
+        values.append(start_after[field])
+    return values
+
+_document_store = None
+_document_store_lock = threading.Lock()
+
+def create_document_store(backend: str = None) -> DocumentStore:
+    """Create the store selected by ``backend`` or ``STORAGE_BACKEND``"""
+    backend = (backend or Config.STORAGE_BACKEND).lower()
+    if backend == 'firestore':
+        from app.storage.firestore_store import FirestoreStore
+        return FirestoreStore()
+    if backend == 'memory':
+        from app.storage.memory_store import MemoryStore
+        return MemoryStore()
+    if backend == 'sqlite':
+        from app.storage.sqlite_store import SQLiteStore
+        return SQLiteStore(Config.SQLITE_PATH)
+    raise ValueError(f"Unsupported STORAGE_BACKEND: {backend}")
+
+def get_document_store() -> DocumentStore:
+    """Return the document store shared by this worker process"""
+    global _document_store
+    if _document_store is None:
+        with _document_store_lock:
+            if _document_store is None:
+                _document_store = create_document_store()
+    return _document_store
@@ -0,0 +1,93 @@
+import copy
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+from app.storage.document_store import Increment
+
+# Document helpers shared by the stores that keep documents themselves
+# rather than delegating to Firestore
+
+_MISSING = object()
+
+def normalize_value(value):
+    """Copy a value as Firestore would return it.
+
+    Datetimes come back timezone-aware in UTC (naive ones are taken to be
+    UTC) and tuples come back as lists.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {key: normalize_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    return value
+
+def _resolve(value, current):
+    """Apply an Increment to the value it replaces"""
+    if isinstance(value, Increment):
+        if isinstance(current, (int, float)) and not isinstance(current, bool):
+            return current + value.amount
+        return value.amount
+    return normalize_value(value)
+
+def merge_document(target: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge ``data`` into ``target`` in place, recursing into nested maps"""
+    for key, value in data.items():
+        current = target.get(key, _MISSING)
+        if isinstance(value, dict):
+            if not isinstance(current, dict):
+                current = target[key] = {}
+            merge_document(current, value)
+        else:
+            target[key] = _resolve(value, None if current is _MISSING else current)
+    return target
+
+def new_document(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The document stored by a plain ``set`` of ``data``"""
+    return merge_document({}, data)
+
+def apply_updates(target: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply ``update`` field changes in place; dotted keys address nested fields"""
+    for path, value in updates.items():
+        parent = target
+        keys = path.split('.')
+        for key in keys[:-1]:
+            child = parent.get(key)
+            if not isinstance(child, dict):
+                child = parent[key] = {}
+            parent = child
+        current = parent.get(keys[-1])
+        if isinstance(value, dict):
+            parent[keys[-1]] = new_document(value)
+        else:
+            parent[keys[-1]] = _resolve(value, current)
+    return target
+
+def get_field(data: Dict[str, Any], path: str) -> Tuple[bool, Any]:
+    """Return ``(found, value)`` for a possibly dotted field path"""
+    value = data
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return False, None
+        value = value[key]
+    return True, value
+
+def project(data: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Copy of ``data`` limited to ``fields`` when given"""
+    if fields is None:
+        return copy.deepcopy(data)
+    projected = {}
+    for path in fields:
+        found, value = get_field(data, path)
+        if found:
+            apply_updates(projected, {path: copy.deepcopy(value)})
+    return projected
+
+def check_batch(docs: Iterable[Tuple[str, Dict[str, Any]]], limit: int) -> list:
+    """Materialize a batch of writes, enforcing Firestore's batch size limit"""
+    docs = list(docs)
+    if len(docs) > limit:
+        raise ValueError(f"A batch holds at most {limit} writes, got {len(docs)}")
+    return docs
@@ -0,0 +1,105 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud import firestore
+from app.storage.document_store import (
+    DESCENDING, DocumentExists, DocumentNotFound, DocumentStore, Filter, Increment, Order,
+    Subscription, normalize_orders
+)
+from app.utils.clients import get_firestore_client
+
+def _to_firestore(value):
+    """Replace Increment markers with Firestore transforms"""
+    if isinstance(value, Increment):
+        return firestore.Increment(value.amount)
+    if isinstance(value, dict):
+        return {key: _to_firestore(item) for key, item in value.items()}
+    return value
+
+class FirestoreStore(DocumentStore):
+    """Document store backed by Cloud Firestore"""
+
+    def __init__(self, client: firestore.Client = None):
+        self._client = client
+
+    @property
+    def client(self) -> firestore.Client:
+        """The client given, or this process's shared client"""
+        return self._client or get_firestore_client()
+
+    def _document(self, collection: str, doc_id: str):
+        return self.client.collection(collection).document(doc_id)
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc = self._document(collection, doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_many(self, collection: str, doc_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        refs = [self._document(collection, doc_id) for doc_id in doc_ids]
+        return {doc.id: doc.to_dict() for doc in self.client.get_all(refs) if doc.exists}
+
+    def create(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        try:
+            self._document(collection, doc_id).create(data)
+        except AlreadyExists as e:
+            raise DocumentExists(f"{collection}/{doc_id} already exists") from e
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        self._document(collection, doc_id).set(_to_firestore(data), merge=merge)
+
+    def update(self, collection: str, doc_id: str, updates: Dict[str, Any]):
+        try:
+            self._document(collection, doc_id).update(_to_firestore(updates))
+        except NotFound as e:
+            raise DocumentNotFound(f"{collection}/{doc_id} does not exist") from e
+
+    def delete(self, collection: str, doc_id: str):
+        self._document(collection, doc_id).delete()
+
+    def set_many(self, collection: str, docs: Iterable[Tuple[str, Dict[str, Any]]],
+                 merge: bool = False):
+        write_batch = self.client.batch()
+        for doc_id, data in docs:
+            write_batch.set(self._document(collection, doc_id), _to_firestore(data), merge=merge)
+        write_batch.commit()
+
+    def query(self, collection: str, filters: Sequence[Filter] = (),
+              order_by: Sequence[Order] = (), limit: int = None,
+              start_after: Dict[str, Any] = None,
+              fields: Sequence[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        query = self.client.collection(collection)
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        for field, direction in normalize_orders(order_by):
+            query = query.order_by(field, direction=(firestore.Query.DESCENDING
+                                                     if direction == DESCENDING
+                                                     else firestore.Query.ASCENDING))
+        if fields is not None:
+            query = query.select(list(fields))
+        if start_after is not None:
+            query = query.start_after(start_after)
+        if limit is not None:
+            query = query.limit(limit)
+        for doc in query.stream():
+            yield doc.id, doc.to_dict()
+
+    def watch(self, collection: str,
+              callback: Callable[[str, str, Optional[Dict[str, Any]]], None]) -> Subscription:
+        def on_snapshot(col_snapshot, changes, read_time):
+            for change in changes:
+                change_type = change.type.name
+                data = None if change_type == 'REMOVED' else change.document.to_dict()
+                callback(change_type, change.document.id, data)
+
+        watch = self.client.collection(collection).on_snapshot(on_snapshot)
+        return _FirestoreSubscription(watch)
+
+class _FirestoreSubscription(Subscription):
+    """Subscription that is active while the snapshot listener is"""
+
+    def __init__(self, watch):
+        super().__init__(watch.unsubscribe)
+        self._watch = watch
+
+    @property
+    def is_active(self) -> bool:
+        return self._active and getattr(self._watch, 'is_active', False)
@@ -0,0 +1,234 @@
+import copy
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from app.storage.document_store import (
+    ASCENDING, BATCH_WRITE_LIMIT, DESCENDING, DOCUMENT_ID, DocumentExists, DocumentNotFound,
+    DocumentStore, Filter, Order, Subscription, cursor_values, normalize_orders
+)
+from app.storage.documents import (
+    apply_updates, check_batch, get_field, merge_document, new_document, normalize_value, project
+)
+from app.utils.firestore_ops import record_operation
+
+def _type_rank(value) -> int:
+    """Firestore's ordering of value types"""
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 6
+    return 7
+
+def compare_values(left, right) -> int:
+    """Compare two values the way Firestore orders them"""
+    left_rank, right_rank = _type_rank(left), _type_rank(right)
+    if left_rank != right_rank:
+        return -1 if left_rank < right_rank else 1
+    if left_rank in (0, 7):
+        return 0
+    if left_rank == 6:
+        for left_item, right_item in zip(left, right):
+            result = compare_values(left_item, right_item)
+            if result:
+                return result
+        return (len(left) > len(right)) - (len(left) < len(right))
+    return (left > right) - (left < right)
+
+def _matches(data: Dict[str, Any], field: str, op: str, value) -> bool:
+    found, current = get_field(data, field)
+    if not found:
+        return False
+    if op == '==':
+        return compare_values(current, value) == 0
+    if op == '!=':
+        return current is not None and compare_values(current, value) != 0
+    if op == 'in':
+        return any(compare_values(current, item) == 0 for item in value)
+    if op == 'array_contains':
+        return isinstance(current, list) and any(compare_values(item, value) == 0
+                                                 for item in current)
+    if _type_rank(current) != _type_rank(value):
+        return False
+    result = compare_values(current, value)
+    if op == '<':
+        return result < 0
+    if op == '<=':
+        return result <= 0
+    if op == '>':
+        return result > 0
+    if op == '>=':
+        return result >= 0
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+def _order_value(doc_id: str, data: Dict[str, Any], field: str):
+    return doc_id if field == DOCUMENT_ID else get_field(data, field)[1]
+
+class MemoryStore(DocumentStore):
+    """Document store held in this process's memory.
+
+    Meant for local runs and tests: data lasts as long as the process and
+    is not shared between workers. Listeners opened with ``watch`` are
+    called synchronously after each write.
+    """
+
+    def __init__(self):
+        self._collections = defaultdict(dict)
+        self._listeners = defaultdict(list)
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _operation(self, operation: str, kind: str):
+        """Account the enclosed call like the Firestore SDK call it stands for"""
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            record_operation(operation, kind, time.perf_counter() - started, failed)
+
+    def _write(self, collection: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        """Store or remove one document and return the change to announce"""
+        documents = self._collections[collection]
+        existed = doc_id in documents
+        if data is None:
+            if not existed:
+                return None
+            del documents[doc_id]
+            return 'REMOVED', doc_id, None
+        documents[doc_id] = data
+        return ('MODIFIED' if existed else 'ADDED'), doc_id, copy.deepcopy(data)
+
+    def _notify(self, collection: str, changes: List[Optional[tuple]]):
+        listeners = list(self._listeners.get(collection, ()))
+        for change in changes:
+            if change is None:
+                continue
+            for listener in listeners:
+                listener(*change)
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._operation('document.get', 'read'), self._lock:
+            data = self._collections[collection].get(doc_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def get_many(self, collection: str, doc_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        with self._operation('client.get_all', 'read'), self._lock:
+            documents = self._collections[collection]
+            return {doc_id: copy.deepcopy(documents[doc_id])
+                    for doc_id in doc_ids if doc_id in documents}
+
+    def create(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        with self._operation('document.create', 'write'), self._lock:
+            if doc_id in self._collections[collection]:
+                raise DocumentExists(f"{collection}/{doc_id} already exists")
+            change = self._write(collection, doc_id, new_document(data))
+        self._notify(collection, [change])
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        with self._operation('document.set', 'write'), self._lock:
+            change = self._write(collection, doc_id, self._merged(collection, doc_id, data, merge))
+        self._notify(collection, [change])
+
+    def _merged(self, collection: str, doc_id: str, data: Dict[str, Any],
+                merge: bool) -> Dict[str, Any]:
+        current = self._collections[collection].get(doc_id)
+        if merge and current is not None:
+            return merge_document(copy.deepcopy(current), data)
+        return new_document(data)
+
+    def update(self, collection: str, doc_id: str, updates: Dict[str, Any]):
+        with self._operation('document.update', 'write'), self._lock:
+            current = self._collections[collection].get(doc_id)
+            if current is None:
+                raise DocumentNotFound(f"{collection}/{doc_id} does not exist")
+            change = self._write(collection, doc_id, apply_updates(copy.deepcopy(current), updates))
+        self._notify(collection, [change])
+
+    def delete(self, collection: str, doc_id: str):
+        with self._operation('document.delete', 'write'), self._lock:
+            change = self._write(collection, doc_id, None)
+        self._notify(collection, [change])
+
+    def set_many(self, collection: str, docs: Iterable[Tuple[str, Dict[str, Any]]],
+                 merge: bool = False):
+        docs = check_batch(docs, BATCH_WRITE_LIMIT)
+        with self._operation('batch.commit', 'write'), self._lock:
+            changes = [self._write(collection, doc_id,
+                                   self._merged(collection, doc_id, data, merge))
+                       for doc_id, data in docs]
+        self._notify(collection, changes)
+
+    def query(self, collection: str, filters: Sequence[Filter] = (),
+              order_by: Sequence[Order] = (), limit: int = None,
+              start_after: Dict[str, Any] = None,
+              fields: Sequence[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._operation('query.stream', 'query'):
+            with self._lock:
+                docs = list(self._collections[collection].items())
+            results = self._run_query(docs, filters, order_by, limit, start_after, fields)
+        return iter(results)
+
+    def _run_query(self, docs, filters, order_by, limit, start_after, fields):
+        filters = [(field, op, normalize_value(value)) for field, op, value in filters]
+        docs = [(doc_id, data) for doc_id, data in docs
+                if all(_matches(data, field, op, value) for field, op, value in filters)]
+
+        orders = normalize_orders(order_by)
+        for field, _ in orders:
+            if field != DOCUMENT_ID:
+                docs = [(doc_id, data) for doc_id, data in docs if get_field(data, field)[0]]
+        if not any(field == DOCUMENT_ID for field, _ in orders):
+            # Ties are broken by document id, in the last ordering's direction
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else ASCENDING))
+
+        def compare_docs(left, right):
+            for field, direction in orders:
+                result = compare_values(_order_value(*left, field), _order_value(*right, field))
+                if result:
+                    return -result if direction == DESCENDING else result
+            return 0
+        docs.sort(key=functools.cmp_to_key(compare_docs))
+
+        if start_after is not None:
+            cursor = [normalize_value(value) for value in cursor_values(orders, start_after)]
+            docs = [(doc_id, data) for doc_id, data in docs
+                    if self._after_cursor(doc_id, data, orders, cursor)]
+        if limit is not None:
+            docs = docs[:limit]
+        return [(doc_id, project(data, fields)) for doc_id, data in docs]
+
+    @staticmethod
+    def _after_cursor(doc_id: str, data: Dict[str, Any], orders, cursor) -> bool:
+        for (field, direction), value in zip(orders, cursor):
+            result = compare_values(_order_value(doc_id, data, field), value)
+            if result:
+                return (result < 0) if direction == DESCENDING else (result > 0)
+        return False
+
+    def watch(self, collection: str,
+              callback: Callable[[str, str, Optional[Dict[str, Any]]], None]) -> Subscription:
+        with self._lock:
+            self._listeners[collection].append(callback)
+
+        def close():
+            with self._lock:
+                if callback in self._listeners[collection]:
+                    self._listeners[collection].remove(callback)
+        return Subscription(close)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+from app.storage.document_store import DOCUMENT_ID, DocumentStore
+
+def iter_time_range(store: DocumentStore, collection: str, field: str,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    page_size: int = 1000) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Stream ``(doc_id, data)`` for documents whose ``field`` lies in ``(since, until]``, oldest first.
+
+    Documents are fetched ``page_size`` at a time, resuming each page after
+    the last document of the previous one, so a long scan never holds more
+    than one page and never depends on a single long-lived stream.
+    """
+    filters = []
+    if since is not None:
+        filters.append((field, '>', since))
+    if until is not None:
+        filters.append((field, '<=', until))
+
+    cursor = None
+    while True:
+        docs = list(store.query(collection, filters=filters, order_by=[field, DOCUMENT_ID],
+                                start_after=cursor, limit=page_size))
+        yield from docs
+        if len(docs) < page_size:
+            return
+        doc_id, data = docs[-1]
+        cursor = {field: data[field], DOCUMENT_ID: doc_id}
@@ -0,0 +1,291 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from app.storage.document_store import (
+    ASCENDING, BATCH_WRITE_LIMIT, DESCENDING, DOCUMENT_ID, DocumentExists, DocumentNotFound,
+    DocumentStore, Filter, Order, cursor_values, normalize_orders
+)
+from app.storage.documents import (
+    apply_updates, check_batch, merge_document, new_document, normalize_value, project
+)
+from app.utils.firestore_ops import record_operation
+
+# Datetimes and bytes are stored as tagged strings. The datetime form is
+# fixed-width UTC, so SQLite's string ordering is chronological order.
+_DATETIME_TAG = '\x1edt:'
+_BYTES_TAG = '\x1eb64:'
+_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, doc_id)
+) WITHOUT ROWID
+"""
+
+_COMPARISONS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return _DATETIME_TAG + normalize_value(value).strftime(_DATETIME_FORMAT)
+    if isinstance(value, bytes):
+        return _BYTES_TAG + base64.b64encode(value).decode('ascii')
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+def _decode(value):
+    if isinstance(value, str):
+        if value.startswith(_DATETIME_TAG):
+            return datetime.strptime(value[len(_DATETIME_TAG):],
+                                     _DATETIME_FORMAT).replace(tzinfo=timezone.utc)
+        if value.startswith(_BYTES_TAG):
+            return base64.b64decode(value[len(_BYTES_TAG):])
+        return value
+    if isinstance(value, dict):
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(_encode(data), separators=(',', ':'))
+
+def _loads(text: str) -> Dict[str, Any]:
+    return _decode(json.loads(text))
+
+def _json_path(field: str) -> str:
+    return '$' + ''.join('."{}"'.format(key.replace('"', '\\"')) for key in field.split('.'))
+
+def _json_types(value) -> Tuple[str, ...]:
+    """``json_type`` results of values Firestore would compare with ``value``"""
+    if isinstance(value, bool):
+        return ('true', 'false')
+    if isinstance(value, (int, float)):
+        return ('integer', 'real')
+    if value is None:
+        return ('null',)
+    return ('text',)
+
+class SQLiteStore(DocumentStore):
+    """Document store in a single SQLite file.
+
+    Documents are kept as JSON in one table keyed by collection and id,
+    and queries filter and order on ``json_extract`` of their fields, so a
+    local run exercises the same access patterns as Firestore. Several
+    processes may share the file; there is no change feed, so watchers
+    poll.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use; call with the lock held.
+
+        A connection must not be used across fork, so a forked worker
+        opens its own.
+        """
+        if self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            if self.path != ':memory:':
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _operation(self, operation: str, kind: str):
+        """Account the enclosed call like the Firestore SDK call it stands for"""
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            record_operation(operation, kind, time.perf_counter() - started, failed)
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the write lock from the first read to the commit"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def _read(self, conn, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute('SELECT data FROM documents WHERE collection = ? AND doc_id = ?',
+                           (collection, doc_id)).fetchone()
+        return _loads(row[0]) if row else None
+
+    @staticmethod
+    def _put(conn, collection: str, doc_id: str, data: Dict[str, Any]):
+        conn.execute('INSERT OR REPLACE INTO documents (collection, doc_id, data) VALUES (?, ?, ?)',
+                     (collection, doc_id, _dumps(data)))
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._operation('document.get', 'read'), self._lock:
+            return self._read(self._connection(), collection, doc_id)
+
+    def get_many(self, collection: str, doc_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+        placeholders = ', '.join('?' * len(doc_ids))
+        with self._operation('client.get_all', 'read'), self._lock:
+            rows = self._connection().execute(
+                f'SELECT doc_id, data FROM documents WHERE collection = ? '
+                f'AND doc_id IN ({placeholders})', [collection] + doc_ids).fetchall()
+        return {doc_id: _loads(data) for doc_id, data in rows}
+
+    def create(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        with self._operation('document.create', 'write'), self._transaction() as conn:
+            try:
+                conn.execute('INSERT INTO documents (collection, doc_id, data) VALUES (?, ?, ?)',
+                             (collection, doc_id, _dumps(new_document(data))))
+            except sqlite3.IntegrityError as e:
+                raise DocumentExists(f"{collection}/{doc_id} already exists") from e
+
+    def _set(self, conn, collection: str, doc_id: str, data: Dict[str, Any], merge: bool):
+        current = self._read(conn, collection, doc_id) if merge else None
+        if current is not None:
+            data = merge_document(current, data)
+        else:
+            data = new_document(data)
+        self._put(conn, collection, doc_id, data)
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        with self._operation('document.set', 'write'), self._transaction() as conn:
+            self._set(conn, collection, doc_id, data, merge)
+
+    def update(self, collection: str, doc_id: str, updates: Dict[str, Any]):
+        with self._operation('document.update', 'write'), self._transaction() as conn:
+            current = self._read(conn, collection, doc_id)
+            if current is None:
+                raise DocumentNotFound(f"{collection}/{doc_id} does not exist")
+            self._put(conn, collection, doc_id, apply_updates(current, updates))
+
+    def delete(self, collection: str, doc_id: str):
+        with self._operation('document.delete', 'write'), self._transaction() as conn:
+            conn.execute('DELETE FROM documents WHERE collection = ? AND doc_id = ?',
+                         (collection, doc_id))
+
+    def set_many(self, collection: str, docs: Iterable[Tuple[str, Dict[str, Any]]],
+                 merge: bool = False):
+        docs = check_batch(docs, BATCH_WRITE_LIMIT)
+        with self._operation('batch.commit', 'write'), self._transaction() as conn:
+            for doc_id, data in docs:
+                self._set(conn, collection, doc_id, data, merge)
+
+    def query(self, collection: str, filters: Sequence[Filter] = (),
+              order_by: Sequence[Order] = (), limit: int = None,
+              start_after: Dict[str, Any] = None,
+              fields: Sequence[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        sql, params = self._build_query(collection, filters, order_by, limit, start_after)
+        with self._operation('query.stream', 'query'), self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        return ((doc_id, project(_loads(data), fields)) for doc_id, data in rows)
+
+    @staticmethod
+    def _build_query(collection: str, filters: Sequence[Filter], order_by: Sequence[Order],
+                     limit: Optional[int], start_after: Optional[Dict[str, Any]]):
+        conditions = ['collection = ?']
+        params: List[Any] = [collection]
+
+        for field, op, value in filters:
+            path = _json_path(field)
+            if op == 'in':
+                values = [_encode(item) for item in value]
+                if not values:
+                    conditions.append('0')
+                    continue
+                conditions.append(f"json_extract(data, ?) IN ({', '.join('?' * len(values))})")
+                params += [path] + values
+            elif op == 'array_contains':
+                conditions.append('EXISTS (SELECT 1 FROM json_each(data, ?) WHERE value = ?)')
+                params += [path, _encode(value)]
+            elif op in _COMPARISONS:
+                types = _json_types(value)
+                if op == '!=':
+                    # Firestore's != skips documents where the field is null or missing
+                    conditions.append(f"json_type(data, ?) IS NOT NULL AND json_type(data, ?) != 'null' "
+                                      f"AND (json_type(data, ?) NOT IN ({', '.join('?' * len(types))}) "
+                                      f"OR json_extract(data, ?) != ?)")
+                    params += [path, path, path] + list(types) + [path, _encode(value)]
+                elif value is None:
+                    conditions.append("json_type(data, ?) = 'null'" if op == '==' else '0')
+                    params.append(path)
+                else:
+                    conditions.append(f"json_type(data, ?) IN ({', '.join('?' * len(types))}) "
+                                      f"AND json_extract(data, ?) {_COMPARISONS[op]} ?")
+                    params += [path] + list(types) + [path, _encode(value)]
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+
+        orders = normalize_orders(order_by)
+        for field, _ in orders:
+            if field != DOCUMENT_ID:
+                # Ordering by a field drops documents that do not have it
+                conditions.append('json_type(data, ?) IS NOT NULL')
+                params.append(_json_path(field))
+        if not any(field == DOCUMENT_ID for field, _ in orders):
+            # Ties are broken by document id, in the last ordering's direction
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else ASCENDING))
+
+        def column(field):
+            if field == DOCUMENT_ID:
+                return 'doc_id', []
+            return 'json_extract(data, ?)', [_json_path(field)]
+
+        if start_after is not None:
+            alternatives = []
+            for index, value in enumerate(cursor_values(orders, start_after)):
+                terms = []
+                for field, _ in orders[:index]:
+                    expression, expression_params = column(field)
+                    terms.append(f'{expression} IS ?')
+                    params += expression_params + [_encode(start_after[field])]
+                field, direction = orders[index]
+                expression, expression_params = column(field)
+                terms.append(f"{expression} {'<' if direction == DESCENDING else '>'} ?")
+                params += expression_params + [_encode(value)]
+                alternatives.append('(' + ' AND '.join(terms) + ')')
+            conditions.append('(' + ' OR '.join(alternatives) + ')')
+
+        order_terms = []
+        for field, direction in orders:
+            expression, expression_params = column(field)
+            order_terms.append(f"{expression} {'DESC' if direction == DESCENDING else 'ASC'}")
+            params += expression_params
+
+        sql = (f"SELECT doc_id, data FROM documents WHERE {' AND '.join(conditions)} "
+               f"ORDER BY {', '.join(order_terms)}")
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return sql, params
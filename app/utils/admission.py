@@ -0,0 +1,202 @@
+import contextvars
+import functools
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from flask import current_app, jsonify
+from app.config import Config
+from app.utils.metrics import add_dependency_listener, record_admission, set_admission_limit
+
+# Factor applied to the limit when a request takes longer than the target
+BACKOFF = 0.75
+
+# Weight of the newest latency in the running average behind Retry-After
+LATENCY_SMOOTHING = 0.2
+
+# Longest Retry-After, in seconds, a rejected client is told to wait
+MAX_RETRY_AFTER = 60
+
+# (dependency, seconds) of the timed calls made by the admitted request
+_dependency_calls: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar('admission_dependency_calls', default=None)
+
+def _record_dependency_call(dependency: str, operation: str, seconds: float, failed: bool):
+    calls = _dependency_calls.get()
+    if calls is not None:
+        calls.append((dependency, seconds))
+
+add_dependency_listener(_record_dependency_call)
+
+class AdaptiveConcurrencyLimiter:
+    """Caps concurrent requests of one route class in this worker.
+
+    Up to ``limit`` requests run at once. Further requests wait, at most
+    ``max_queue`` of them and each for at most ``queue_timeout`` seconds,
+    and are rejected beyond that. With a ``target_latency`` the limit
+    adapts AIMD-style to the time a request spent in calls to
+    ``dependencies``, as timed by ``time_dependency``: within the target
+    it rises by ``1 / limit`` (about one per round of requests), slower
+    it is cut by ``BACKOFF``, at most once per target interval, down to
+    ``min_limit``. Requests that made no such call leave the limit
+    alone. When the provider slows down, fewer of its requests are let
+    in and the rest of the worker stays responsive.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float,
+                 min_limit: int = 1, max_limit: int = None, target_latency: float = None,
+                 dependencies: Sequence[str] = ()):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.dependencies = frozenset(dependencies)
+        self.in_flight = 0
+        self.waiting = 0
+        self.average_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        set_admission_limit(name, int(self.limit))
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def acquire(self) -> Tuple[bool, Optional[int]]:
+        """Wait for a slot; returns whether admitted and, if not, a Retry-After"""
+        started = time.monotonic()
+        with self._condition:
+            if self._has_capacity() and not self.waiting:
+                self.in_flight += 1
+                admitted, outcome = True, 'admitted'
+            elif self.waiting >= self.max_queue:
+                admitted, outcome = False, 'queue_full'
+            else:
+                admitted, outcome = self._wait(started + self.queue_timeout)
+            retry_after = None if admitted else self._retry_after()
+        record_admission(self.name, time.monotonic() - started, outcome)
+        return admitted, retry_after
+
+    def _wait(self, deadline: float) -> Tuple[bool, str]:
+        self.waiting += 1
+        try:
+            while not self._has_capacity():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, 'timeout'
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True, 'admitted'
+        finally:
+            self.waiting -= 1
+
+    def release(self, latency: float, dependency_calls: Sequence[Tuple[str, float]] = ()):
+        """Free a slot, adapting the limit to the request's dependency calls.
+
+        ``latency`` is the whole request, which paces Retry-After;
+        ``dependency_calls`` are the ``(dependency, seconds)`` it made.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if self.average_latency is None:
+                self.average_latency = latency
+            else:
+                self.average_latency += LATENCY_SMOOTHING * (latency - self.average_latency)
+            waited = [seconds for dependency, seconds in dependency_calls
+                      if dependency in self.dependencies]
+            if waited:
+                self._adapt(sum(waited))
+            free = int(self.limit) - self.in_flight
+            if free > 0:
+                self._condition.notify(free)
+
+    def _adapt(self, latency: float):
+        if self.target_latency is None:
+            return
+
+        previous = int(self.limit)
+        if latency > self.target_latency:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(float(self.min_limit), self.limit * BACKOFF)
+                self._last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        if int(self.limit) != previous:
+            set_admission_limit(self.name, int(self.limit))
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue ahead of a new request should have drained"""
+        latency = self.average_latency or self.queue_timeout
+        rounds = (self.waiting + 1) / max(1, int(self.limit))
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(latency * rounds)))
+
+def _route_classes() -> Dict[str, dict]:
+    """Settings of each route class, from Config"""
+    return {
+        # Routes that wait on a model provider; the limit follows the
+        # latency of OpenAI and Gemini calls made in the request. Chat turns
+        # published to the LLM backend make none, so for them the limit
+        # only caps concurrent publishes
+        'provider': {
+            'limit': Config.ADMISSION_PROVIDER_LIMIT,
+            'max_limit': Config.ADMISSION_PROVIDER_MAX_LIMIT,
+            'max_queue': Config.ADMISSION_PROVIDER_QUEUE,
+            'queue_timeout': Config.ADMISSION_QUEUE_TIMEOUT,
+            'target_latency': Config.ADMISSION_TARGET_LATENCY,
+            'dependencies': ('openai', 'gemini'),
+        },
+        # CPU- and Firestore-heavy batch work such as imports and analysis
+        'batch': {
+            'limit': Config.ADMISSION_BATCH_LIMIT,
+            'max_queue': Config.ADMISSION_BATCH_QUEUE,
+            'queue_timeout': Config.ADMISSION_QUEUE_TIMEOUT,
+        },
+    }
+
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(route_class: str) -> AdaptiveConcurrencyLimiter:
+    """Return this worker's limiter for a route class"""
+    limiter = _limiters.get(route_class)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(route_class)
+            if limiter is None:
+                limiter = _limiters[route_class] = AdaptiveConcurrencyLimiter(
+                    route_class, **_route_classes()[route_class])
+    return limiter
+
+def admission_controlled(route_class: str):
+    """Admit a view's requests through the route class's limiter.
+
+    Requests that cannot be admitted get a 503 with Retry-After right
+    away instead of holding a worker until they time out.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('ADMISSION_ENABLED'):
+                return view(*args, **kwargs)
+            limiter = get_limiter(route_class)
+            admitted, retry_after = limiter.acquire()
+            if not admitted:
+                response = jsonify({
+                    'error': 'Server is busy, please retry later',
+                    'retry_after': retry_after
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 503
+            calls = []
+            token = _dependency_calls.set(calls)
+            started = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                _dependency_calls.reset(token)
+                limiter.release(time.monotonic() - started, calls)
+        return wrapper
+    return decorator
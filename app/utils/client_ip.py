@@ -0,0 +1,17 @@
+from typing import Optional
+from flask import request
+from app.config import Config
+
+def get_client_ip() -> Optional[str]:
+    """The calling client's IP address behind ``TRUSTED_PROXY_COUNT`` proxies.
+
+    Uses the X-Forwarded-For entry appended by the outermost trusted proxy,
+    since entries to its left are supplied by the client. Falls back to the
+    connection's address when no trusted proxy is configured.
+    """
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if forwarded_for and Config.TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if hops:
+            return hops[-min(Config.TRUSTED_PROXY_COUNT, len(hops))]
+    return request.remote_addr
@@ -0,0 +1,37 @@
+import os
+import threading
+from typing import Any, Callable, Dict
+from google.cloud import firestore, pubsub_v1
+
+# Google Cloud clients, one per process. A gRPC channel opened before
+# fork is unusable in the child, so clients are created on first use and
+# the cache is emptied in every forked child. With a preloaded gunicorn
+# app this makes each worker build its own clients after fork, while the
+# SDK modules themselves stay shared with the master.
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+def _get_client(name: str, factory: Callable[[], Any]):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+def get_firestore_client() -> firestore.Client:
+    """Return this process's Firestore client"""
+    return _get_client('firestore', lambda: firestore.Client())
+
+def get_publisher_client() -> pubsub_v1.PublisherClient:
+    """Return this process's Pub/Sub publisher"""
+    return _get_client('pubsub_publisher', lambda: pubsub_v1.PublisherClient())
+
+def reset_clients():
+    """Forget clients inherited from the parent process"""
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=reset_clients)
@@ -0,0 +1,97 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class CollectionWatcher:
+    """Keeps an in-memory view of a stored collection current.
+
+    The collection is loaded once when the watcher starts and then kept
+    up to date by the store's change listener. If the listener cannot be
+    opened (the store has no change feed) or dies, a background thread
+    falls back to reloading the whole collection every
+    ``refresh_interval`` seconds and retries the listener.
+    """
+
+    def __init__(self, store, collection: str,
+                 on_reset: Callable[[Iterable[Tuple[str, Dict[str, Any]]]], None],
+                 on_change: Callable[[str, str, Optional[Dict[str, Any]]], None],
+                 refresh_interval: int = 300):
+        self.store = store
+        self.collection = collection
+        self.on_reset = on_reset
+        self.on_change = on_change
+        self.refresh_interval = refresh_interval
+        self.ready = False
+        self._watch = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Load the collection and begin listening for changes (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self.reload()
+            self._subscribe()
+            self._thread = threading.Thread(
+                target=self._refresh_loop,
+                name=f"watch-{self.collection}",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the listener and the refresh thread"""
+        self._stop_event.set()
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception as e:
+                logger.error("Error closing %s listener: %s", self.collection, e)
+            self._watch = None
+        self._thread = None
+
+    def reload(self) -> bool:
+        """Reload the full collection into the in-memory view"""
+        try:
+            self.on_reset(self.store.stream(self.collection))
+            self.ready = True
+            return True
+        except Exception as e:
+            logger.error("Error loading %s: %s", self.collection, e)
+            return False
+
+    @property
+    def listening(self) -> bool:
+        """Whether the change listener is currently active"""
+        return self._watch is not None and getattr(self._watch, 'is_active', False)
+
+    def _subscribe(self):
+        """Open the change listener, leaving polling as the fallback"""
+        try:
+            self._watch = self.store.watch(self.collection, self._on_change)
+        except NotImplementedError:
+            self._watch = None
+        except Exception as e:
+            logger.warning("Error listening to %s, falling back to polling: %s", self.collection, e)
+            self._watch = None
+
+    def _on_change(self, change_type: str, doc_id: str, data: Optional[Dict[str, Any]]):
+        """Apply a document change delivered by the change listener"""
+        try:
+            self.on_change(change_type, doc_id, data)
+        except Exception as e:
+            logger.error("Error applying %s change for %s: %s", self.collection, doc_id, e)
+        self.ready = True
+
+    def _refresh_loop(self):
+        """Poll the collection while the change listener is unavailable"""
+        while not self._stop_event.wait(self.refresh_interval):
+            if self.listening:
+                continue
+            if self.reload():
+                self._subscribe()
@@ -0,0 +1,46 @@
+import hashlib
+from datetime import datetime, timezone
+from flask import Response, request
+from werkzeug.http import quote_etag
+
+def _tag_part(value):
+    """Stable text for one ETag component; naive datetimes are UTC"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return repr(value.timestamp())
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_tag_part(item) for item in value) + ']'
+    return repr(value)
+
+def make_etag(*parts) -> str:
+    """Opaque tag that changes whenever any of ``parts`` does.
+
+    Datetimes are compared as instants, so a value written as a naive
+    ``utcnow()`` tags the same as the aware UTC value read back from the
+    store.
+    """
+    text = _tag_part(parts)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def format_etag(etag: str) -> str:
+    """``etag`` as sent in the ETag header and expected in If-None-Match"""
+    return quote_etag(etag, weak=True)
+
+def is_not_modified(etag: str) -> bool:
+    """Whether the request's If-None-Match already names ``etag``"""
+    return request.if_none_match.contains_weak(etag)
+
+def tag_response(response: Response, etag: str) -> Response:
+    """Attach ``etag`` and ask clients to revalidate before reusing the response.
+
+    Tags are weak because compression changes the bytes but not the
+    content they identify.
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified_response(etag: str) -> Response:
+    """Empty 304 for a client that already holds the current representation"""
+    return tag_response(Response(status=304), etag)
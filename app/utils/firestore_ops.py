@@ -0,0 +1,225 @@
+import contextvars
+import functools
+import importlib
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from flask import Flask, g
+
+# Firestore SDK methods wrapped by instrument_firestore, per class, with
+# the kind of operation each one is accounted as
+FIRESTORE_OPERATIONS = {
+    'document.DocumentReference': {'get': 'read', 'set': 'write', 'update': 'write',
+                                   'delete': 'write', 'create': 'write'},
+    'collection.CollectionReference': {'add': 'write'},
+    'query.Query': {'get': 'query', 'stream': 'query'},
+    'batch.WriteBatch': {'commit': 'write'},
+    'client.Client': {'get_all': 'read'},
+    'transaction.Transaction': {'get': 'read', 'get_all': 'read'},
+}
+
+class OperationCounts:
+    """Firestore operations made within one request or ``count_operations`` block.
+
+    Operations are also added to ``parent``, the enclosing counter, so a
+    block around a test request sees the request's operations.
+    """
+
+    def __init__(self, parent: 'OperationCounts' = None):
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.operations = {}
+        self.parent = parent
+
+    @property
+    def total(self) -> int:
+        return self.reads + self.writes + self.queries
+
+    def add(self, operation: str, kind: str):
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+        if kind == 'read':
+            self.reads += 1
+        elif kind == 'write':
+            self.writes += 1
+        else:
+            self.queries += 1
+        if self.parent is not None:
+            self.parent.add(operation, kind)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'reads': self.reads, 'writes': self.writes, 'queries': self.queries,
+                'total': self.total}
+
+class OperationBudgetExceeded(AssertionError):
+    """Raised when a block makes more Firestore operations than its budget"""
+
+_current_counts = contextvars.ContextVar('firestore_operation_counts', default=None)
+
+# Set while a wrapped call runs, so the SDK's internal calls are not counted again
+_in_operation = contextvars.ContextVar('firestore_in_operation', default=False)
+
+_listeners: List[Callable[[str, float, bool], None]] = []
+
+def add_listener(listener: Callable[[str, float, bool], None]):
+    """Call ``listener(operation, seconds, failed)`` after every Firestore operation"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def record_operation(operation: str, kind: str, seconds: float = 0.0, failed: bool = False):
+    """Account one Firestore operation.
+
+    Called by the SDK wrappers, and by stand-in stores that do not go
+    through the SDK.
+    """
+    counts = _current_counts.get()
+    if counts is not None:
+        counts.add(operation, kind)
+    for listener in _listeners:
+        listener(operation, seconds, failed)
+
+@contextmanager
+def count_operations():
+    """Count the Firestore operations made in the enclosed block"""
+    counts = OperationCounts(_current_counts.get())
+    token = _current_counts.set(counts)
+    try:
+        yield counts
+    finally:
+        _current_counts.reset(token)
+
+def assert_operation_budget(counts: OperationCounts, reads: Optional[int] = None,
+                            writes: Optional[int] = None, queries: Optional[int] = None,
+                            total: Optional[int] = None, label: str = 'block'):
+    """Raise OperationBudgetExceeded if ``counts`` exceeds any given limit"""
+    limits = {'reads': reads, 'writes': writes, 'queries': queries, 'total': total}
+    used = counts.to_dict()
+    exceeded = [f"{name} {used[name]} > {limit}" for name, limit in limits.items()
+                if limit is not None and used[name] > limit]
+    if exceeded:
+        raise OperationBudgetExceeded(
+            f"{label} exceeded its Firestore budget: {', '.join(exceeded)} "
+            f"({counts.operations})")
+
+@contextmanager
+def operation_budget(reads: Optional[int] = None, writes: Optional[int] = None,
+                     queries: Optional[int] = None, total: Optional[int] = None,
+                     label: str = 'block'):
+    """Fail if the enclosed block makes more Firestore operations than allowed.
+
+    For example, in a test::
+
+        with operation_budget(reads=1, writes=1, label='POST /api/greenlist/add'):
+            client.post('/api/greenlist/add', ...)
+    """
+    with count_operations() as counts:
+        yield counts
+    assert_operation_budget(counts, reads, writes, queries, total, label)
+
+def _wrap_call(method, operation: str, kind: str):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _in_operation.get():
+            return method(*args, **kwargs)
+        token = _in_operation.set(True)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _in_operation.reset(token)
+            record_operation(operation, kind, time.perf_counter() - started, failed)
+    return wrapper
+
+def _wrap_stream(method, operation: str, kind: str):
+    """Account a streaming read once, when the caller has consumed it"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _in_operation.get():
+            return method(*args, **kwargs)
+        return _stream(method, operation, kind, args, kwargs)
+    return wrapper
+
+def _stream(method, operation: str, kind: str, args, kwargs):
+    started = time.perf_counter()
+    failed = False
+    try:
+        iterator = iter(method(*args, **kwargs))
+        while True:
+            # Only the SDK's own work is guarded; the caller's loop body may
+            # make operations of its own
+            token = _in_operation.set(True)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _in_operation.reset(token)
+            yield item
+    except Exception:
+        failed = True
+        raise
+    finally:
+        record_operation(operation, kind, time.perf_counter() - started, failed)
+
+_instrumented = False
+
+def instrument_firestore():
+    """Wrap the Firestore SDK so every read, write and query is accounted.
+
+    Wraps the SDK's document, query, batch and client methods once per
+    process, so every ``firestore.Client()`` is covered. Calls the SDK
+    makes internally, such as ``set`` committing a batch, are counted
+    once under the outermost operation.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    for path, methods in FIRESTORE_OPERATIONS.items():
+        module_name, class_name = path.split('.')
+        cls = getattr(importlib.import_module(f"google.cloud.firestore_v1.{module_name}"), class_name)
+        for name, kind in methods.items():
+            operation = f"{class_name.replace('Reference', '').lower()}.{name}"
+            wrap = _wrap_stream if name == 'stream' else _wrap_call
+            setattr(cls, name, wrap(cls.__dict__.get(name) or getattr(cls, name), operation, kind))
+    _instrumented = True
+
+def _start_request():
+    g.firestore_counts = OperationCounts(_current_counts.get())
+    g.firestore_counts_token = _current_counts.set(g.firestore_counts)
+
+def _add_headers(response):
+    counts = g.get('firestore_counts')
+    if counts is not None:
+        response.headers['X-Firestore-Reads'] = str(counts.reads)
+        response.headers['X-Firestore-Writes'] = str(counts.writes)
+        response.headers['X-Firestore-Queries'] = str(counts.queries)
+    return response
+
+def _end_request(exc=None):
+    token = g.pop('firestore_counts_token', None)
+    if token is not None:
+        try:
+            _current_counts.reset(token)
+        except ValueError:
+            # Reset from a different context than the request's own
+            _current_counts.set(None)
+
+def current_operation_counts() -> Optional[OperationCounts]:
+    """Firestore operations made so far in the current request, if accounted"""
+    return _current_counts.get()
+
+def init_operation_accounting(app: Flask, headers: bool = False):
+    """Count each request's Firestore operations.
+
+    With ``headers``, responses carry ``X-Firestore-Reads``,
+    ``X-Firestore-Writes`` and ``X-Firestore-Queries``.
+    """
+    instrument_firestore()
+    app.before_request(_start_request)
+    if headers:
+        app.after_request(_add_headers)
+    app.teardown_request(_end_request)
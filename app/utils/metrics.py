@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List
+from flask import Flask, Response, g, request
+from app.utils.firestore_ops import add_listener, instrument_firestore
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # Metrics are skipped when prometheus_client is not installed
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache-speed Firestore reads to slow model calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class _Metrics:
+    """The metric families, created once per process"""
+
+    def __init__(self):
+        self.request_latency = prometheus_client.Histogram(
+            'http_request_duration_seconds', 'Request latency by route',
+            ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+        self.request_errors = prometheus_client.Counter(
+            'http_request_errors_total', 'Requests answered with a 5xx status',
+            ['method', 'route'])
+        self.requests_in_flight = prometheus_client.Gauge(
+            'http_requests_in_flight', 'Requests being handled',
+            multiprocess_mode='livesum')
+        self.dependency_latency = prometheus_client.Histogram(
+            'dependency_duration_seconds', 'Latency of calls to external services',
+            ['dependency', 'operation'], buckets=LATENCY_BUCKETS)
+        self.dependency_errors = prometheus_client.Counter(
+            'dependency_errors_total', 'Calls to external services that raised',
+            ['dependency', 'operation'])
+        self.cache_lookups = prometheus_client.Counter(
+            'cache_lookups_total', 'In-memory cache lookups by result',
+            ['cache', 'result'])
+        self.admission_queue_time = prometheus_client.Histogram(
+            'admission_queue_seconds', 'Time requests waited for admission, by outcome',
+            ['route_class', 'outcome'], buckets=LATENCY_BUCKETS)
+        self.admission_rejections = prometheus_client.Counter(
+            'admission_rejected_total', 'Requests shed with a 503, by reason',
+            ['route_class', 'reason'])
+        self.admission_limit = prometheus_client.Gauge(
+            'admission_concurrency_limit', 'Concurrency limit of each route class, summed over workers',
+            ['route_class'], multiprocess_mode='livesum')
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+_dependency_listeners: List[Callable[[str, str, float, bool], None]] = []
+
+def get_metrics():
+    """Return this process's metric families, or None when metrics are off"""
+    global _metrics
+    if _metrics is None and prometheus_client is not None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = _Metrics()
+    return _metrics
+
+def add_dependency_listener(listener: Callable[[str, str, float, bool], None]):
+    """Call ``listener(dependency, operation, seconds, failed)`` after every timed call"""
+    if listener not in _dependency_listeners:
+        _dependency_listeners.append(listener)
+
+def observe_dependency(dependency: str, operation: str, seconds: float, failed: bool = False):
+    """Record one call to an external service"""
+    for listener in _dependency_listeners:
+        listener(dependency, operation, seconds, failed)
+    metrics = get_metrics()
+    if metrics is None:
+        return
+    metrics.dependency_latency.labels(dependency, operation).observe(seconds)
+    if failed:
+        metrics.dependency_errors.labels(dependency, operation).inc()
+
+@contextmanager
+def time_dependency(dependency: str, operation: str):
+    """Time the enclosed call to an external service"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe_dependency(dependency, operation, time.perf_counter() - started, failed=True)
+        raise
+    observe_dependency(dependency, operation, time.perf_counter() - started)
+
+def record_cache(cache: str, hit: bool):
+    """Count a lookup in one of the in-memory caches"""
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.cache_lookups.labels(cache, 'hit' if hit else 'miss').inc()
+
+def record_admission(route_class: str, seconds: float, outcome: str):
+    """Record the wait of one request at admission control"""
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.admission_queue_time.labels(route_class, outcome).observe(seconds)
+        if outcome != 'admitted':
+            metrics.admission_rejections.labels(route_class, outcome).inc()
+
+def set_admission_limit(route_class: str, limit: int):
+    """Publish a route class's current concurrency limit"""
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.admission_limit.labels(route_class).set(limit)
+
+def _observe_firestore(operation: str, seconds: float, failed: bool):
+    observe_dependency('firestore', operation, seconds, failed)
+
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_in_flight = True
+    get_metrics().requests_in_flight.inc()
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics = get_metrics()
+        route = _route_label()
+        metrics.request_latency.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - started)
+        if response.status_code >= 500:
+            metrics.request_errors.labels(request.method, route).inc()
+    return response
+
+def _end_request(exc=None):
+    if g.pop('metrics_in_flight', False):
+        get_metrics().requests_in_flight.dec()
+
+def metrics_view():
+    """Prometheus exposition of every worker's metrics"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry),
+                    mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+def init_metrics(app: Flask):
+    """Record request and dependency metrics and serve them at ``/metrics``.
+
+    Under gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` (gunicorn.conf.py does)
+    so every worker's samples are aggregated.
+    """
+    if prometheus_client is None:
+        logger.warning("prometheus_client is not installed; metrics are disabled")
+        return
+    get_metrics()
+    instrument_firestore()
+    add_listener(_observe_firestore)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
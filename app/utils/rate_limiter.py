@@ -0,0 +1,45 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+class TokenBucketRateLimiter:
+    """In-memory token bucket rate limiter keyed by client.
+
+    Each key gets a bucket of ``burst`` tokens refilled at ``rate`` tokens
+    per second. Buckets are refilled lazily when consumed, and the least
+    recently used keys are evicted once ``max_keys`` buckets exist, so the
+    limiter's memory stays bounded.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, tokens: float = 1.0) -> Tuple[bool, float]:
+        """Take tokens from a key's bucket.
+
+        Returns whether the request is allowed and, if not, how many
+        seconds until enough tokens will be available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                available = self.burst
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                available = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                self._buckets.move_to_end(key)
+
+            if available >= tokens:
+                self._buckets[key] = [available - tokens, now]
+                return True, 0.0
+
+            self._buckets[key] = [available, now]
+            retry_after = (tokens - available) / self.rate if self.rate > 0 else float('inf')
+            return False, retry_after
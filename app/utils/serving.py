@@ -0,0 +1,40 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def serving_mode() -> str:
+    """Gunicorn serving mode the process runs under ('sync', 'gthread' or 'gevent')"""
+    return os.environ.get('SERVING_MODE', 'gevent').lower()
+
+def patch_standard_library() -> bool:
+    """Monkey patch the standard library for gevent.
+
+    Must run before the app is imported, so that modules binding socket,
+    ssl or threading names at import time get the cooperative versions.
+    Returns False when gevent is not installed.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        logger.warning("gevent is not installed; serving without cooperative I/O")
+        return False
+
+    monkey.patch_all()
+    return True
+
+def enable_cooperative_io() -> bool:
+    """Monkey patch the standard library and switch gRPC to gevent.
+
+    Must run before any Firestore, Pub/Sub or Gemini client is created.
+    Returns False when gevent is not installed.
+    """
+    if not patch_standard_library():
+        return False
+
+    try:
+        import grpc.experimental.gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except Exception as e:
+        logger.error("Error switching gRPC to gevent: %s", e)
+    return True
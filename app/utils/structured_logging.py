@@ -0,0 +1,251 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from flask import Flask, g, request
+
+# Request id of the request being handled, attached to every record
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+# Incoming request ids are echoed back only if they look like ids
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# LogRecord attributes that are not structured fields of the message
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'request_id', 'sample_rate'
+}
+
+def current_request_id() -> Optional[str]:
+    """Id of the request being handled, if any"""
+    return _request_id.get()
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse ``name=value,name=value`` as used by LOG_LEVELS and LOG_SAMPLE_RATES"""
+    parsed = {}
+    for item in spec.split(','):
+        name, separator, value = item.partition('=')
+        if separator and name.strip() and value.strip():
+            parsed[name.strip()] = value.strip()
+    return parsed
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the fields Cloud Logging recognises.
+
+    Values passed in ``extra`` become fields of their own.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'severity': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if getattr(record, 'sample_rate', None) is not None:
+            entry['sample_rate'] = record.sample_rate
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Plain lines for local runs, ending with the request id when there is one"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message = super().formatMessage(record)
+        request_id = getattr(record, 'request_id', None)
+        return f"{message} [request {request_id}]" if request_id else message
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the id of the request that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the INFO and DEBUG records of noisy loggers.
+
+    ``rates`` maps logger names to the fraction kept; a name also covers
+    its child loggers. Warnings and errors are always kept. Kept records
+    carry their ``sample_rate`` so counts can be scaled back up.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> Optional[float]:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or rate >= 1:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+class BackgroundQueueHandler(QueueHandler):
+    """Hand records to a writer thread instead of writing them inline.
+
+    The calling thread only renders the message and puts it on a bounded
+    queue; formatting and the write to the stream happen on the writer.
+    When the queue is full, records are dropped rather than blocking the
+    request, and the number dropped is logged once there is room again.
+    Each process starts its own writer on first use, so workers forked
+    from a preloaded master do not depend on the master's thread.
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int = 10000):
+        super().__init__(None)
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._forget_writer)
+        atexit.register(self.stop)
+
+    def _forget_writer(self):
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_writer(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue(self.maxsize)
+                self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self.listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now, while the arguments and
+        # frames are still what they were when the record was made
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        self._ensure_writer()
+        try:
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                notice = logging.LogRecord(__name__, logging.WARNING, __file__, 0,
+                                           'Dropped %d log records; the log queue was full',
+                                           (dropped,), None)
+                self.queue.put_nowait(self.prepare(notice))
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out queued records and stop this process's writer"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+_handler: Optional[BackgroundQueueHandler] = None
+
+def configure_logging(level: str = 'INFO', levels: str = '', sample_rates: str = '',
+                      log_format: str = 'json', queue_size: int = 10000):
+    """Route every logger through one background writer to stdout.
+
+    ``levels`` and ``sample_rates`` are ``logger=value`` lists, for
+    example ``app.models.greenlist=DEBUG`` or
+    ``app.services.llm_integration_service=0.01``. Safe to call again;
+    later calls replace the earlier settings.
+    """
+    global _handler
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if log_format == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(TextFormatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _handler.stop()
+    _handler = BackgroundQueueHandler(stream_handler, queue_size)
+    _handler.addFilter(RequestContextFilter())
+    rates = {name: float(rate) for name, rate in parse_levels(sample_rates).items()}
+    if rates:
+        _handler.addFilter(SamplingFilter(rates))
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level.upper())
+
+def _start_request():
+    incoming = request.headers.get('X-Request-ID', '')
+    if not _REQUEST_ID_PATTERN.match(incoming):
+        # Cloud Run's trace id ties the logs to the request's trace
+        incoming = request.headers.get('X-Cloud-Trace-Context', '').split('/')[0]
+    request_id = incoming if _REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+    g.request_id = request_id
+    g.request_id_token = _request_id.set(request_id)
+
+def _add_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+def _end_request(exc=None):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        try:
+            _request_id.reset(token)
+        except ValueError:
+            # Reset from a different context than the request's own
+            _request_id.set(None)
+
+def init_logging(app: Flask):
+    """Configure structured logging and tag each request with an id.
+
+    The id comes from ``X-Request-ID`` or Cloud Run's trace header, or
+    is generated, and is returned in ``X-Request-ID``.
+    """
+    configure_logging(app.config.get('LOG_LEVEL', 'INFO'),
+                      app.config.get('LOG_LEVELS', ''),
+                      app.config.get('LOG_SAMPLE_RATES', ''),
+                      app.config.get('LOG_FORMAT', 'json'),
+                      app.config.get('LOG_QUEUE_SIZE', 10000))
+    app.before_request(_start_request)
+    app.after_request(_add_header)
+    app.teardown_request(_end_request)
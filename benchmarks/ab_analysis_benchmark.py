@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the A/B analysis engine on synthetic experiments
+
+Usage:
+    python -m benchmarks.ab_analysis_benchmark
+    python -m benchmarks.ab_analysis_benchmark --events 1000000 5000000 --users 200000
+
+Generates experiments with the given number of events, then times the
+columnar analysis (analyze_events) and, on a sample, the conversion of
+Firestore-style event dicts into columns (ExperimentEvents.from_records).
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+from app.services.ab_analysis_service import ExperimentEvents, analyze_events
+
+EVENT_TYPES = ['message_sent', 'message_error', 'feedback']
+
+def synthetic_events(num_events: int, num_users: int, seed: int = 7) -> ExperimentEvents:
+    """Build a two-variant experiment where 'google' is slightly slower"""
+    rng = np.random.default_rng(seed)
+    user_codes = rng.integers(0, num_users, num_events)
+    # Users stay in one variant, as hashed assignment guarantees
+    variant_codes = (user_codes % 2).astype(np.int32)
+    event_type_codes = rng.choice(len(EVENT_TYPES), num_events, p=[0.9, 0.02, 0.08]).astype(np.int32)
+    latency_ms = rng.lognormal(mean=6.5 + 0.05 * variant_codes, sigma=0.4)
+    response_length = rng.gamma(shape=2.0, scale=300.0, size=num_events)
+    # Only successful turns carry latency and length
+    not_sent = event_type_codes != 0
+    latency_ms[not_sent] = np.nan
+    response_length[not_sent] = np.nan
+    timestamps = np.sort(rng.uniform(0, 14 * 86400, num_events)) + 1.7e9
+    return ExperimentEvents(
+        variant_codes=variant_codes,
+        user_codes=user_codes.astype(np.int64),
+        event_type_codes=event_type_codes,
+        latency_ms=latency_ms,
+        response_length=response_length,
+        timestamps=timestamps,
+        variants=['openai', 'google'],
+        event_types=list(EVENT_TYPES)
+    )
+
+def synthetic_records(num_events: int, num_users: int):
+    """Yield event dicts shaped like ab_events documents"""
+    rng = np.random.default_rng(11)
+    start = datetime(2026, 1, 1)
+    for i in range(num_events):
+        user = int(rng.integers(0, num_users))
+        yield {
+            'user_id': f"user-{user}",
+            'variant': 'openai' if user % 2 else 'google',
+            'event_type': 'message_sent',
+            'timestamp': start + timedelta(seconds=i),
+            'event_data': {'latency_ms': float(rng.lognormal(6.5, 0.4)), 'response_length': 600}
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark A/B analysis")
+    parser.add_argument('--events', type=int, nargs='+', default=[100000, 1000000, 5000000])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--record-sample', type=int, default=200000,
+                        help="Events converted from dicts to measure column building")
+    args = parser.parse_args()
+
+    print(f"{'events':>12} {'analyze (s)':>12} {'events/s':>14}")
+    for num_events in args.events:
+        events = synthetic_events(num_events, args.users)
+        started = time.perf_counter()
+        results = analyze_events(events, control='openai')
+        elapsed = time.perf_counter() - started
+        print(f"{num_events:>12} {elapsed:>12.3f} {num_events / elapsed:>14,.0f}")
+
+    decision = results['comparisons']['google']['decision']
+    print(f"\nLast run: google vs openai latency delta "
+          f"{results['comparisons']['google']['latency_ms_delta']:.1f} ms, decision={decision}")
+
+    started = time.perf_counter()
+    ExperimentEvents.from_records(synthetic_records(args.record_sample, args.users))
+    elapsed = time.perf_counter() - started
+    print(f"from_records: {args.record_sample} events in {elapsed:.3f}s "
+          f"({args.record_sample / elapsed:,.0f} events/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark how cheap routes fare while a slow provider floods the workers
+
+Usage:
+    python -m benchmarks.admission_benchmark
+    python -m benchmarks.admission_benchmark --mode gthread --clients 64 --latency 4 --duration 20
+
+Runs gunicorn with gunicorn.conf.py over benchmarks.fake_app, the real
+app with simulated providers that answer after --latency seconds, once
+with ADMISSION_ENABLED=false and once with it on. During each run
+--clients threads send back-to-back POST /api/models/test requests
+while a prober polls /health and GET /api/chat/sessions. Reports the
+provider requests completed and shed with 503, and the prober's latency
+percentiles and failures.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.load_benchmark import percentile
+from benchmarks.serving_benchmark import REPO_ROOT, free_port, wait_until_ready
+
+# Settings the benchmark runs under unless already set in the environment
+BENCHMARK_ENV = {
+    'SECRET_KEY': 'benchmark-secret',
+    'FLASK_ENV': 'production',
+    'GREENLIST_ENABLED': 'false',
+}
+
+def call(port: int, method: str, path: str, body=None, token: str = None, timeout: float = 300):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                           headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+def start_gunicorn(args, port: int, admission: bool, database: str) -> subprocess.Popen:
+    env = dict(os.environ,
+               SERVING_MODE=args.mode,
+               PORT=str(port),
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_THREADS=str(args.threads),
+               GUNICORN_ACCESS_LOG='',
+               GUNICORN_TIMEOUT='300',
+               ADMISSION_ENABLED='true' if admission else 'false',
+               BENCH_PROVIDER_LATENCY=str(args.latency),
+               STORAGE_BACKEND='sqlite',
+               SQLITE_PATH=database,
+               LOG_LEVEL='WARNING')
+    for name, value in BENCHMARK_ENV.items():
+        env.setdefault(name, value)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'benchmarks.fake_app:app'],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_until_ready(port)
+    return process
+
+def flood(port: int, token: str, stop: threading.Event, counts: dict, lock: threading.Lock):
+    while not stop.is_set():
+        try:
+            status, _ = call(port, 'POST', '/api/models/test',
+                             {'message': 'Hello', 'model_provider': 'openai'}, token)
+            outcome = {200: 'ok', 503: 'shed'}.get(status, 'error')
+        except OSError:
+            outcome = 'error'
+        with lock:
+            counts[outcome] += 1
+        if outcome == 'shed':
+            # A well-behaved client backs off instead of retrying at once
+            time.sleep(0.5)
+
+def probe(port: int, token: str, stop: threading.Event, latencies: list, failures: list,
+          probe_timeout: float):
+    paths = ['/health', '/api/chat/sessions']
+    index = 0
+    while not stop.is_set():
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            status, _ = call(port, 'GET', path, token=token, timeout=probe_timeout)
+            if status != 200:
+                failures.append(path)
+            else:
+                latencies.append(time.perf_counter() - started)
+        except OSError:
+            failures.append(path)
+        time.sleep(0.1)
+
+def run(args, admission: bool) -> dict:
+    port = free_port()
+    database = os.path.join(tempfile.mkdtemp(prefix='admission-benchmark-'), 'local.db')
+    process = start_gunicorn(args, port, admission, database)
+    try:
+        status, body = call(port, 'POST', '/api/auth/login', {'token': 'bench:admission'})
+        if status != 200:
+            raise RuntimeError(f"login failed with HTTP {status}: {body[:200]!r}")
+        token = json.loads(body)['token']
+
+        stop = threading.Event()
+        counts = {'ok': 0, 'shed': 0, 'error': 0}
+        lock = threading.Lock()
+        latencies, failures = [], []
+        threads = [threading.Thread(target=flood, args=(port, token, stop, counts, lock), daemon=True)
+                   for _ in range(args.clients)]
+        threads.append(threading.Thread(
+            target=probe, args=(port, token, stop, latencies, failures, args.probe_timeout),
+            daemon=True))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=args.latency + args.probe_timeout + 10)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies.sort()
+    return {
+        'completed': counts['ok'],
+        'shed': counts['shed'],
+        'errors': counts['error'],
+        'probe_p50': percentile(latencies, 0.5),
+        'probe_p95': percentile(latencies, 0.95),
+        'probe_failures': len(failures),
+        'probes': len(latencies) + len(failures),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark admission control under a slow provider")
+    parser.add_argument('--mode', default='gthread', choices=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16, help="Threads per worker in gthread mode")
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=3.0,
+                        help="Simulated provider latency in seconds")
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--probe-timeout', type=float, default=10.0,
+                        help="Seconds before a probe request counts as failed")
+    args = parser.parse_args()
+
+    print(f"{args.mode}, {args.workers} workers, {args.clients} clients, "
+          f"provider latency {args.latency:.1f}s, {args.duration:.0f}s per run\n")
+    print(f"{'admission':>10} {'completed':>10} {'shed 503':>9} {'errors':>7} "
+          f"{'probe p50 (s)':>14} {'probe p95 (s)':>14} {'probe failures':>15}")
+    for admission in (False, True):
+        result = run(args, admission)
+        print(f"{'on' if admission else 'off':>10} {result['completed']:>10} {result['shed']:>9} "
+              f"{result['errors']:>7} {result['probe_p50']:>14.3f} {result['probe_p95']:>14.3f} "
+              f"{result['probe_failures']:>9}/{result['probes']:<5}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+"""
+The real app on fake backends, served by the gunicorn benchmarks
+
+Installs benchmarks.fakes before importing main, so gunicorn loads every
+SDK the production app imports without reaching any external service.
+BENCH_PROVIDER_LATENCY sets how long simulated OpenAI and Gemini calls
+take, in seconds.
+"""
+
+import os
+from benchmarks.fakes import install_fakes
+
+provider_latency = float(os.environ.get('BENCH_PROVIDER_LATENCY', '0'))
+install_fakes(openai_latency=provider_latency, gemini_latency=provider_latency)
+
+from main import app  # noqa: E402
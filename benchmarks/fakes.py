@@ -0,0 +1,421 @@
+"""
+In-memory stand-ins for Firestore, Pub/Sub, OpenAI, Gemini and Google
+sign-in, used by the load benchmark
+
+Each fake answers after a configurable delay so the app's I/O waits are
+realistic. The Firestore fake implements the subset of the client API the
+app uses: documents and subcollections, merge writes, ``Increment``,
+filtered and ordered queries with ``limit`` and ``start_after``, batches,
+``get_all`` and snapshot listeners. Its operations are reported through
+``record_operation``, so per-request Firestore counts work unchanged.
+"""
+
+import copy
+import itertools
+import operator
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+
+from app.utils.firestore_ops import record_operation
+
+COMPARISONS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge,
+    'in': lambda value, options: value in options,
+    'array_contains': lambda value, item: isinstance(value, list) and item in value,
+}
+
+def _comparable(value):
+    """Firestore timestamps are aware; the app writes naive UTC datetimes"""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _apply_fields(target: dict, fields: dict, nested: bool):
+    """Apply written fields, resolving Increment and dotted update paths"""
+    from google.cloud import firestore
+    for key, value in fields.items():
+        parts = key.split('.') if nested else [key]
+        container = target
+        for part in parts[:-1]:
+            if not isinstance(container.get(part), dict):
+                container[part] = {}
+            container = container[part]
+        name = parts[-1]
+        if isinstance(value, firestore.Increment):
+            container[name] = container.get(name, 0) + value.value
+        elif value is firestore.DELETE_FIELD:
+            container.pop(name, None)
+        elif isinstance(value, dict) and not nested:
+            # Maps are written field by field, which is how merge=True merges them
+            if not isinstance(container.get(name), dict):
+                container[name] = {}
+            _apply_fields(container[name], value, nested=False)
+        else:
+            container[name] = copy.deepcopy(value)
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = self._data
+        for part in field.split('.'):
+            value = (value or {}).get(part)
+        return copy.deepcopy(value)
+
+class FakeDocument:
+    def __init__(self, store, path: str, doc_id: str):
+        self._store = store
+        self._path = path
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._path}/{self.id}"
+
+    def collection(self, name: str):
+        return FakeCollection(self._store, f"{self.path}/{name}")
+
+    def get(self, *args, **kwargs):
+        self._store.wait('document.get', 'read')
+        return FakeSnapshot(self, self._store.read(self._path, self.id))
+
+    def set(self, data: dict, merge: bool = False):
+        self._store.wait('document.set', 'write')
+        self._store.write(self._path, self.id, data, merge=merge)
+
+    def create(self, data: dict):
+        self._store.wait('document.create', 'write')
+        self._store.write(self._path, self.id, data, must_not_exist=True)
+
+    def update(self, data: dict):
+        self._store.wait('document.update', 'write')
+        self._store.write(self._path, self.id, data, merge=True, must_exist=True, nested=True)
+
+    def delete(self):
+        self._store.wait('document.delete', 'write')
+        self._store.delete(self._path, self.id)
+
+class FakeQuery:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, store, path: str, filters=(), orders=(), limit_count=None, cursor=None):
+        self._store = store
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        values = {'filters': self._filters, 'orders': self._orders,
+                  'limit_count': self._limit, 'cursor': self._cursor}
+        values.update(changes)
+        return FakeQuery(self._store, self._path, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        direction = getattr(direction, 'name', direction)
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._copy(limit_count=count)
+
+    def select(self, field_paths):
+        return self
+
+    def start_after(self, document_fields):
+        return self._copy(cursor=document_fields)
+
+    def _key(self, doc_id, data, field):
+        if field == '__name__':
+            return doc_id
+        value = data
+        for part in field.split('.'):
+            value = (value or {}).get(part) if isinstance(value, dict) else None
+        return _comparable(value)
+
+    def _matches(self, doc_id, data) -> bool:
+        for field, op, value in self._filters:
+            current = self._key(doc_id, data, field)
+            if current is None:
+                return False
+            try:
+                if not COMPARISONS[op](current, _comparable(value)):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _results(self):
+        # Ties are broken by document id, as in Firestore
+        docs = sorted(((doc_id, data) for doc_id, data in self._store.scan(self._path)
+                       if self._matches(doc_id, data)), key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            docs.sort(key=lambda item: (self._key(*item, field) is None, self._key(*item, field)),
+                      reverse=direction == self.DESCENDING)
+        if self._cursor is not None and self._orders:
+            if isinstance(self._cursor, FakeSnapshot):
+                cursor_id, cursor_data = self._cursor.id, self._cursor._data or {}
+            else:
+                cursor_id, cursor_data = None, self._cursor
+            cursor = tuple(self._key(cursor_id, cursor_data, field) for field, _ in self._orders)
+            docs = [item for item in docs if self._after(item, cursor, cursor_id)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return docs
+
+    def _after(self, item, cursor, cursor_id) -> bool:
+        for (field, direction), bound in zip(self._orders, cursor):
+            value = self._key(*item, field)
+            if value == bound:
+                continue
+            if value is None or bound is None:
+                return bound is None
+            return value < bound if direction == self.DESCENDING else value > bound
+        return cursor_id is not None and item[0] > cursor_id
+
+    def stream(self, *args, **kwargs):
+        self._store.wait('query.stream', 'query')
+        for doc_id, data in self._results():
+            yield FakeSnapshot(FakeDocument(self._store, self._path, doc_id), data)
+
+    def get(self, *args, **kwargs):
+        self._store.wait('query.get', 'query')
+        return [FakeSnapshot(FakeDocument(self._store, self._path, doc_id), data)
+                for doc_id, data in self._results()]
+
+class FakeCollection(FakeQuery):
+    def __init__(self, store, path: str):
+        super().__init__(store, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, doc_id: str = None):
+        return FakeDocument(self._store, self._path, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: dict):
+        reference = self.document()
+        reference.set(data)
+        return datetime.now(timezone.utc), reference
+
+    def on_snapshot(self, callback):
+        return self._store.listen(self._path, callback)
+
+class FakeBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: self._store.write(reference._path, reference.id, data, merge=merge))
+
+    def create(self, reference, data):
+        self._writes.append(lambda: self._store.write(reference._path, reference.id, data,
+                                                      must_not_exist=True))
+
+    def update(self, reference, data):
+        self._writes.append(lambda: self._store.write(reference._path, reference.id, data,
+                                                      merge=True, must_exist=True, nested=True))
+
+    def delete(self, reference):
+        self._writes.append(lambda: self._store.delete(reference._path, reference.id))
+
+    def commit(self, *args, **kwargs):
+        self._store.wait('writebatch.commit', 'write')
+        for write in self._writes:
+            write()
+        self._writes = []
+        return []
+
+class FakeWatch:
+    def __init__(self, store, path, callback):
+        self._store = store
+        self._path = path
+        self._callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._store.unlisten(self._path, self)
+
+class FakeFirestore:
+    """Thread-safe in-memory document store shared by every FakeClient"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._collections = {}
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def wait(self, operation: str, kind: str):
+        if self.latency:
+            time.sleep(self.latency)
+        record_operation(operation, kind, self.latency)
+
+    def read(self, path, doc_id):
+        with self._lock:
+            data = self._collections.get(path, {}).get(doc_id)
+            return copy.deepcopy(data)
+
+    def scan(self, path):
+        with self._lock:
+            return [(doc_id, copy.deepcopy(data))
+                    for doc_id, data in self._collections.get(path, {}).items()]
+
+    def write(self, path, doc_id, data, merge=False, must_exist=False,
+              must_not_exist=False, nested=False):
+        with self._lock:
+            documents = self._collections.setdefault(path, {})
+            existing = documents.get(doc_id)
+            if must_exist and existing is None:
+                raise NotFound(f"No document to update: {path}/{doc_id}")
+            if must_not_exist and existing is not None:
+                raise AlreadyExists(f"Document already exists: {path}/{doc_id}")
+            document = copy.deepcopy(existing) if (merge and existing is not None) else {}
+            _apply_fields(document, data, nested)
+            documents[doc_id] = document
+            change = 'ADDED' if existing is None else 'MODIFIED'
+            snapshot = copy.deepcopy(document)
+        self._notify(path, doc_id, change, snapshot)
+
+    def delete(self, path, doc_id):
+        with self._lock:
+            existed = self._collections.get(path, {}).pop(doc_id, None) is not None
+        if existed:
+            self._notify(path, doc_id, 'REMOVED', None)
+
+    def listen(self, path, callback):
+        watch = FakeWatch(self, path, callback)
+        with self._lock:
+            self._listeners.setdefault(path, []).append(watch)
+        return watch
+
+    def unlisten(self, path, watch):
+        with self._lock:
+            if watch in self._listeners.get(path, []):
+                self._listeners[path].remove(watch)
+
+    def _notify(self, path, doc_id, change_type, data):
+        with self._lock:
+            watches = list(self._listeners.get(path, []))
+        if not watches:
+            return
+        snapshot = FakeSnapshot(FakeDocument(self, path, doc_id), data)
+        change = SimpleNamespace(document=snapshot, type=SimpleNamespace(name=change_type))
+        for watch in watches:
+            watch._callback([], [change], datetime.now(timezone.utc))
+
+class FakeClient:
+    """Drop-in for ``firestore.Client`` backed by one shared FakeFirestore"""
+
+    store = FakeFirestore()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def collection(self, name: str):
+        return FakeCollection(self.store, name)
+
+    def batch(self):
+        return FakeBatch(self.store)
+
+    def get_all(self, references, *args, **kwargs):
+        self.store.wait('client.get_all', 'read')
+        for reference in references:
+            yield FakeSnapshot(reference, self.store.read(reference._path, reference.id))
+
+class FakePublisher:
+    """Pub/Sub publisher whose publishes complete after a delay"""
+
+    latency = 0.0
+    _ids = itertools.count(1)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def publish(self, topic, data, **attributes):
+        future = Future()
+        time.sleep(self.latency)
+        future.set_result(str(next(self._ids)))
+        return future
+
+class FakeProviders:
+    """Simulated OpenAI and Gemini responses with fixed latency"""
+
+    def __init__(self, openai_latency: float, gemini_latency: float, response_tokens: int = 200):
+        self.openai_latency = openai_latency
+        self.gemini_latency = gemini_latency
+        self.response_tokens = response_tokens
+
+    def openai_create(self, model=None, messages=None, **kwargs):
+        time.sleep(self.openai_latency)
+        prompt_tokens = sum(len((message.get('content') or '').split()) for message in messages or [])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='word ' * self.response_tokens))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=self.response_tokens,
+                                  total_tokens=prompt_tokens + self.response_tokens)
+        )
+
+    def gemini_model(self, *args, **kwargs):
+        providers = self
+
+        class Model:
+            def generate_content(self, prompt):
+                time.sleep(providers.gemini_latency)
+                prompt_tokens = len(prompt.split())
+                return SimpleNamespace(
+                    text='word ' * providers.response_tokens,
+                    usage_metadata=SimpleNamespace(
+                        prompt_token_count=prompt_tokens,
+                        candidates_token_count=providers.response_tokens,
+                        total_token_count=prompt_tokens + providers.response_tokens)
+                )
+        return Model()
+
+def verify_fake_google_token(token, request=None, audience=None):
+    """Accept ``bench:<user_id>`` tokens as Google ID tokens"""
+    if not token.startswith('bench:'):
+        raise ValueError('Not a benchmark token')
+    user_id = token.split(':', 1)[1]
+    return {'iss': 'accounts.google.com', 'sub': user_id,
+            'email': f"{user_id}@bench.example.com", 'name': user_id}
+
+def install_fakes(firestore_latency: float = 0.0, pubsub_latency: float = 0.0,
+                  openai_latency: float = 0.0, gemini_latency: float = 0.0):
+    """Patch every external client; call before the app is imported"""
+    import openai
+    import google.generativeai as genai
+    from google.cloud import firestore, pubsub_v1
+    from google.oauth2 import id_token
+
+    FakeClient.store = FakeFirestore(firestore_latency)
+    FakePublisher.latency = pubsub_latency
+    providers = FakeProviders(openai_latency, gemini_latency)
+
+    mock.patch.object(firestore, 'Client', FakeClient).start()
+    mock.patch.object(pubsub_v1, 'PublisherClient', FakePublisher).start()
+    mock.patch.object(openai, 'ChatCompletion', SimpleNamespace(create=providers.openai_create),
+                      create=True).start()
+    mock.patch.object(genai, 'configure', lambda **kwargs: None).start()
+    mock.patch.object(genai, 'GenerativeModel', providers.gemini_model).start()
+    mock.patch.object(id_token, 'verify_oauth2_token', verify_fake_google_token).start()
+    return FakeClient.store
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+End-to-end load and latency benchmark of the Flask app on fake backends
+
+Usage:
+    python -m benchmarks.load_benchmark
+    python -m benchmarks.load_benchmark --concurrency 1 16 64 --session-sizes 2 50 200
+    python -m benchmarks.load_benchmark --scenarios send_message session_detail \\
+        --compare benchmarks/results/load-previous.json
+    python -m benchmarks.load_benchmark --storage sqlite
+
+Builds the app with create_app() on top of benchmarks.fakes: an in-memory
+Firestore and simulated Pub/Sub, OpenAI, Gemini and Google sign-in, each
+answering after the configured latency. With --storage memory or sqlite
+the chat, user, greenlist and A/B services use that document store
+instead of the fake Firestore. Every scenario is driven in-process
+through Flask test clients, one per concurrent client thread. Scenarios
+that read chat sessions run once per session size.
+
+For each scenario, concurrency level and session size it reports
+throughput, p50/p95/p99 latency, non-2xx responses and Firestore
+operations per request. Results are written as JSON (see --output) so
+runs can be compared with --compare.
+
+Scenarios with a Firestore budget check every request against it with
+app.utils.firestore_ops; the benchmark exits with status 1 if any request
+went over, so read amplification on those routes fails the run.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Settings the benchmark runs under unless already set in the environment
+BENCHMARK_ENV = {
+    'SECRET_KEY': 'benchmark-secret',
+    'AB_TEST_ENABLED': 'true',
+    'GREENLIST_ENABLED': 'true',
+    'GREENLIST_CHECK_RATE': '1000000',
+    'GREENLIST_CHECK_BURST': '1000000',
+    'USAGE_FLUSH_INTERVAL': '5',
+}
+
+class Scenario:
+    """One route exercised by the benchmark"""
+
+    def __init__(self, name, method, build, uses_sessions=False, budget=None):
+        self.name = name
+        self.method = method
+        self.build = build  # (context, client_index, request_index) -> (path, json body)
+        self.uses_sessions = uses_sessions
+        self.budget = budget  # Firestore operations allowed per request, see operation_budget
+
+def _session(context, client_index, request_index):
+    pool = context['sessions'][client_index % len(context['sessions'])]
+    return pool[request_index % len(pool)]
+
+def _user(context, client_index):
+    return context['users'][client_index % len(context['users'])]
+
+SCENARIOS = [
+    Scenario('login', 'POST', lambda c, k, i: (
+        '/api/auth/login', {'token': f"bench:{_user(c, k)}"}),
+        budget={'reads': 1, 'writes': 1, 'queries': 0}),
+    Scenario('sessions_list', 'GET', lambda c, k, i: (
+        '/api/chat/sessions', None), uses_sessions=True),
+    Scenario('session_detail', 'GET', lambda c, k, i: (
+        f"/api/chat/sessions/{_session(c, k, i)}", None), uses_sessions=True,
+        budget={'reads': 2, 'writes': 0, 'queries': 0}),
+    Scenario('send_message', 'POST', lambda c, k, i: (
+        f"/api/chat/sessions/{_session(c, k, i)}/messages",
+        {'message': f"Benchmark question {i}"}), uses_sessions=True,
+        budget={'reads': 2, 'writes': 1, 'queries': 0}),
+    Scenario('model_test', 'POST', lambda c, k, i: (
+        '/api/models/test', {'message': 'Hello', 'model_provider': ('openai', 'google')[i % 2]})),
+    Scenario('greenlist_check', 'POST', lambda c, k, i: (
+        '/api/greenlist/check', {'email': f"{_user(c, k)}@bench.example.com"}),
+        budget={'total': 0}),
+    Scenario('greenlist_list', 'GET', lambda c, k, i: (
+        '/api/greenlist/list?page_size=50', None)),
+    # The admin is resolved once; resolving it again cost a second read
+    Scenario('greenlist_add', 'POST', lambda c, k, i: (
+        '/api/greenlist/add', {'email': f"added-{k}-{i}@bench.example.org"}),
+        budget={'reads': 1, 'writes': 1, 'queries': 0}),
+    Scenario('ab_assignments', 'GET', lambda c, k, i: (
+        '/api/ab-testing/assignments', None)),
+    Scenario('ab_assign', 'POST', lambda c, k, i: (
+        '/api/ab-testing/experiments/model_comparison/assign', None)),
+    Scenario('ab_track', 'POST', lambda c, k, i: (
+        '/api/ab-testing/experiments/model_comparison/track',
+        {'event_type': 'feedback', 'event_data': {'rating': (i % 5) / 4}})),
+    Scenario('ab_results', 'GET', lambda c, k, i: (
+        '/api/ab-testing/experiments/model_comparison/results', None)),
+]
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def build_app(args):
+    """Install the fakes, then create the app against them"""
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+    os.environ['STORAGE_BACKEND'] = args.storage
+    if args.storage == 'sqlite':
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='load-benchmark-'), 'local.db')
+
+    from benchmarks.fakes import install_fakes
+    install_fakes(firestore_latency=args.firestore_latency / 1000,
+                  pubsub_latency=args.pubsub_latency / 1000,
+                  openai_latency=args.provider_latency / 1000,
+                  gemini_latency=args.provider_latency / 1000)
+
+    from app import create_app
+    from app.config import config
+    return create_app(config['production'])
+
+def seed(app, num_users: int, session_sizes, sessions_per_user: int):
+    """Users, greenlist rules and chat sessions of every size"""
+    from app.models.chat import ChatMessage, ChatService, ChatSession, MessageRole
+    from app.models.greenlist import GreenlistService
+    from app.services.auth_service import AuthService
+
+    GreenlistService().add_email('@bench.example.com', added_by='benchmark')
+    auth_service = AuthService()
+    chat_service = ChatService()
+
+    users, tokens = [], []
+    for index in range(num_users):
+        user_id = f"bench-user-{index}"
+        result = auth_service.authenticate_user(f"bench:{user_id}")
+        users.append(user_id)
+        tokens.append(result['token'])
+
+    sessions = {}
+    for size in session_sizes:
+        pools = []
+        for user_id in users:
+            pool = []
+            for number in range(sessions_per_user):
+                session = ChatSession(f"{user_id}-s{size}-{number}", user_id,
+                                      title=f"Benchmark session ({size} messages)")
+                for turn in range(size):
+                    role = MessageRole.USER if turn % 2 == 0 else MessageRole.ASSISTANT
+                    session.add_message(ChatMessage(role=role, content='word ' * 60))
+                chat_service.create_session(session)
+                pool.append(session.session_id)
+            pools.append(pool)
+        sessions[size] = pools
+    return users, tokens, sessions
+
+def run_level(app, scenario: Scenario, context, tokens, concurrency: int, num_requests: int):
+    """Drive one scenario with ``concurrency`` clients for ``num_requests`` requests"""
+    from app.utils.firestore_ops import (
+        OperationBudgetExceeded, assert_operation_budget, count_operations
+    )
+
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, statuses, over_budget = [], {}, []
+    operations = {'reads': 0, 'writes': 0, 'queries': 0}
+
+    def client_loop(client_index: int):
+        client = app.test_client()
+        headers = {'Authorization': f"Bearer {tokens[client_index % len(tokens)]}"}
+        local_latencies, local_statuses, local_over_budget = [], {}, []
+        with count_operations() as counts:
+            while True:
+                request_index = next(counter)
+                if request_index >= num_requests:
+                    break
+                path, body = scenario.build(context, client_index, request_index)
+                started = time.perf_counter()
+                with count_operations() as request_counts:
+                    response = client.open(path, method=scenario.method, json=body, headers=headers)
+                    response.get_data()
+                local_latencies.append(time.perf_counter() - started)
+                local_statuses[response.status_code] = local_statuses.get(response.status_code, 0) + 1
+                if scenario.budget:
+                    try:
+                        assert_operation_budget(request_counts, label=f"{scenario.method} {path}",
+                                                **scenario.budget)
+                    except OperationBudgetExceeded as e:
+                        local_over_budget.append(str(e))
+        with lock:
+            latencies.extend(local_latencies)
+            over_budget.extend(local_over_budget)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+            for kind in operations:
+                operations[kind] += getattr(counts, kind)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client_loop, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    completed = len(latencies)
+    errors = sum(count for status, count in statuses.items() if not 200 <= status < 300)
+    return {
+        'requests': completed,
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': completed / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'mean': 1000 * sum(latencies) / completed if completed else 0.0,
+            'p50': 1000 * percentile(latencies, 0.50),
+            'p95': 1000 * percentile(latencies, 0.95),
+            'p99': 1000 * percentile(latencies, 0.99),
+            'max': 1000 * (latencies[-1] if latencies else 0.0),
+        },
+        'firestore_ops_per_request': {kind: value / completed if completed else 0.0
+                                      for kind, value in operations.items()},
+        'over_budget': len(over_budget),
+        'over_budget_example': over_budget[0] if over_budget else None,
+    }
+
+def compare(results, previous_path: str):
+    """Print throughput and p95 changes against an earlier results file"""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    baseline = {(row['scenario'], row['concurrency'], row['session_size']): row
+                for row in previous['results']}
+    print(f"\nCompared with {previous_path} ({previous['meta'].get('revision')}):")
+    print(f"{'scenario':>16} {'conc':>5} {'size':>5} {'rps change':>11} {'p95 change':>11}")
+    for row in results:
+        base = baseline.get((row['scenario'], row['concurrency'], row['session_size']))
+        if base is None:
+            continue
+        rps = _change(row['throughput_rps'], base['throughput_rps'])
+        p95 = _change(row['latency_ms']['p95'], base['latency_ms']['p95'])
+        print(f"{row['scenario']:>16} {row['concurrency']:>5} {row['session_size'] or '-':>5} "
+              f"{rps:>11} {p95:>11}")
+
+def _change(current: float, base: float) -> str:
+    if not base:
+        return 'n/a'
+    return f"{100 * (current - base) / base:+.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark on fake backends")
+    parser.add_argument('--scenarios', nargs='+', default=[scenario.name for scenario in SCENARIOS],
+                        choices=[scenario.name for scenario in SCENARIOS])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--session-sizes', type=int, nargs='+', default=[4, 40, 200],
+                        help="Messages per chat session for session scenarios")
+    parser.add_argument('--requests', type=int, default=200,
+                        help="Requests per scenario, concurrency level and session size")
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--firestore-latency', type=float, default=5.0, help="Milliseconds per operation")
+    parser.add_argument('--pubsub-latency', type=float, default=20.0, help="Milliseconds per publish")
+    parser.add_argument('--storage', choices=['firestore', 'memory', 'sqlite'], default='firestore',
+                        help="Document store for the model services (firestore is the fake)")
+    parser.add_argument('--provider-latency', type=float, default=300.0,
+                        help="Milliseconds per OpenAI or Gemini call")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/load-<time>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's own output")
+    args = parser.parse_args()
+
+    # The app prints per-request messages; keep them out of the report
+    quiet = (contextlib.nullcontext() if args.verbose
+             else contextlib.redirect_stdout(open(os.devnull, 'w')))
+    with quiet:
+        app = build_app(args)
+        users, tokens, sessions = seed(app, args.users, args.session_sizes,
+                                       sessions_per_user=max(max(args.concurrency) // args.users, 1) * 4)
+    context = {'users': users}
+
+    results = []
+    print(f"{'scenario':>16} {'conc':>5} {'size':>5} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'errors':>7} {'fs ops/req':>11}")
+    for scenario in (s for s in SCENARIOS if s.name in args.scenarios):
+        for size in (args.session_sizes if scenario.uses_sessions else [None]):
+            context['sessions'] = sessions[size] if size is not None else None
+            for concurrency in args.concurrency:
+                with quiet:
+                    row = run_level(app, scenario, context, tokens, concurrency, args.requests)
+                row.update({'scenario': scenario.name, 'method': scenario.method,
+                            'concurrency': concurrency, 'session_size': size})
+                results.append(row)
+                ops = row['firestore_ops_per_request']
+                latency = row['latency_ms']
+                print(f"{scenario.name:>16} {concurrency:>5} {size or '-':>5} "
+                      f"{row['throughput_rps']:>9.1f} {latency['p50']:>8.1f} {latency['p95']:>8.1f} "
+                      f"{latency['p99']:>8.1f} {row['errors']:>7} {sum(ops.values()):>11.1f}")
+                if row['over_budget']:
+                    print(f"{'':>16} {row['over_budget']} requests over budget, "
+                          f"e.g. {row['over_budget_example']}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'revision': git_revision(),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'settings': vars(args),
+            },
+            'results': results
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if any(row['over_budget'] for row in results):
+        print("\nSome requests exceeded their Firestore operation budget")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
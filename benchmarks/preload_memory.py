@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Measure worker memory and startup time with and without gunicorn preload
+
+Usage:
+    python -m benchmarks.preload_memory
+    python -m benchmarks.preload_memory --modes gevent gthread --workers 4 --requests 200
+
+For each SERVING_MODE, runs gunicorn with gunicorn.conf.py over
+benchmarks.fake_app (the real app on benchmarks.fakes) once with
+GUNICORN_PRELOAD=false and once with GUNICORN_PRELOAD=true. After the
+workers have served --requests warm-up requests it reads
+/proc/<pid>/smaps_rollup for the master and every worker and reports
+per-worker RSS, PSS and USS (private memory), the PSS of the whole
+instance, and the time until the first response. Linux only.
+"""
+
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import time
+from benchmarks.serving_benchmark import REPO_ROOT, free_port
+
+# Settings the benchmark runs under unless already set in the environment
+BENCHMARK_ENV = {
+    'SECRET_KEY': 'benchmark-secret',
+    'FLASK_ENV': 'production',
+}
+
+# Requests spread over the warm-up so every route module has run once
+WARMUP_PATHS = ['/health', '/api/models/available', '/api/agreements', '/']
+
+def read_memory(pid: int) -> dict:
+    """RSS, PSS and USS of one process in kB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {'rss': fields.get('Rss', 0), 'pss': fields.get('Pss', 0),
+            'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)}
+
+def worker_pids(master_pid: int):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+def get(port: int, path: str) -> int:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def wait_for_first_response(port: int, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if get(port, '/health') == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"gunicorn did not answer on port {port}")
+
+def wait_for_workers(master_pid: int, workers: int, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(worker_pids(master_pid)) >= workers:
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"expected {workers} workers under pid {master_pid}")
+
+def measure(mode: str, preload: bool, workers: int, requests: int, settle: float) -> dict:
+    port = free_port()
+    env = dict(os.environ,
+               SERVING_MODE=mode,
+               GUNICORN_PRELOAD='true' if preload else 'false',
+               PORT=str(port),
+               GUNICORN_WORKERS=str(workers),
+               GUNICORN_ACCESS_LOG='')
+    for name, value in BENCHMARK_ENV.items():
+        env.setdefault(name, value)
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'benchmarks.fake_app:app'],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_first_response(port)
+        first_response = time.perf_counter() - started
+        wait_for_workers(process.pid, workers)
+        for index in range(requests):
+            get(port, WARMUP_PATHS[index % len(WARMUP_PATHS)])
+        time.sleep(settle)
+
+        master = read_memory(process.pid)
+        children = [read_memory(pid) for pid in worker_pids(process.pid)]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    def mean(key):
+        return sum(child[key] for child in children) / len(children)
+
+    return {
+        'first_response': first_response,
+        'worker_rss': mean('rss'),
+        'worker_pss': mean('pss'),
+        'worker_uss': mean('uss'),
+        'master_pss': master['pss'],
+        'total_pss': master['pss'] + sum(child['pss'] for child in children),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory saved by gunicorn preload")
+    parser.add_argument('--modes', nargs='+', default=['gevent', 'gthread', 'sync'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100,
+                        help="Warm-up requests before memory is read")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="Seconds to wait after the warm-up")
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, memory in MiB (per-worker means)\n")
+    print(f"{'mode':>8} {'preload':>8} {'first resp (s)':>15} {'RSS':>7} {'PSS':>7} "
+          f"{'USS':>7} {'master PSS':>11} {'total PSS':>10}")
+    for mode in args.modes:
+        results = {}
+        for preload in (False, True):
+            result = results[preload] = measure(mode, preload, args.workers,
+                                                args.requests, args.settle)
+            print(f"{mode:>8} {'on' if preload else 'off':>8} {result['first_response']:>15.2f} "
+                  f"{result['worker_rss'] / 1024:>7.1f} {result['worker_pss'] / 1024:>7.1f} "
+                  f"{result['worker_uss'] / 1024:>7.1f} {result['master_pss'] / 1024:>11.1f} "
+                  f"{result['total_pss'] / 1024:>10.1f}")
+        saved_uss = (results[False]['worker_uss'] - results[True]['worker_uss']) / 1024
+        saved_total = (results[False]['total_pss'] - results[True]['total_pss']) / 1024
+        print(f"{mode:>8} {'saved':>8} {'':>15} {'':>7} {'':>7} {saved_uss:>7.1f} "
+              f"{'':>11} {saved_total:>10.1f}\n")
+
+if __name__ == '__main__':
+    main()
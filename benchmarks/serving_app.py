@@ -0,0 +1,19 @@
+"""
+Minimal chat-turn app served by benchmarks.serving_benchmark
+
+Each turn makes one blocking HTTP call to a simulated model provider
+(BENCH_PROVIDER_URL), the way a real turn waits on OpenAI or Gemini.
+"""
+
+import os
+import requests
+from flask import Flask, jsonify
+
+app = Flask(__name__)
+provider_url = os.environ.get('BENCH_PROVIDER_URL', 'http://127.0.0.1:9900/')
+http = requests.Session()
+
+@app.route('/turn', methods=['POST'])
+def turn():
+    response = http.get(provider_url, timeout=60)
+    return jsonify({'response': response.text})
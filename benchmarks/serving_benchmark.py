@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent chat turns per instance in each gunicorn serving mode
+
+Usage:
+    python -m benchmarks.serving_benchmark
+    python -m benchmarks.serving_benchmark --modes sync gevent --concurrency 8 64 256 --latency 1.0
+
+Starts a simulated model provider that answers after --latency seconds,
+then, for each SERVING_MODE, runs gunicorn with gunicorn.conf.py over
+benchmarks.serving_app and drives it with concurrent clients. Reports
+throughput, latency percentiles and the most turns the instance had
+waiting on the provider at once.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import http.client
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ProviderStats:
+    """In-flight provider calls, as seen by the simulated provider"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def reset(self):
+        with self.lock:
+            self.peak = self.in_flight
+
+def start_provider(port: int, latency: float, stats: ProviderStats) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            stats.enter()
+            try:
+                time.sleep(latency)
+                body = b'simulated model response'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            finally:
+                stats.leave()
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_ready(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+def start_gunicorn(mode: str, port: int, provider_port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ,
+               SERVING_MODE=mode,
+               PORT=str(port),
+               GUNICORN_WORKERS=str(workers),
+               GUNICORN_ACCESS_LOG='',
+               BENCH_PROVIDER_URL=f"http://127.0.0.1:{provider_port}/")
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         'benchmarks.serving_app:app'],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_until_ready(port)
+    return process
+
+def one_turn(port: int) -> float:
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    try:
+        connection.request('POST', '/turn', body=b'{}',
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+    finally:
+        connection.close()
+    return time.perf_counter() - started
+
+def run_load(port: int, concurrency: int, turns: int):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        latencies = sorted(pool.map(lambda _: one_turn(port), range(turns)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies
+
+def percentile(values, fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gunicorn serving modes")
+    parser.add_argument('--modes', nargs='+', default=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 32, 128])
+    parser.add_argument('--turns-per-client', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help="Simulated provider latency in seconds")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    stats = ProviderStats()
+    provider_port = free_port()
+    provider = start_provider(provider_port, args.latency, stats)
+
+    print(f"provider latency {args.latency:.2f}s, {args.workers} workers\n")
+    print(f"{'mode':>8} {'clients':>8} {'turns/s':>10} {'p50 (s)':>9} {'p95 (s)':>9} {'peak in flight':>15}")
+    try:
+        for mode in args.modes:
+            port = free_port()
+            process = start_gunicorn(mode, port, provider_port, args.workers)
+            try:
+                one_turn(port)  # warm up
+                for concurrency in args.concurrency:
+                    stats.reset()
+                    elapsed, latencies = run_load(port, concurrency,
+                                                  concurrency * args.turns_per_client)
+                    print(f"{mode:>8} {concurrency:>8} {len(latencies) / elapsed:>10.1f} "
+                          f"{percentile(latencies, 0.5):>9.2f} {percentile(latencies, 0.95):>9.2f} "
+                          f"{stats.peak:>15}")
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+    finally:
+        provider.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Gunicorn configuration
+#
+# SERVING_MODE picks how a worker handles concurrent requests:
+#   sync     one request per worker process
+#   gthread  GUNICORN_THREADS requests per worker, one OS thread each
+#   gevent   up to GUNICORN_WORKER_CONNECTIONS requests per worker as
+#            greenlets; sockets are monkey patched so provider, Firestore
+#            and Pub/Sub calls yield the worker while they wait
+#
+# Chat turns spend nearly all of their time waiting on the model provider,
+# so gevent serves by far the most turns per instance.
+#
+# GUNICORN_PRELOAD (default true) imports the app once in the master, so
+# workers share the SDK modules copy-on-write instead of each importing
+# them. Google Cloud clients are created lazily in each worker after fork
+# (app.utils.clients), and the in-memory caches and their listeners start
+# in post_worker_init.
+
+import gc
+import multiprocessing
+import os
+import shutil
+
+SERVING_MODES = {'sync': 'sync', 'gthread': 'gthread', 'gevent': 'gevent'}
+
+serving_mode = os.environ.get('SERVING_MODE', 'gevent').lower()
+if serving_mode not in SERVING_MODES:
+    raise ValueError(f"Unsupported SERVING_MODE: {serving_mode}")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', str(min(multiprocessing.cpu_count() * 2, 4))))
+worker_class = SERVING_MODES[serving_mode]
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+if serving_mode == 'gthread':
+    threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+elif serving_mode == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+if preload_app:
+    # Listener threads must not start in the master; each worker starts
+    # its own in post_worker_init
+    os.environ['DEFER_BACKGROUND_SERVICES'] = 'true'
+    if serving_mode == 'gevent':
+        # The master imports the app, so the standard library has to be
+        # patched before that import rather than when each worker starts
+        from app.utils.serving import patch_standard_library
+        patch_standard_library()
+
+# Set GUNICORN_ACCESS_LOG to an empty value to turn access logging off
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+# Workers share Prometheus samples through files in this directory; it
+# must be set before any worker imports prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+
+def on_starting(server):
+    """Drop samples left by a previous run"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    """Stop reporting an exited worker's live gauges"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
+
+def pre_fork(server, worker):
+    """Keep the preloaded app's objects shared with the workers.
+
+    A worker's garbage collector would otherwise write to the header of
+    every object inherited from the master and copy the pages holding
+    them; frozen objects are never examined.
+    """
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    """Make gRPC cooperative before the worker creates any client.
+
+    The gevent worker monkey patches the standard library when it starts,
+    but gRPC (Firestore, Pub/Sub, Gemini) runs its own C-core I/O and
+    would still block the whole worker. Patching here, ahead of the
+    worker's own (idempotent) patch, lets gRPC be switched to gevent
+    before any client is created. Clients are per process, so even a
+    preloaded app only opens channels after this runs.
+    """
+    if serving_mode == 'gevent':
+        from app.utils.serving import enable_cooperative_io
+        enable_cooperative_io()
+
+def post_worker_init(worker):
+    """Start this worker's caches and listeners when the app was preloaded"""
+    if preload_app:
+        from app import start_background_services
+        start_background_services(worker.wsgi)
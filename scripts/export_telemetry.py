@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Export A/B events, assignments and chat turn metadata to columnar files
+
+Usage:
+    python scripts/export_telemetry.py [--output exports] [--format parquet|arrow]
+                                       [--dataset events] [--chunk-rows 50000]
+
+Each run exports only the records stamped since the previous run's
+checkpoint, into day-partitioned files under the output directory:
+
+    exports/events/date=2024-01-15/part-<run>-00000.parquet
+    exports/assignments/...
+    exports/chat_turns/...
+
+Requires pyarrow (pip install pyarrow). Schedule it (e.g. hourly with Cloud
+Scheduler or cron) and point DuckDB, pandas or BigQuery at the files.
+
+Environment Variables:
+    GOOGLE_CLOUD_PROJECT - Your GCP project ID (optional if gcloud is configured)
+    TELEMETRY_EXPORT_DIR - Default output directory
+    TELEMETRY_EXPORT_SETTLE_SECONDS - How far behind now each run stops
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.telemetry_export_service import EXPORT_FORMATS, TelemetryExportService
+
+def main():
+    parser = argparse.ArgumentParser(description="Export telemetry to columnar files")
+    parser.add_argument('--output', help="Output directory (default: TELEMETRY_EXPORT_DIR)")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help="File format")
+    parser.add_argument('--dataset', action='append', choices=TelemetryExportService.DATASETS,
+                        help="Dataset to export; repeat for several (default: all)")
+    parser.add_argument('--chunk-rows', type=int, help="Rows per file part and memory bound")
+    parser.add_argument('--settle-seconds', type=int,
+                        help="Only export records at least this old")
+    args = parser.parse_args()
+
+    try:
+        service = TelemetryExportService(
+            output_dir=args.output,
+            file_format=args.format,
+            chunk_rows=args.chunk_rows,
+            settle_seconds=args.settle_seconds
+        )
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+    report = service.export(datasets=args.dataset)
+    for dataset, result in report.items():
+        print(f"✓ {dataset}: {result['rows']} rows in {len(result['files'])} files "
+              f"(through {result['until']})")
+
+if __name__ == '__main__':
+    main()
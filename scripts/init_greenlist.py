@@ -4,6 +4,12 @@ Initialize Greenlist - Add initial users to the greenlist
 
 Usage:
     python scripts/init_greenlist.py
+    python scripts/init_greenlist.py --file emails.csv [--start-row N]
+    python scripts/init_greenlist.py --file emails.ndjson --format ndjson
+
+The --file mode streams a CSV or NDJSON file through the same batched,
+concurrent import used by POST /api/greenlist/bulk-add. If an import fails
+partway through, re-run it with the printed --start-row to resume.
 
 Environment Variables:
     GOOGLE_CLOUD_PROJECT - Your GCP project ID (optional if gcloud is configured)
@@ -11,7 +17,13 @@ Environment Variables:
 
 from google.cloud import firestore
 from datetime import datetime
+import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.greenlist import GreenlistService, parse_csv_rows, parse_ndjson_rows
 
 # Initialize Firestore
 project_id = os.environ.get('GOOGLE_CLOUD_PROJECT')
@@ -79,7 +91,49 @@ def list_greenlist():
         print(f"Error listing greenlist: {e}")
         return []
 
+def bulk_import(path, file_format, start_row=1, added_by='system'):
+    """Stream a CSV or NDJSON file into the greenlist"""
+    parse_rows = parse_ndjson_rows if file_format == 'ndjson' else parse_csv_rows
+    service = GreenlistService()
+
+    print(f"Importing {path} from row {start_row}...")
+    print()
+
+    with open(path, newline='', encoding='utf-8') as f:
+        report = service.import_rows(parse_rows(f), added_by=added_by, start_row=start_row)
+
+    for row in report['rows']:
+        if row['status'] not in ('added', 'duplicate'):
+            print(f"✗ Row {row['row']} ({row['email'] or 'empty'}): {row['status']} - {row.get('error')}")
+
+    print()
+    print("=" * 60)
+    for status, count in sorted(report['summary'].items()):
+        print(f"  {status}: {count}")
+    print(f"  last row read: {report['last_row']}")
+    print("=" * 60)
+
+    if report['resume_from'] is not None:
+        print()
+        print("Some batches failed. Resume with:")
+        print(f"   python scripts/init_greenlist.py --file {path} "
+              f"--format {file_format} --start-row {report['resume_from']}")
+        return False
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Initialize or bulk import the greenlist")
+    parser.add_argument('--file', help="CSV or NDJSON file of emails to import")
+    parser.add_argument('--format', choices=['csv', 'ndjson'],
+                        help="File format (defaults to the file extension)")
+    parser.add_argument('--start-row', type=int, default=1,
+                        help="First data row to import, for resuming a failed import")
+    parser.add_argument('--added-by', default='system', help="Value recorded in added_by")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     print("=" * 60)
     print("Laurelin Chatbot - Greenlist Initialization")
     print("=" * 60)
@@ -98,6 +152,12 @@ def main():
         print("2. Authenticated with: gcloud auth application-default login")
         return
 
+    if args.file:
+        file_format = args.format or ('ndjson' if args.file.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if not bulk_import(args.file, file_format, args.start_row, args.added_by):
+            sys.exit(1)
+        return
+
     print(f"Adding {len(INITIAL_EMAILS)} emails to greenlist...")
     print()
 
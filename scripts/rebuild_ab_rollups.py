@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Rebuild A/B experiment rollups from the raw assignment and event records
+
+Usage:
+    python scripts/rebuild_ab_rollups.py model_comparison [other_experiment ...]
+
+The results endpoint reads pre-aggregated counters from ab_rollups. Run
+this after changing the rollup format, or if the counters have drifted
+from ab_assignments and ab_events. Events recorded while it runs may be
+miscounted, so prefer a quiet period.
+
+Environment Variables:
+    GOOGLE_CLOUD_PROJECT - Your GCP project ID (optional if gcloud is configured)
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ab_testing_service import ABTestingService
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild A/B experiment rollups")
+    parser.add_argument('experiments', nargs='+', help="Experiment names to rebuild")
+    args = parser.parse_args()
+
+    service = ABTestingService()
+    for experiment_name in args.experiments:
+        print(f"Rebuilding rollups for {experiment_name}...")
+        results = service.rebuild_experiment_results(experiment_name)
+        print(f"✓ {results['total_users']} assignments, {results['total_events']} events")
+        for variant, count in sorted(results['variant_assignments'].items()):
+            print(f"  - {variant}: {count} users")
+
+if __name__ == '__main__':
+    main()